@@ -0,0 +1,194 @@
+"""
+Deterministic generator of realistic source files for benchmarking.
+
+Each kind of file stresses a different part of the checker:
+
+    plain             ordinary code that never mentions Qiskit (prefilter)
+    imports           long import blocks from many Qiskit modules (path lookups)
+    chains            builder-style code with long attribute chains (attributes)
+    transpile         call-heavy transpile scripts with keyword arguments (calls)
+    circuit_literals  generated circuit files with huge numeric literals (walk)
+    notebook_script   scripts exported from notebooks: mostly data wrangling and
+                      plotting, with Qiskit in a few cells (statement prefilter)
+
+Usage:
+    python benchmarks/corpus.py <output-dir> [--files-per-kind N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+
+QISKIT_MODULES = [
+    "qiskit", "qiskit.circuit", "qiskit.circuit.library", "qiskit.transpiler",
+    "qiskit.transpiler.passes", "qiskit.quantum_info", "qiskit.providers",
+    "qiskit.providers.fake_provider", "qiskit.primitives", "qiskit.pulse",
+    "qiskit.opflow", "qiskit.visualization", "qiskit.result", "qiskit.compiler",
+]
+QISKIT_NAMES = [
+    "QuantumCircuit", "transpile", "Aer", "execute", "Operator", "Statevector",
+    "PassManager", "SabreSwap", "GenericBackendV2", "FakeCairo", "Estimator",
+    "Sampler", "Gaussian", "PauliSumOp", "plot_histogram", "LocalReadoutMitigator",
+]
+METHODS = ["h", "x", "cx", "rz", "measure", "barrier", "cnot", "qasm", "c_if", "bind_parameters", "compose"]
+KWARGS = ["optimization_level", "backend", "seed_transpiler", "backend_properties", "inst_map", "coupling_map"]
+WORDS = ["data", "value", "result", "config", "items", "index", "buffer", "count", "name", "path"]
+
+KINDS = ("plain", "imports", "chains", "transpile", "circuit_literals", "notebook_script")
+
+
+def _plain(rng: random.Random, size: int) -> str:
+    lines = ["import os", "import json", "from collections import defaultdict", ""]
+    for i in range(size):
+        a, b = rng.sample(WORDS, 2)
+        lines += [
+            f"def {a}_{i}({a}, {b}=None):",
+            f"    {b} = {b} or defaultdict(list)",
+            f"    for index, item in enumerate({a}.{b}.items()):",
+            f"        {b}[index].append(os.path.join(str(item), '{a}'))",
+            f"    return json.dumps({{'{a}': len({b}), 'ok': {rng.random() > 0.5}}})",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _imports(rng: random.Random, size: int) -> str:
+    lines = []
+    for _ in range(size * 3):
+        module = rng.choice(QISKIT_MODULES)
+        names = ", ".join(sorted(set(rng.choices(QISKIT_NAMES, k=3))))
+        if rng.random() < 0.3:
+            lines.append(f"import {module} as m{rng.randrange(1000)}")
+        else:
+            lines.append(f"from {module} import {names}")
+    return "\n".join(lines) + "\n"
+
+
+def _chains(rng: random.Random, size: int) -> str:
+    lines = ["import qiskit as qk", "from qiskit import QuantumCircuit", ""]
+    for i in range(size * 2):
+        depth = rng.randint(5, 30)
+        attrs = ".".join(rng.choice(WORDS) for _ in range(depth))
+        lines.append(f"value_{i} = qk.{rng.choice(QISKIT_MODULES[1:]).split('.', 1)[1]}.{attrs}")
+        calls = "".join(f".{rng.choice(METHODS)}({rng.randrange(4)})" for _ in range(rng.randint(3, 12)))
+        lines.append(f"qc_{i} = QuantumCircuit(4){calls}")
+    return "\n".join(lines) + "\n"
+
+
+def _transpile(rng: random.Random, size: int) -> str:
+    lines = [
+        "from qiskit import QuantumCircuit, transpile",
+        "from qiskit.transpiler import generate_preset_pass_manager, PassManager",
+        "",
+    ]
+    for i in range(size):
+        kwargs = ", ".join(f"{kw}={rng.randrange(10)}" for kw in rng.sample(KWARGS, 3))
+        lines += [
+            f"def run_{i}(backend, circuits):",
+            "    results = []",
+            "    for circuit in circuits:",
+            f"        compiled = transpile(circuit, {kwargs})",
+            f"        pm = generate_preset_pass_manager({kwargs})",
+            "        pm.append(compiled, max_iteration=3)",
+            "        results.append(backend.run(compiled, shots=1024).result().get_counts())",
+            "    return results",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _circuit_literals(rng: random.Random, size: int) -> str:
+    lines = ["from qiskit import QuantumCircuit", "import numpy as np", ""]
+    for i in range(max(1, size // 10)):
+        values = ", ".join(f"{rng.uniform(-3.2, 3.2):.12f}" for _ in range(size * 20))
+        lines.append(f"PARAMS_{i} = np.array([{values}])")
+        matrix = ", ".join("[" + ", ".join(str(rng.randrange(2)) for _ in range(16)) + "]" for _ in range(size))
+        lines.append(f"MATRIX_{i} = [{matrix}]")
+    lines.append("qc = QuantumCircuit(16)")
+    for q in range(size * 5):
+        lines.append(f"qc.rz(PARAMS_0[{q}], {q % 16})")
+    return "\n".join(lines) + "\n"
+
+
+def _notebook_script(rng: random.Random, size: int) -> str:
+    lines = [
+        "import numpy as np",
+        "import pandas as pd",
+        "import matplotlib.pyplot as plt",
+        "from qiskit import QuantumCircuit, transpile",
+        "from qiskit.visualization import plot_histogram",
+        "",
+    ]
+    for i in range(size * 4):
+        a, b = rng.sample(WORDS, 2)
+        lines.append(f"# In[{i}]:")
+        if rng.random() < 0.1:
+            calls = "".join(f"qc_{i}.{rng.choice(METHODS)}({rng.randrange(4)})\n" for _ in range(rng.randint(2, 6)))
+            lines += [
+                f"qc_{i} = QuantumCircuit(4)",
+                calls.rstrip("\n"),
+                f"compiled_{i} = transpile(qc_{i}, {rng.choice(KWARGS)}={rng.randrange(4)})",
+                f"plot_histogram(counts_{i})",
+            ]
+            continue
+        lines += [
+            f"{a}_{i} = pd.DataFrame({{'{a}': np.linspace(0, {rng.randrange(1, 9)}, 100), '{b}': np.arange(100)}})",
+            f"{a}_{i}['{b}_norm'] = ({a}_{i}['{b}'] - {a}_{i}['{b}'].mean()) / {a}_{i}['{b}'].std()",
+            f"summary_{i} = {a}_{i}.groupby('{b}').agg({{'{a}': ['mean', 'max'], '{b}_norm': 'sum'}}).reset_index()",
+            f"for index, row in summary_{i}.iterrows():",
+            f"    {b}_{i} = [row['{a}'] * k for k in range({rng.randrange(2, 20)}) if k % 2 == 0]",
+            f"fig, ax = plt.subplots(figsize=({rng.randrange(4, 12)}, 4))",
+            f"ax.plot({a}_{i}['{a}'], {a}_{i}['{b}_norm'], label='{a} vs {b}', linewidth={rng.random():.2f})",
+            "ax.legend(); plt.tight_layout()",
+            "",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+_GENERATORS = {
+    "plain": _plain,
+    "imports": _imports,
+    "chains": _chains,
+    "transpile": _transpile,
+    "circuit_literals": _circuit_literals,
+    "notebook_script": _notebook_script,
+}
+
+
+def make_source(kind: str, rng: random.Random, size: int = 50) -> str:
+    return _GENERATORS[kind](rng, size)
+
+
+def generate(directory: str, files_per_kind: int = 200, seed: int = 0, kinds=KINDS) -> dict:
+    """
+    Write the corpus to `directory`, one subdirectory per kind.
+
+    Returns:
+        Dict mapping each kind to the list of file paths written
+    """
+    rng = random.Random(seed)
+    files = {}
+    for kind in kinds:
+        kind_dir = os.path.join(directory, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        files[kind] = []
+        for i in range(files_per_kind):
+            path = os.path.join(kind_dir, f"{kind}_{i:05d}.py")
+            with open(path, "w") as f:
+                f.write(make_source(kind, rng, size=rng.randint(20, 80)))
+            files[kind].append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--files-per-kind", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    files = generate(args.directory, args.files_per_kind, args.seed)
+    print(f"Wrote {sum(len(paths) for paths in files.values())} files to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
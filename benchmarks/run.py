@@ -0,0 +1,243 @@
+"""
+Throughput benchmark for the checker, with regression comparison.
+
+Measures, for each kind of file in a generated corpus (see `corpus.py`):
+
+    plugin   `Plugin(tree, lines).run()`, as flake8 calls it
+    visitor  `Visitor().visit(tree)` alone
+    cli      the `flake8-qiskit-migration` command, in a fresh process
+    flake8   the same through flake8 (`flake8-qiskit-migration --flake8`,
+             i.e. `flake8 --select QKT`), to compare against `cli`
+    cold     linting a single file in a fresh process, through the plugin
+             and through the command (startup time, as in pre-commit hooks)
+    daemon   round trips to `flake8-qiskit-migration --daemon`, sending each
+             file's source with a small edit so it isn't answered from cache
+
+and reports files/s, AST nodes/s, and p50/p99 per-file latency (not for
+`cli` and `flake8`, which are timed as a whole, including startup, with one
+job each).
+
+Usage:
+    python benchmarks/run.py --save baseline.json
+    # ... make changes ...
+    python benchmarks/run.py --compare baseline.json
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus import KINDS, generate
+
+from flake8_qiskit_migration import daemon
+from flake8_qiskit_migration.plugin import Plugin, Visitor
+
+TARGETS = ("plugin", "visitor", "cli", "flake8", "cold", "daemon")
+
+# Metric name → True if higher is better
+METRICS = {
+    "files_per_sec": True,
+    "nodes_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "plugin_ms": False,
+    "cli_ms": False,
+}
+
+_COLD_PLUGIN = """
+import ast, sys
+from flake8_qiskit_migration.plugin import Plugin
+with open(sys.argv[1]) as f:
+    lines = f.readlines()
+list(Plugin(ast.parse("".join(lines)), lines).run())
+"""
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def _summarize(latencies: list, nodes: int) -> dict:
+    total = sum(latencies)
+    latencies = sorted(latencies)
+    return {
+        "files_per_sec": len(latencies) / total,
+        "nodes_per_sec": nodes / total,
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+
+
+def _load(paths: list) -> list:
+    files = []
+    for path in paths:
+        with open(path) as f:
+            source = f.read()
+        tree = ast.parse(source)
+        files.append((source.splitlines(keepends=True), tree, sum(1 for _ in ast.walk(tree))))
+    return files
+
+
+def _time_in_process(files: list, target: str, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        latencies = []
+        for lines, tree, _ in files:
+            start = time.perf_counter()
+            if target == "plugin":
+                list(Plugin(tree, lines).run())
+            else:
+                Visitor().visit(tree)
+            latencies.append(time.perf_counter() - start)
+        if best is None or sum(latencies) < sum(best):
+            best = latencies
+    return _summarize(best, sum(nodes for _, _, nodes in files))
+
+
+def _time_cli(directory: str, files: list, repeat: int, flake8: bool = False) -> dict:
+    command = [sys.executable, "-c", "from flake8_qiskit_migration.command import cli; cli()"]
+    command += ["--flake8", "--jobs", "1", directory] if flake8 else ["--jobs", "1", directory]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=False)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "files_per_sec": len(files) / best,
+        "nodes_per_sec": sum(nodes for _, _, nodes in files) / best,
+    }
+
+
+def _time_cold(path: str, repeat: int) -> dict:
+    commands = {
+        "plugin_ms": [sys.executable, "-c", _COLD_PLUGIN, path],
+        "cli_ms": [sys.executable, "-c", "from flake8_qiskit_migration.command import cli; cli()", "--jobs", "1", path],
+    }
+    stats = {}
+    for metric, command in commands.items():
+        best = None
+        for _ in range(max(repeat, 5)):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, check=False)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        stats[metric] = best * 1000
+    return stats
+
+
+def _time_daemon(files: list, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "daemon.sock")
+        command = [sys.executable, "-c", "from flake8_qiskit_migration.command import cli; cli()", "--daemon", "--socket", socket_path]
+        server = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+            best = None
+            for iteration in range(repeat):
+                latencies = []
+                for lines, _, _ in files:
+                    source = "".join(lines) + f"# edit {iteration}\n"
+                    start = time.perf_counter()
+                    daemon.request({"sources": [["edited.py", source]]}, socket_path)
+                    latencies.append(time.perf_counter() - start)
+                if best is None or sum(latencies) < sum(best):
+                    best = latencies
+        finally:
+            server.terminate()
+            server.wait()
+    return _summarize(best, sum(nodes for _, _, nodes in files))
+
+
+def run_benchmarks(corpus_dir: str, files_per_kind: int, seed: int, repeat: int, targets) -> dict:
+    paths = generate(corpus_dir, files_per_kind, seed)
+    results = {}
+    for kind in KINDS:
+        files = _load(paths[kind])
+        for target in targets:
+            if target in ("cli", "flake8"):
+                stats = _time_cli(os.path.join(corpus_dir, kind), files, repeat, flake8=target == "flake8")
+            elif target == "cold":
+                stats = _time_cold(paths[kind][0], repeat)
+            elif target == "daemon":
+                stats = _time_daemon(files, repeat)
+            else:
+                stats = _time_in_process(files, target, repeat)
+            results[f"{target}/{kind}"] = stats
+            print(f"{target + '/' + kind:<28}" + "  ".join(f"{name} {value:12.1f}" for name, value in stats.items()))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "files_per_kind": files_per_kind,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Returns:
+        List of `(benchmark, metric, baseline, current, change)` for every
+        metric that got worse by more than `threshold` (a fraction)
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        old_stats = baseline["results"].get(name, {})
+        for metric, value in stats.items():
+            old = old_stats.get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            worse = -change if METRICS[metric] else change
+            marker = " REGRESSION" if worse > threshold else ""
+            print(f"{name:<28} {metric:<14} {old:12.2f} -> {value:12.2f} ({change:+.1%}){marker}")
+            if worse > threshold:
+                regressions.append((name, metric, old, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory to generate the corpus in (default: a temporary directory)")
+    parser.add_argument("--files-per-kind", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of this many runs")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma-separated subset of %(default)s")
+    parser.add_argument("--save", metavar="JSON", help="write results to this file")
+    parser.add_argument("--compare", metavar="JSON", help="compare against results saved with --save")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0,
+        help="percentage by which a metric must get worse to count as a regression (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    targets = [target for target in args.targets.split(",") if target]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmarks(args.corpus or tmp, args.files_per_kind, args.seed, args.repeat, targets)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["meta"] != results["meta"]:
+            print(f"warning: baseline was recorded with {baseline['meta']}", file=sys.stderr)
+        regressions = compare(baseline, results, args.threshold / 100)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare per-node traversal overhead of `ast.NodeVisitor` dispatch with the
+iterative walker used by `Visitor.visit`.
+
+Usage:
+    python benchmarks/walker.py [--functions N] [--repeat N]
+"""
+
+import argparse
+import ast
+import time
+
+from flake8_qiskit_migration.plugin import Visitor
+
+
+class _RecursiveDispatch(ast.NodeVisitor):
+    """`ast.NodeVisitor` with the same handler set as `Visitor`, doing no work"""
+
+    def _descend(self, node):
+        self.generic_visit(node)
+
+    visit_Import = visit_ImportFrom = visit_Attribute = visit_Call = _descend
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _descend
+
+
+class _IterativeDispatch(Visitor):
+    """`Visitor.visit` with handlers that do no work"""
+
+    def __init__(self):
+        super().__init__()
+
+    def _descend(self, node):
+        return None
+
+    visit_Import = visit_ImportFrom = visit_Attribute = visit_Call = _descend
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _descend
+
+
+def make_source(functions: int) -> str:
+    body = ["import numpy as np", "from qiskit import QuantumCircuit, transpile", ""]
+    for i in range(functions):
+        body += [
+            f"def build_{i}(backend, params):",
+            "    qc = QuantumCircuit(4, 4)",
+            "    for q in range(4):",
+            "        qc.h(q).c_if(0, 1) if q % 2 else qc.rx(params[q] * np.pi / 2, q)",
+            "    result = {'counts': [x ** 2 for x in range(10)], 'name': f'circuit-{q}'}",
+            "    return transpile(qc, backend=backend, optimization_level=3), result",
+            "",
+        ]
+    return "\n".join(body)
+
+
+def best_time(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=2000, help="size of the generated file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tree = ast.parse(make_source(args.functions))
+    nodes = sum(1 for _ in ast.walk(tree))
+    print(f"{nodes} nodes")
+    rows = [
+        ("ast.NodeVisitor dispatch", lambda: _RecursiveDispatch().visit(tree)),
+        ("iterative walker", lambda: _IterativeDispatch().visit(tree)),
+        ("Visitor (full checks)", lambda: Visitor().visit(tree)),
+    ]
+    baseline = None
+    for name, func in rows:
+        seconds = best_time(func, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:<28} {seconds * 1e9 / nodes:8.1f} ns/node  {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Programmatic interface for checking many sources in one call.
+
+`Plugin(tree).run()` checks one already-parsed tree and reports plain flake8
+tuples. `check_many` takes source code as it comes (text or bytes), reuses
+one `Visitor` and the compiled rule tables for all of it, can spread the work
+over worker processes, and yields structured findings lazily:
+
+    from flake8_qiskit_migration.api import check_many
+
+    for finding in check_many([source, (other_source, "other.py")]):
+        print(finding.filename, finding.line, finding.code, finding.replacement)
+"""
+
+from __future__ import annotations
+
+import ast
+from collections import deque
+from typing import Iterable, Iterator, NamedTuple, Tuple, Union
+
+from .engine import ScanError, decode_source
+from .plugin import Problem, Visitor, may_have_problems, refresh_rule_index, select_codes
+from .rules import replacement_hint
+
+Source = Union[str, bytes, memoryview]
+
+# Sources sent to a worker process at a time, and chunks queued per worker
+_CHUNK_SIZE = 16
+_CHUNKS_PER_JOB = 4
+
+
+class Finding(NamedTuple):
+    """One problem found by `check_many`"""
+
+    # Position of the source in the input, and its filename if one was given
+    index: int
+    filename: str | None
+    # 1-based line and 0-based column, as flake8 reports them
+    line: int
+    col: int
+    code: str
+    # Complete message, starting with the code
+    msg: str
+    # Rule table key that matched, see `plugin.Problem.key`
+    key: str | tuple[str, str] | None
+    # What the message suggests using instead, if it names something
+    replacement: str | None
+
+
+def check_many(
+    sources: Iterable[Source | Tuple[Source, str]],
+    select: list[str] | None = None,
+    ignore: list[str] = (),
+    jobs: int = 1,
+    errors: str = "raise",
+) -> Iterator[Finding]:
+    """
+    Check the source code of many Python files.
+
+    Args:
+        sources: source code as `str`, or as `bytes` or `memoryview` decoded
+            the way Python would (PEP 263), each optionally paired with a
+            filename as `(source, filename)`; consumed lazily
+        select, ignore: code prefixes to check for or not, as on the command
+            line (see `plugin.select_codes`)
+        jobs: number of worker processes; 1 checks in this process
+        errors: "raise" to raise `engine.ScanError` for a source that can't be
+            decoded or parsed, or "skip" to skip it
+
+    Yields:
+        Findings of each source sorted by position, sources in input order
+    """
+    if errors not in ("raise", "skip"):
+        raise ValueError(f"errors must be 'raise' or 'skip', not {errors!r}")
+    codes = select_codes(select, ignore)
+    if codes is not None and not codes:
+        return
+    items = (_item(index, source) for index, source in enumerate(sources))
+    results = _check_in_pool(items, jobs, codes) if jobs > 1 else _check_here(items, codes)
+    for findings, error in results:
+        if error is not None:
+            if errors == "raise":
+                raise error
+            continue
+        yield from findings
+
+
+def _item(index: int, source) -> tuple[int, str | bytes, str | None]:
+    filename = None
+    if isinstance(source, tuple):
+        source, filename = source
+    if isinstance(source, memoryview):
+        source = source.tobytes()
+    return index, source, filename
+
+
+def _check(visitor: Visitor, index: int, source: str | bytes, filename: str | None) -> tuple[list[Finding], ScanError | None]:
+    """Findings of one source, or the error it couldn't be checked for"""
+    name = filename or f"<source {index}>"
+    try:
+        text = decode_source(source)
+        if not may_have_problems(text):
+            return [], None
+        tree = ast.parse(text, name)
+    except (SyntaxError, UnicodeDecodeError, ValueError) as err:
+        return [], ScanError(name, str(err))
+    visitor.reset()
+    visitor.visit(tree, text)
+    findings = [_finding(index, filename, problem) for problem in visitor.problems]
+    findings.sort(key=lambda finding: (finding.line, finding.col))
+    return findings, None
+
+
+def _finding(index: int, filename: str | None, problem: Problem) -> Finding:
+    code = problem.msg.split(":", 1)[0]
+    return Finding(
+        index, filename, problem.node.lineno, problem.node.col_offset, code, problem.msg, problem.key,
+        replacement_hint(problem.msg),
+    )
+
+
+def _check_here(items, codes: frozenset | None) -> Iterator[tuple[list[Finding], ScanError | None]]:
+    visitor = Visitor(codes)
+    for item in items:
+        yield _check(visitor, *item)
+
+
+# Visitor of the current worker process, see `_init_worker`
+_visitor: Visitor | None = None
+
+
+def _init_worker(codes: frozenset | None) -> None:
+    global _visitor
+    refresh_rule_index()
+    _visitor = Visitor(codes)
+
+
+def _check_chunk(chunk: list) -> list[tuple[list[Finding], ScanError | None]]:
+    return [_check(_visitor, *item) for item in chunk]
+
+
+def _chunks(items) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == _CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _check_in_pool(items, jobs: int, codes: frozenset | None) -> Iterator[tuple[list[Finding], ScanError | None]]:
+    # Only imported when needed, as it takes longer than checking a few files
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Submit chunks as results are consumed, so `sources` is read lazily and
+    # only a bounded number of sources is held in memory
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(codes,)) as pool:
+        try:
+            for chunk in _chunks(items):
+                pending.append(pool.submit(_check_chunk, chunk))
+                if len(pending) >= jobs * _CHUNKS_PER_JOB:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # If the caller stopped early, don't check what it won't read
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,145 @@
+"""
+Read Python files straight out of wheels, sdists and zip archives.
+
+A file in an archive is named `archive!member`, e.g.
+`dist/pkg-1.0-py3-none-any.whl!pkg/core.py`, and can be passed around like
+any other path: `engine.discover_files` expands an archive into its members,
+and `open_source` reads one member without extracting anything to disk.
+
+Each process keeps its most recently used archive open, as members are
+checked in order. Zip archives (including wheels) are indexed, so any member
+can be read directly. Members of a `.tar.gz` can only be reached by
+decompressing everything before them, so they are listed in the order they
+are stored, and read by stepping forward through the archive as far as the
+member asked for. As each worker process checks its share of the files in
+that order, this keeps to about one pass through the archive per process;
+only a member behind the current position restarts from the beginning.
+"""
+
+from __future__ import annotations
+
+import os
+import tarfile
+from typing import IO
+import zipfile
+
+# Archives that `discover_files` looks into when named explicitly
+ARCHIVE_EXTENSIONS = (".whl", ".zip", ".tar.gz", ".tgz")
+
+# Separates the path of an archive from the name of a member
+SEPARATOR = "!"
+
+_open_archive: tuple[tuple, zipfile.ZipFile | tarfile.TarFile, dict | None] | None = None
+
+
+class ArchiveError(Exception):
+    """An archive or one of its members can't be read"""
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def split_member(path: str) -> tuple[str, str] | None:
+    """`(archive, member)` if `path` names a file in an archive, else None"""
+    start = 0
+    while True:
+        index = path.find(SEPARATOR, start)
+        if index < 0:
+            return None
+        if is_archive(path[:index]):
+            if os.path.exists(path):
+                # A file that just has the separator in its name
+                return None
+            return path[:index], path[index + 1:]
+        start = index + 1
+
+
+def list_members(path: str, extensions: tuple[str, ...]) -> list[str]:
+    """
+    Paths (as `archive!member`) of the files in archive `path` with one of
+    `extensions`, in the order they are stored
+
+    Raises:
+        ArchiveError: if the archive can't be read
+    """
+    try:
+        if path.lower().endswith((".whl", ".zip")):
+            with zipfile.ZipFile(path) as archive:
+                names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            with tarfile.open(path, "r:*") as archive:
+                names = [info.name for info in archive if info.isfile()]
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as err:
+        raise ArchiveError(f"{path}: {err}") from err
+    return [f"{path}{SEPARATOR}{name}" for name in names if name.endswith(extensions)]
+
+
+def open_source(path: str) -> IO[bytes]:
+    """
+    Open a file, or a member of an archive if `path` is `archive!member`,
+    for reading in binary mode
+
+    Raises:
+        OSError: if it can't be read
+    """
+    parts = split_member(path)
+    if parts is None:
+        return open(path, "rb")
+    archive_path, member = parts
+    try:
+        archive, members = _archive(archive_path)
+        if members is None:
+            return archive.open(member)
+        f = archive.extractfile(_tar_member(archive, members, member))
+        if f is None:
+            raise KeyError(member)
+        return f
+    except KeyError:
+        raise FileNotFoundError(f"no member {member!r} in {archive_path}") from None
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as err:
+        raise OSError(str(err)) from err
+
+
+def _tar_member(archive: tarfile.TarFile, members: dict, name: str) -> tarfile.TarInfo:
+    """
+    The member `name` of `archive`, reading headers up to it if it hasn't
+    been reached yet; `members` holds those read so far, by name
+
+    Raises:
+        KeyError: if there is no such member
+    """
+    info = members.get(name)
+    while info is None:
+        # Unlike `getmembers()`, stops at the member, so its contents are read next
+        info = archive.next()
+        if info is None:
+            raise KeyError(name)
+        members.setdefault(info.name, info)
+        if info.name != name:
+            info = None
+    return info
+
+
+def _archive(path: str):
+    """The archive at `path` and, for tar archives, the members read so far, by name"""
+    global _open_archive
+    stat = os.stat(path)
+    identity = (path, stat.st_mtime_ns, stat.st_size)
+    if _open_archive is not None and _open_archive[0] == identity:
+        return _open_archive[1:]
+    close()
+    if path.lower().endswith((".whl", ".zip")):
+        archive, members = zipfile.ZipFile(path), None
+    else:
+        archive, members = tarfile.open(path, "r:*"), {}
+    _open_archive = (identity, archive, members)
+    return archive, members
+
+
+def close() -> None:
+    """Close the archive kept open by this process, if any"""
+    global _open_archive
+    if _open_archive is not None:
+        _open_archive[1].close()
+        _open_archive = None
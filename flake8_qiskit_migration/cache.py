@@ -0,0 +1,295 @@
+"""
+Persistent, content-addressed cache of results, shared by the
+`flake8-qiskit-migration` command and the flake8 plugin.
+
+Entries are keyed on the file contents together with `rules_fingerprint()`,
+so editing a file, upgrading this package or changing the rule tables all
+miss the cache rather than returning stale results. The database is SQLite
+in WAL mode so that parallel jobs on one machine can share it.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import functools
+import json
+import os
+import sys
+import time
+
+# Environment variable that turns the cache on, for both the command and flake8
+CACHE_DIR_ENV = "FLAKE8_QISKIT_MIGRATION_CACHE_DIR"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+# Entries kept by a `MemoryCache`
+DEFAULT_MAX_ENTRIES = 100_000
+
+# Bump when the layout of cached results changes, so old entries miss
+_RESULTS_FORMAT = b"2"
+
+# Check the total size every this many writes
+_EVICT_EVERY = 1000
+# Don't rewrite `last_used` on a hit more often than this (seconds)
+_TOUCH_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    findings TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+def _warn(path: str, err: Exception) -> None:
+    print(f"flake8-qiskit-migration: not using cache {path}: {err}", file=sys.stderr)
+
+
+def _or_miss(default=None):
+    """
+    Make a `ResultCache` method return `default` instead of raising if the
+    database fails (stays locked, is read-only or is corrupt), warning the
+    first time; after that, the cache is left alone, as a cache is only
+    there to save time
+    """
+
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._failed:
+                return default
+            try:
+                return method(self, *args, **kwargs)
+            except self._errors as err:
+                self._failed = True
+                _warn(self.path, err)
+                return default
+
+        return wrapper
+
+    return decorate
+
+
+def source_key(text: str, fingerprint: str) -> str:
+    """
+    Cache key for decoded source code under the rule tables identified by
+    `fingerprint` (see `plugin.rules_fingerprint`).
+
+    Newlines are normalized because flake8 reads files in universal newlines
+    mode but the command reads raw bytes.
+    """
+    import hashlib
+
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    digest = hashlib.sha256(_RESULTS_FORMAT + b"\0" + fingerprint.encode())
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+def cell_key(source: str, state, fingerprint: str) -> str:
+    """
+    Cache key for one notebook cell. Results of a cell depend on the aliases
+    defined by earlier cells, so `state` (see `Visitor.module_state`) is part
+    of the key.
+    """
+    return source_key(json.dumps(state, sort_keys=True) + "\0" + source, fingerprint)
+
+
+class ResultCache:
+    """
+    On-disk store mapping `source_key` to the `(line, column, message, key)`
+    results for that source (see `plugin.Problem.result`).
+    """
+
+    filename = "results.sqlite3"
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        # Imported here (and `hashlib` in `source_key`) because flake8 imports
+        # this module with the plugin in every run, cache or no cache
+        import sqlite3
+
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.filename)
+        self.max_size = max_size
+        self._writes = 0
+        self._errors = sqlite3.Error
+        self._failed = False
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> ResultCache | None:
+        """Open the cache configured by `CACHE_DIR_ENV`, if any (see `open`)"""
+        directory = os.environ.get(CACHE_DIR_ENV)
+        return cls.open(directory) if directory else None
+
+    @classmethod
+    def open(cls, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> ResultCache | None:
+        """Like the constructor, but warns and returns None if the cache can't be opened"""
+        import sqlite3
+
+        try:
+            return cls(directory, max_size)
+        except (OSError, sqlite3.Error) as err:
+            _warn(os.path.join(directory, cls.filename), err)
+            return None
+
+    def _get(self, key: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT findings, last_used FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, last_used = row
+        now = time.time()
+        if now - last_used > _TOUCH_INTERVAL:
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return data
+
+    def _put(self, key: str, data: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (key, findings, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, data, len(key) + len(data), time.time()),
+        )
+        self._writes += 1
+        if self._writes % _EVICT_EVERY == 0:
+            self.evict()
+
+    @_or_miss()
+    def get(self, key: str) -> list[tuple] | None:
+        data = self._get(key)
+        if data is None:
+            return None
+        return [tuple(finding) for finding in json.loads(data)]
+
+    @_or_miss()
+    def put(self, key: str, findings: list[tuple]) -> None:
+        self._put(key, json.dumps(findings))
+
+    @_or_miss()
+    def get_cell(self, key: str) -> tuple[list[tuple], list] | None:
+        """
+        Returns:
+            `(findings, state)` stored by `put_cell`, or None
+        """
+        data = self._get(key)
+        if data is None:
+            return None
+        findings, state = json.loads(data)
+        return [tuple(finding) for finding in findings], state
+
+    @_or_miss()
+    def put_cell(self, key: str, findings: list[tuple], state) -> None:
+        """Store the results of a cell and the visitor state after it"""
+        self._put(key, json.dumps([findings, state]))
+
+    def total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    @_or_miss(0)
+    def evict(self, max_size: int | None = None) -> int:
+        """
+        Delete least-recently used entries until the cache holds at most
+        `max_size` bytes (default: `self.max_size`).
+
+        Returns:
+            Number of entries deleted
+        """
+        max_size = self.max_size if max_size is None else max_size
+        excess = self.total_size() - max_size
+        if excess <= 0:
+            return 0
+        rows = self._conn.execute("SELECT key, size FROM results ORDER BY last_used").fetchall()
+        keys = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+        self._conn.execute("BEGIN")
+        self._conn.executemany("DELETE FROM results WHERE key = ?", keys)
+        self._conn.execute("COMMIT")
+        return len(keys)
+
+    def prune(self, max_age: float | None = None, max_size: int | None = None) -> int:
+        """
+        Delete entries unused for `max_age` seconds, then evict down to
+        `max_size` bytes, and reclaim the freed disk space.
+
+        Returns:
+            Number of entries deleted
+        """
+        deleted = 0
+        if max_age is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM results WHERE last_used < ?", (time.time() - max_age,)
+            )
+            deleted += cursor.rowcount
+        deleted += self.evict(max_size)
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.execute("VACUUM")
+        return deleted
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class MemoryCache:
+    """
+    In-memory LRU cache with the same interface as `ResultCache`, for
+    long-running processes. If `backing` is given, misses fall through to it
+    and writes go to both.
+    """
+
+    def __init__(self, backing: ResultCache | None = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.backing = backing
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, object] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str, load):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            return value
+        if self.backing is None:
+            return None
+        value = load(key)
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: str, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> list[tuple] | None:
+        return self._get(key, lambda key: self.backing.get(key))
+
+    def put(self, key: str, findings: list[tuple]) -> None:
+        self._store(key, findings)
+        if self.backing is not None:
+            self.backing.put(key, findings)
+
+    def get_cell(self, key: str) -> tuple[list[tuple], list] | None:
+        return self._get(key, lambda key: self.backing.get_cell(key))
+
+    def put_cell(self, key: str, findings: list[tuple], state) -> None:
+        self._store(key, (findings, state))
+        if self.backing is not None:
+            self.backing.put_cell(key, findings, state)
+
+    def close(self) -> None:
+        self._entries.clear()
+        if self.backing is not None:
+            self.backing.close()
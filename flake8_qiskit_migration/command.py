@@ -1,9 +1,225 @@
+import argparse
+import os
 import sys
-from flake8.main.cli import main as flake8_main
+
+from . import daemon
+from .cache import CACHE_DIR_ENV, DEFAULT_MAX_SIZE, ResultCache
+from .config import DEFAULT_EXCLUDE, ConfigError, load_config, normalize_pattern
+from .formats import FORMATS
+from .git import GitError
+from .profiling import PROFILE_ENV, enabled as profiling_enabled
+
+
+def _jobs(value: str) -> int:
+    if value == "auto":
+        return os.cpu_count() or 1
+    jobs = int(value)
+    if jobs < 1:
+        raise argparse.ArgumentTypeError("must be 'auto' or a positive integer")
+    return jobs
+
+
+def _comma_separated(value: str) -> list:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="flake8-qiskit-migration",
+        description="Detect deprecated/removed imports, methods, and arguments in Qiskit 1.0 and 2.0",
+        epilog="Pass --flake8 as the first argument to run through flake8 instead (all other flake8 options are then accepted).",
+    )
+    parser.add_argument("paths", nargs="*", default=["."], help="files and directories to check (default: .)")
+    parser.add_argument(
+        "-j", "--jobs", type=_jobs, default="auto",
+        help="number of worker processes, or 'auto' for one per CPU (default: auto)",
+    )
+    parser.add_argument(
+        "--exclude", type=_comma_separated,
+        help="comma-separated glob patterns of files and directories to skip "
+        "(default: flake8's exclude and extend-exclude options in setup.cfg, tox.ini or .flake8, or flake8's defaults)",
+    )
+    parser.add_argument(
+        "--select", type=_comma_separated, metavar="CODES",
+        help="comma-separated code prefixes to check for, e.g. QKT1 for Qiskit 1.0 only (default: all)",
+    )
+    parser.add_argument(
+        "--ignore", type=_comma_separated, metavar="CODES",
+        help="comma-separated code prefixes not to check for; the longer of a matching --select and --ignore prefix wins "
+        "(default: flake8's ignore option; its extend-ignore and per-file-ignores options apply too)",
+    )
+    parser.add_argument(
+        "--format", choices=FORMATS, default="text", dest="output_format",
+        help="output format: flake8's text format, JSON Lines, or a SARIF log (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--summary", action="store_true",
+        help="print counts of problems by code, deprecated name, directory and file instead of each problem "
+        "(as one JSON object with --format jsonl)",
+    )
+    parser.add_argument(
+        "--repos", action="store_true",
+        help="scan each subdirectory of the given directories as a separate repository, "
+        "checking files with identical contents only once",
+    )
+    parser.add_argument(
+        "--diff-base", metavar="REF",
+        help="only report problems on lines changed since the merge base of REF and HEAD (uses local git)",
+    )
+    parser.add_argument(
+        "--rev", metavar="REV",
+        help="check files as they are in git revision REV (e.g. a tag), read from the local repository without a checkout",
+    )
+    parser.add_argument(
+        "--fix", action="store_true",
+        help="rewrite deprecated imports and method calls that have an exact replacement, in place "
+        "(only in .py files); other problems are counted but left as they are",
+    )
+    parser.add_argument(
+        "--diff", action="store_true",
+        help="print what --fix would change as a unified diff, without changing any files",
+    )
+    parser.add_argument(
+        "--cache-dir", default=os.environ.get(CACHE_DIR_ENV),
+        help=f"directory of a persistent result cache shared between runs (default: ${CACHE_DIR_ENV}, or no cache)",
+    )
+    parser.add_argument(
+        "--cache-max-size", type=int, default=DEFAULT_MAX_SIZE // 2**20, metavar="MB",
+        help="evict least-recently used cache entries beyond this size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--prune-cache", type=float, metavar="DAYS",
+        help="delete cache entries not used in DAYS days, shrink the cache to --cache-max-size, and exit",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", default=profiling_enabled(),
+        help=f"print where the checker spent its time to stderr (default: on if ${PROFILE_ENV} is set)",
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="run a server that keeps the checker loaded, and that later runs of this command use automatically",
+    )
+    parser.add_argument(
+        "--socket", default=None,
+        help=f"Unix socket of the daemon (default: ${daemon.SOCKET_ENV}, or a per-user path)",
+    )
+    parser.add_argument(
+        "--no-daemon", action="store_true",
+        help="check in this process even if a daemon is running",
+    )
+    parser.add_argument(
+        "--lsp", action="store_true",
+        help="run a language server on stdin/stdout, for editors",
+    )
+    return parser
+
 
 def cli():
-    # I don't love this as `flake8_main` technically isn't a public API, but we
-    # can't use `subprocess.run` as `pipx run ...` doesn't make `flake8`
-    # available on PATH. I think this workaround is probably OK as
-    # `flake8_main` hasn't changed in ~3yrs.
-    flake8_main(["--select", "QKT"] + sys.argv[1:])
+    argv = sys.argv[1:]
+    if argv[:1] == ["--flake8"]:
+        # I don't love this as `flake8_main` technically isn't a public API, but we
+        # can't use `subprocess.run` as `pipx run ...` doesn't make `flake8`
+        # available on PATH. I think this workaround is probably OK as
+        # `flake8_main` hasn't changed in ~3yrs.
+        from flake8.main.cli import main as flake8_main
+        flake8_main(["--select", "QKT"] + argv[1:])
+        return
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    cache_max_size = args.cache_max_size * 2**20
+    if args.prune_cache is not None:
+        if not args.cache_dir:
+            parser.error("--prune-cache needs --cache-dir")
+        import sqlite3
+
+        try:
+            cache = ResultCache(args.cache_dir, cache_max_size)
+            deleted = cache.prune(max_age=args.prune_cache * 86400)
+            cache.close()
+        except (OSError, sqlite3.Error) as err:
+            parser.exit(1, f"flake8-qiskit-migration: can't prune cache: {err}\n")
+        print(f"Deleted {deleted} cache entries")
+        return
+    if args.lsp:
+        from . import lsp
+        sys.exit(lsp.main())
+    if args.daemon:
+        try:
+            daemon.serve(
+                args.socket,
+                args.cache_dir,
+                cache_max_size,
+                ready=lambda server: print(f"Listening on {args.socket or daemon.default_socket_path()}", file=sys.stderr),
+            )
+        except daemon.DaemonError as err:
+            parser.error(str(err))
+        return
+    if sum(map(bool, (args.repos, args.diff_base, args.rev))) > 1:
+        parser.error("only one of --repos, --diff-base and --rev can be given")
+    if args.repos:
+        for path in args.paths:
+            if not os.path.isdir(path):
+                parser.error(f"--repos needs directories of repositories, but {path} is not a directory")
+    if args.summary and args.output_format == "sarif":
+        parser.error("--summary can't be written as SARIF; use --format text or jsonl")
+    fix = args.fix or args.diff
+    if fix:
+        for option, given in [
+            ("--repos", args.repos), ("--diff-base", args.diff_base), ("--rev", args.rev),
+            ("--summary", args.summary), ("--format", args.output_format != "text"),
+        ]:
+            if given:
+                parser.error(f"{option} can't be combined with --fix or --diff")
+    try:
+        config = load_config()
+    except ConfigError as err:
+        parser.error(str(err))
+    # Options given here replace those in the file, as with flake8
+    if args.exclude is not None:
+        exclude = [normalize_pattern(pattern) for pattern in args.exclude]
+    else:
+        exclude = list(DEFAULT_EXCLUDE if config.exclude is None else config.exclude)
+    exclude.extend(config.extend_exclude)
+    ignore = list(config.ignore or () if args.ignore is None else args.ignore)
+    ignore.extend(config.extend_ignore)
+    if not (fix or args.no_daemon or args.diff_base or args.profile or args.summary or args.repos or args.rev or args.output_format != "text"):
+        try:
+            sys.exit(
+                daemon.scan(
+                    args.paths, exclude, args.select, ignore, socket_path=args.socket,
+                    per_file_ignores=config.per_file_ignores, jobs=args.jobs, cache_dir=args.cache_dir,
+                )
+            )
+        except (daemon.DaemonNotRunning, daemon.DaemonDeclined):
+            pass
+        except daemon.DaemonError as err:
+            print(f"flake8-qiskit-migration: not using daemon: {err}", file=sys.stderr)
+
+    # Imported here so that runs served by the daemon don't pay for it
+    from . import engine
+    from .plugin import select_codes
+
+    try:
+        exit_code = engine.run(
+            args.paths,
+            jobs=args.jobs,
+            exclude=exclude,
+            cache_dir=args.cache_dir,
+            cache_max_size=cache_max_size,
+            diff_base=args.diff_base,
+            profile=args.profile,
+            codes=select_codes(args.select, ignore),
+            output_format=args.output_format,
+            summary=args.summary,
+            repos=args.repos,
+            rev=args.rev,
+            fix=fix,
+            show_diff=args.diff,
+            per_file_codes=tuple(
+                (pattern, select_codes(args.select, [*ignore, *codes])) for pattern, codes in config.per_file_ignores
+            ),
+        )
+    except GitError as err:
+        parser.error(str(err))
+    sys.exit(exit_code)
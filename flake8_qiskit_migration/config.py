@@ -0,0 +1,146 @@
+"""
+Options from flake8's configuration file, for the standalone engine, so that
+it skips and ignores what `flake8 --select QKT` would in the same project.
+
+The file is found as flake8 finds it: the first `setup.cfg`, `tox.ini` or
+`.flake8` with a `[flake8]` section, in the current directory or the nearest
+parent directory that has one. Only the options that change which QKT
+problems are reported are read: `exclude`, `extend-exclude`, `ignore`,
+`extend-ignore` and `per-file-ignores`.
+"""
+
+from __future__ import annotations
+
+import configparser
+import fnmatch
+import os
+import re
+from typing import NamedTuple
+
+# Same defaults as flake8's `--exclude`
+DEFAULT_EXCLUDE = (".svn", "CVS", ".bzr", ".hg", ".git", "__pycache__", ".tox", ".nox", ".eggs", "*.egg")
+
+_CONFIG_FILES = ("setup.cfg", "tox.ini", ".flake8")
+_SEPARATOR = re.compile(r"[,\s]")
+
+
+class ConfigError(Exception):
+    """The configuration file can't be used"""
+
+
+class Flake8Config(NamedTuple):
+    # Options not set are None (or empty, for the `extend-` ones)
+    exclude: tuple[str, ...] | None = None
+    extend_exclude: tuple[str, ...] = ()
+    ignore: tuple[str, ...] | None = None
+    extend_ignore: tuple[str, ...] = ()
+    # `(filename pattern, code prefixes)` pairs
+    per_file_ignores: tuple[tuple[str, list[str]], ...] = ()
+
+
+def comma_separated(value: str) -> list[str]:
+    """Split a list option the way flake8 does, on commas and whitespace"""
+    return [item for item in (item.strip() for item in _SEPARATOR.split(value)) if item]
+
+
+def normalize_pattern(pattern: str, parent: str = os.curdir) -> str:
+    """
+    Make a pattern that names a path (contains a separator, or is `.`)
+    absolute, relative to `parent`, as flake8 does with `--exclude`
+    """
+    if pattern == "." or os.sep in pattern or (os.altsep and os.altsep in pattern):
+        pattern = os.path.abspath(os.path.join(parent, pattern))
+    return pattern.rstrip(os.sep + (os.altsep or ""))
+
+
+def matches_filename(path: str, patterns) -> bool:
+    """Whether the basename or absolute path of `path` matches one of `patterns`, as in flake8"""
+    basename = os.path.basename(path)
+    if basename not in (".", "..") and any(fnmatch.fnmatch(basename, pattern) for pattern in patterns):
+        return True
+    absolute = os.path.abspath(path)
+    return any(fnmatch.fnmatch(absolute, pattern) for pattern in patterns)
+
+
+def find_config_file(directory: str = os.curdir) -> str | None:
+    """The configuration file flake8 would read when run in `directory`, if any"""
+    directory = os.path.abspath(directory)
+    home = os.path.expanduser("~")
+    while True:
+        for name in _CONFIG_FILES:
+            path = os.path.join(directory, name)
+            parser = configparser.RawConfigParser()
+            try:
+                parser.read(path, encoding="UTF-8")
+            except (UnicodeDecodeError, configparser.ParsingError):
+                # flake8 skips these too
+                continue
+            if "flake8" in parser or "flake8:local-plugins" in parser:
+                return path
+        parent = os.path.dirname(directory)
+        if parent == directory or parent == home:
+            return None
+        directory = parent
+
+
+def load_config(directory: str = os.curdir) -> Flake8Config:
+    """
+    Read the options from flake8's configuration file, as flake8 would when
+    run in `directory`; path-like exclude patterns are made absolute,
+    relative to the file
+
+    Raises:
+        ConfigError: if `per-file-ignores` can't be parsed
+    """
+    path = find_config_file(directory)
+    if path is None:
+        return Flake8Config()
+    parser = configparser.RawConfigParser()
+    parser.read(path, encoding="UTF-8")
+    if "flake8" not in parser:
+        return Flake8Config()
+    section = parser["flake8"]
+    parent = os.path.dirname(path)
+
+    def option(name: str) -> str | None:
+        # flake8 accepts both spellings
+        return section.get(name, section.get(name.replace("-", "_")))
+
+    def patterns(name: str) -> tuple[str, ...] | None:
+        value = option(name)
+        return None if value is None else tuple(normalize_pattern(pattern, parent) for pattern in comma_separated(value))
+
+    def prefixes(name: str) -> tuple[str, ...] | None:
+        value = option(name)
+        return None if value is None else tuple(comma_separated(value))
+
+    per_file_ignores = []
+    value = option("per-file-ignores")
+    if value:
+        # Only imported when needed, as importing flake8 takes a while
+        from flake8.utils import parse_files_to_codes_mapping
+
+        try:
+            per_file_ignores = parse_files_to_codes_mapping(value)
+        except ValueError as err:
+            raise ConfigError(f"{path}: per-file-ignores: {err}") from err
+    return Flake8Config(
+        exclude=patterns("exclude"),
+        extend_exclude=patterns("extend-exclude") or (),
+        ignore=prefixes("ignore"),
+        extend_ignore=prefixes("extend-ignore") or (),
+        per_file_ignores=tuple((normalize_pattern(pattern), codes) for pattern, codes in per_file_ignores),
+    )
+
+
+def codes_for(path: str, codes: frozenset | None, per_file_codes) -> frozenset | None:
+    """
+    The codes to check for in `path`: those of the longest pattern in
+    `per_file_codes` (`(pattern, codes)` pairs) it matches, as flake8 picks
+    per-file-ignores, or `codes` if none matches
+    """
+    matched = -1
+    for pattern, pattern_codes in per_file_codes:
+        if len(pattern) > matched and matches_filename(path, (pattern,)):
+            matched, codes = len(pattern), pattern_codes
+    return codes
@@ -0,0 +1,351 @@
+"""
+Long-running lint server, and the client the command uses to talk to it.
+
+Starting Python, importing the checker and loading the rule tables costs far
+more than checking a typical file, and pre-commit hooks and editors pay it on
+every run. `flake8-qiskit-migration --daemon` pays it once, then serves
+requests on a Unix socket with the rule index and results of unchanged files
+already in memory.
+
+The protocol is one JSON object per line in each direction. A request may
+contain any of:
+
+    {"identity": "...",               # see `identity`; mismatches are refused
+     "codes": ["QKT1"], "ignore": [], # --select/--ignore prefixes (optional)
+     "scan": {"cwd": "...", "paths": [...], "exclude": [...],
+              "per_file_ignores": [["pattern", ["QKT2"]], ...],
+              "jobs": 4, "cache_dir": "..."},
+     "files": ["/abs/path.py", ...],
+     "sources": [["filename", "source code"], ...]}
+
+and gets back, respectively
+
+    {"output": ["path:line:col: msg", ...], "errors": ["...", ...]}
+    {"files": [[findings or null, error or null], ...]}
+    {"sources": [[findings or null, error or null], ...]}
+
+where `output` is exactly what the command would print (or `{"declined":
+"..."}` if the command would check the files faster itself: with `jobs`
+worker processes, or with a `cache_dir` the daemon doesn't use), and
+findings are
+`[line, col, msg, cell, key]` lists with the line and column as `Plugin.run`
+yields them. Any failure is reported as `{"error": "..."}`.
+
+Only the standard library is imported here at module level, so the client
+starts quickly; the server imports the checker when it starts.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import socket
+import sys
+import tempfile
+import zlib
+
+# Environment variable overriding the socket path, for both server and client
+SOCKET_ENV = "FLAKE8_QISKIT_MIGRATION_SOCKET"
+
+# Seconds the client waits to connect before checking in-process instead
+_CONNECT_TIMEOUT = 1.0
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class DaemonError(Exception):
+    """The daemon refused or failed a request"""
+
+
+class DaemonNotRunning(DaemonError):
+    """There is no daemon to send requests to"""
+
+
+class DaemonDeclined(DaemonError):
+    """The daemon would be slower than checking in-process"""
+
+
+def available() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def default_socket_path() -> str:
+    """Per-user socket path, in `$XDG_RUNTIME_DIR` if set"""
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"flake8-qiskit-migration-{os.getuid()}.sock")
+
+
+@functools.lru_cache(maxsize=None)
+def identity() -> str:
+    """
+    Identify the installed checker by its location and source code, so a
+    client never gets results from a daemon started with different code or
+    rule tables.
+    """
+    checksum = 0
+    for name in sorted(os.listdir(_PACKAGE_DIR)):
+        if name.endswith(".py"):
+            with open(os.path.join(_PACKAGE_DIR, name), "rb") as f:
+                checksum = zlib.crc32(f.read(), checksum)
+    return f"{_PACKAGE_DIR}:{checksum:08x}"
+
+
+def request(payload: dict, socket_path: str | None = None) -> dict:
+    """
+    Send one request to the daemon and wait for its response.
+
+    Raises:
+        DaemonNotRunning: if no daemon is listening
+        DaemonError: if the daemon returned an error
+    """
+    if not available():
+        raise DaemonNotRunning("Unix sockets are not supported on this platform")
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        raise DaemonNotRunning(f"no daemon listening on {socket_path}")
+    payload = dict(payload, identity=identity())
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(_CONNECT_TIMEOUT)
+        try:
+            sock.connect(socket_path)
+        except OSError as err:
+            raise DaemonNotRunning(f"could not connect to {socket_path}: {err}") from err
+        sock.settimeout(None)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(payload).encode() + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise DaemonError("daemon closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise DaemonError(response["error"])
+    return response
+
+
+def scan(
+    paths: list[str],
+    exclude: list[str] | None = None,
+    select: list[str] | None = None,
+    ignore: list[str] = (),
+    out=None,
+    socket_path: str | None = None,
+    per_file_ignores=(),
+    jobs: int = 1,
+    cache_dir: str | None = None,
+) -> int:
+    """
+    Like `engine.run`, but checked by the daemon. `per_file_ignores` are
+    `(pattern, code prefixes)` pairs, as read by `config.load_config`.
+
+    Returns:
+        Exit code: 1 if any problems were found, 0 otherwise
+
+    Raises:
+        DaemonDeclined: if `engine.run` with `jobs` and `cache_dir` would be
+            faster; nothing has been printed
+        DaemonError: if the daemon can't be used; nothing has been printed
+    """
+    response = request(
+        {
+            "scan": {
+                "cwd": os.getcwd(),
+                "paths": paths,
+                "exclude": exclude,
+                "per_file_ignores": [list(entry) for entry in per_file_ignores],
+                "jobs": jobs,
+                "cache_dir": cache_dir and os.path.abspath(cache_dir),
+            },
+            "codes": select,
+            "ignore": list(ignore),
+        },
+        socket_path,
+    )
+    if "declined" in response:
+        raise DaemonDeclined(response["declined"])
+    out = out or sys.stdout
+    for error in response["errors"]:
+        print(f"flake8-qiskit-migration: skipping {error}", file=sys.stderr)
+    for line in response["output"]:
+        print(line, file=out)
+    return int(bool(response["output"]))
+
+
+class _Server:
+    """Request handling, with the checker and caches kept between requests"""
+
+    def __init__(self, cache_dir: str | None, cache_max_size: int):
+        import threading
+
+        from . import engine
+        from .cache import MemoryCache, ResultCache
+        from .config import normalize_pattern
+        from .plugin import refresh_rule_index, select_codes
+
+        self._engine = engine
+        self._normalize_pattern = normalize_pattern
+        self._select_codes = select_codes
+        self._identity = identity()
+        self._cache = MemoryCache(ResultCache.open(cache_dir, cache_max_size) if cache_dir else None)
+        self._cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        # Requests are handled one at a time; the work is CPU-bound anyway
+        self._lock = threading.Lock()
+        refresh_rule_index()
+
+    def handle(self, payload: dict) -> dict:
+        if payload.get("identity") != self._identity:
+            return {"error": "daemon was started from a different version of flake8-qiskit-migration"}
+        with self._lock:
+            select, ignore = payload.get("codes"), payload.get("ignore") or []
+            codes = self._select_codes(select, ignore)
+            response = {}
+            if "scan" in payload:
+                scan = dict(payload["scan"])
+                per_file_codes = tuple(
+                    (pattern, self._select_codes(select, [*ignore, *prefixes]))
+                    for pattern, prefixes in scan.pop("per_file_ignores", ())
+                )
+                response.update(self._scan(codes, per_file_codes, **scan))
+            if "files" in payload:
+                response["files"] = [self._check(path, None, codes) for path in payload["files"]]
+            if "sources" in payload:
+                response["sources"] = [self._check(filename, source, codes) for filename, source in payload["sources"]]
+            return response
+
+    def _findings(self, path: str, source: str | None, codes) -> list:
+        engine = self._engine
+        if source is not None:
+            return engine.check_source(source, path, self._cache, codes)
+        if path.endswith(".ipynb"):
+            return engine.check_notebook(path, self._cache, codes)
+        return engine.check_file(path, self._cache, codes)
+
+    def _check(self, path: str, source: str | None, codes) -> list:
+        try:
+            findings = self._findings(path, source, codes)
+        except self._engine.ScanError as err:
+            return [None, str(err)]
+        return [[list(finding) for finding in findings], None]
+
+    def _scan(
+        self,
+        codes,
+        per_file_codes,
+        cwd: str,
+        paths: list[str],
+        exclude: list[str] | None,
+        jobs: int = 1,
+        cache_dir: str | None = None,
+    ) -> dict:
+        engine = self._engine
+        if cache_dir is not None and cache_dir != self._cache_dir:
+            return {"declined": f"the daemon doesn't use the cache in {cache_dir}"}
+        # Files are found by absolute path, so path-like patterns must be
+        # relative to the client's directory, not the daemon's
+        exclude = [
+            self._normalize_pattern(pattern, cwd)
+            for pattern in (engine.DEFAULT_EXCLUDE if exclude is None else exclude)
+        ]
+        per_file_codes = [
+            (self._normalize_pattern(pattern, cwd), pattern_codes) for pattern, pattern_codes in per_file_codes
+        ]
+        # Check files by absolute path, but print them as the client named them
+        files = {}
+        for path in paths:
+            absolute = os.path.join(cwd, path)
+            for file in engine.discover_files([absolute], exclude):
+                files[path + file[len(absolute):]] = file
+        if engine.pool_size(jobs, len(files)) > 1:
+            return {"declined": f"{len(files)} files are checked faster by {jobs} processes"}
+        output, errors = [], []
+        for shown in sorted(files):
+            try:
+                findings = self._findings(files[shown], None, engine.codes_for(files[shown], codes, per_file_codes))
+            except engine.ScanError as err:
+                errors.append(str(err.for_path(shown)))
+                continue
+            output.extend(engine.format_result(shown, finding) for finding in findings)
+        return {"output": output, "errors": errors}
+
+    def close(self) -> None:
+        self._cache.close()
+
+
+def serve(
+    socket_path: str | None = None,
+    cache_dir: str | None = None,
+    cache_max_size: int | None = None,
+    ready=None,
+) -> None:
+    """
+    Run the daemon in the foreground until interrupted.
+
+    Args:
+        socket_path: where to listen (default: `default_socket_path()`)
+        cache_dir: persistent result cache to put behind the in-memory one
+        cache_max_size: size limit of that cache in bytes
+        ready: called with the server once the socket is listening; its
+            `shutdown()` method stops the daemon from another thread
+
+    Raises:
+        DaemonError: if a daemon is already listening on `socket_path`
+    """
+    import signal
+    import socketserver
+    import threading
+
+    from .cache import DEFAULT_MAX_SIZE
+
+    if not available():
+        raise DaemonError("Unix sockets are not supported on this platform")
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(socket_path)
+            except OSError:
+                os.unlink(socket_path)  # left behind by a daemon that died
+            else:
+                raise DaemonError(f"a daemon is already listening on {socket_path}")
+
+    server_state = _Server(cache_dir, cache_max_size or DEFAULT_MAX_SIZE)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    response = server_state.handle(json.loads(line))
+                except Exception as err:  # keep serving other clients
+                    response = {"error": f"{type(err).__name__}: {err}"}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # Only the current user may connect
+    umask = os.umask(0o077)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(umask)
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    try:
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, stop)
+        if ready is not None:
+            ready(server)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server_state.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
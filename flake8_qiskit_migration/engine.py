@@ -0,0 +1,839 @@
+"""
+Standalone scan engine used by the `flake8-qiskit-migration` command.
+
+This runs the same `Visitor` as the flake8 plugin, but skips everything else
+flake8 does per file (plugin loading, pycodestyle's line processing, option
+handling), since the command only ever reports QKT codes.
+"""
+
+from __future__ import annotations
+
+import ast
+from collections import Counter
+import difflib
+import fnmatch
+import functools
+import hashlib
+import io
+import os
+import sys
+import tokenize
+from typing import Iterable, Iterator, NamedTuple
+
+from .archives import ArchiveError, close as close_archive, is_archive, list_members, open_source, split_member
+from .cache import DEFAULT_MAX_SIZE, ResultCache, cell_key, source_key
+from .config import DEFAULT_EXCLUDE, codes_for, matches_filename
+from .fixes import apply_edits, find_fixes, write_atomic
+from .git import BlobReader, GitError, changed_lines, in_ranges, list_tree
+from .noqa import message_code, noqa_comments
+from .notebook import NotebookError, read_code_cells, strip_magics
+from .plugin import Visitor, may_have_problems, refresh_rule_index, rules_fingerprint
+from .profiling import Profile
+from .summary import Summary
+
+# Below this many files, starting worker processes costs more than it saves
+_MIN_FILES_PER_JOB = 8
+
+# File extensions found when searching directories
+SOURCE_EXTENSIONS = (".py", ".ipynb")
+
+# Allow top-level `await`, which notebooks support
+_NOTEBOOK_COMPILE_FLAGS = ast.PyCF_ONLY_AST | ast.PyCF_ALLOW_TOP_LEVEL_AWAIT
+
+
+class Finding(NamedTuple):
+    """One problem in a file; `col` is 0-based as in `Problem.format`"""
+
+    line: int
+    col: int
+    msg: str
+    # Notebook cell number, for notebooks only
+    cell: int | None = None
+    # Rule table key that matched, see `plugin.Problem.key`
+    key: str | tuple[str, str] | None = None
+
+    @classmethod
+    def from_result(cls, result, cell: int | None = None) -> Finding:
+        """From a `Problem.result()` tuple, possibly as read back from JSON"""
+        line, col, msg, key = result
+        return cls(line, col, msg, cell, tuple(key) if type(key) is list else key)
+
+
+# Result cache of the current (worker) process, see `_init_worker`
+_cache: ResultCache | None = None
+# Profile of the files checked since the last report, if profiling
+_profile: Profile | None = None
+# Codes to check for in the current (worker) process, None for all, and
+# `(pattern, codes)` pairs overriding them for the files they match (see
+# `config.codes_for`)
+_codes: frozenset | None = None
+_per_file_codes: tuple = ()
+# Object IDs of the files to check, when checking a git revision, and the
+# reader to read them with
+_blobs: dict[str, str] | None = None
+_blob_reader: BlobReader | None = None
+
+
+class ScanError(Exception):
+    """A file could not be read or parsed; formatted as `path: reason`"""
+
+    def __init__(self, path: str, reason: str):
+        super().__init__(path, reason)
+        self.path = path
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.reason}"
+
+    def for_path(self, path: str) -> ScanError:
+        """The same error for another file, e.g. a copy with the same contents"""
+        return ScanError(path, self.reason)
+
+
+def is_excluded(path: str, exclude: Iterable[str]) -> bool:
+    """
+    Whether `path`, its basename or its absolute path matches one of the
+    glob patterns in `exclude`; path-like patterns should be absolute (see
+    `config.normalize_pattern`), as in flake8
+    """
+    exclude = tuple(exclude)
+    return matches_filename(os.path.normpath(path), exclude) or any(fnmatch.fnmatch(path, pattern) for pattern in exclude)
+
+
+def discover_files(paths: Iterable[str], exclude: Iterable[str] = DEFAULT_EXCLUDE) -> list[str]:
+    """
+    Expand `paths` into a sorted list of Python files, like flake8 does.
+
+    Files named explicitly are always included, and archives named
+    explicitly (wheels, sdists, zip files) are expanded into their `*.py`
+    and `*.ipynb` members, as `archive!member` (see `archives`), which are
+    kept together in the order they are stored; directories
+    are searched recursively for `*.py` and `*.ipynb` files, skipping
+    anything matching `exclude`.
+    """
+    exclude = tuple(exclude)
+    files = set()
+    # Sort keys of archive members, `(archive, position)`
+    members = {}
+    for path in paths:
+        if not os.path.isdir(path):
+            if is_archive(path):
+                try:
+                    for position, member in enumerate(list_members(path, SOURCE_EXTENSIONS)):
+                        members.setdefault(member, (path, position))
+                    files.update(members)
+                    continue
+                except ArchiveError:
+                    # Reported when it is checked
+                    pass
+            files.add(path)
+            continue
+        for root, dirs, filenames in os.walk(path):
+            dirs[:] = [d for d in dirs if not is_excluded(os.path.join(root, d), exclude)]
+            for filename in filenames:
+                full_path = os.path.join(root, filename)
+                if filename.endswith(SOURCE_EXTENSIONS) and not is_excluded(full_path, exclude):
+                    files.add(full_path)
+    return sorted(files, key=lambda path: members.get(path, (path, -1)))
+
+
+def discover_repos(paths: Iterable[str], exclude: Iterable[str] = DEFAULT_EXCLUDE) -> list[tuple[str, list[str]]]:
+    """
+    Treat each subdirectory of the directories in `paths` as a separate
+    repository.
+
+    Returns:
+        `(repo, files)` for each repository in order, where `files` is as
+        returned by `discover_files`
+    """
+    exclude = tuple(exclude)
+    repos = []
+    for path in paths:
+        subdirectories = sorted(entry.path for entry in os.scandir(path) if entry.is_dir())
+        repos.extend(
+            (repo, discover_files([repo], exclude)) for repo in subdirectories if not is_excluded(repo, exclude)
+        )
+    return repos
+
+
+def _excluded_in_tree(path: str, exclude: tuple[str, ...]) -> bool:
+    """Whether `discover_files` would skip `path` (with `/` separators) or a directory it is in"""
+    parts = path.split("/")
+    return any(is_excluded("/".join(parts[:end]), exclude) for end in range(1, len(parts) + 1))
+
+
+def decode_source(source: bytes | str) -> str:
+    """Decode file contents using the encoding Python would use to run them"""
+    if isinstance(source, str):
+        return source
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(source).readline)
+    return source.decode(encoding)
+
+
+def check_source(
+    source: bytes | str,
+    filename: str = "<unknown>",
+    cache: ResultCache | None = None,
+    codes: frozenset | None = None,
+) -> list[Finding]:
+    """
+    Find problems in the source code of one Python file.
+
+    Args:
+        source: file contents
+        filename: used in error messages
+        cache: if given, look results up here before parsing, and store them
+            after
+        codes: only check for these codes (see `plugin.select_codes`)
+
+    Returns:
+        List of findings sorted by position, less those suppressed by
+        `# noqa` comments
+
+    Raises:
+        ScanError: if the source can't be decoded or parsed
+    """
+    try:
+        text = decode_source(source)
+    except (SyntaxError, UnicodeDecodeError) as err:
+        raise ScanError(filename, str(err)) from err
+    if codes is not None and not codes or not may_have_problems(text):
+        return []
+
+    if cache is not None:
+        key = source_key(text, rules_fingerprint(codes))
+        results = cache.get(key)
+        if results is not None:
+            return _without_noqa(text, sorted((Finding.from_result(result) for result in results), key=_position))
+
+    try:
+        tree = ast.parse(text, filename)
+    except (SyntaxError, ValueError) as err:
+        raise ScanError(filename, str(err)) from err
+    v = _new_visitor(codes)
+    v.visit(tree, text)
+    results = [problem.result() for problem in v.problems]
+    if cache is not None:
+        cache.put(key, results)
+    return _without_noqa(text, sorted((Finding.from_result(result) for result in results), key=_position))
+
+
+def _without_noqa(text: str, findings: list[Finding]) -> list[Finding]:
+    """`findings` less those that `# noqa` comments in `text` suppress (see `noqa`)"""
+    noqa = noqa_comments(text) if findings else None
+    if noqa is None:
+        return findings
+    return [finding for finding in findings if not noqa.ignores(finding.line, message_code(finding.msg))]
+
+
+def check_notebook(
+    path: str, cache: ResultCache | None = None, codes: frozenset | None = None, source: bytes | None = None
+) -> list[Finding]:
+    """
+    Find problems in the code cells of a Jupyter notebook.
+
+    Cells are visited in order by one `Visitor`, so names imported in earlier
+    cells resolve in later ones. IPython magics are ignored, and cells that
+    don't parse are skipped. `# noqa` comments apply within their cell, and a
+    `# flake8: noqa` line in any cell skips the whole notebook. With a
+    `cache`, each cell is cached separately (keyed on its source and the
+    names bound before it), so re-checking an edited notebook only visits
+    cells that changed or that depend on a change. `codes` is as for
+    `check_source`. The notebook is read from `path`,
+    unless its contents are given as `source`.
+
+    Returns:
+        List of findings with `cell` set, sorted by position
+
+    Raises:
+        ScanError: if the notebook can't be read
+    """
+    try:
+        with io.TextIOWrapper(open_source(path) if source is None else io.BytesIO(source), encoding="utf-8") as f:
+            cells = [(number, strip_magics(source)) for number, source in read_code_cells(f)]
+    except (OSError, UnicodeDecodeError, ValueError, NotebookError) as err:
+        raise ScanError(path, str(err)) from err
+    if codes is not None and not codes or not may_have_problems("".join(source for _, source in cells)):
+        return []
+    noqa = noqa_comments("\n".join(source for _, source in cells))
+    if noqa is not None and noqa.ignore_file:
+        return []
+
+    fingerprint = rules_fingerprint(codes) if cache is not None else None
+    v = _new_visitor(codes)
+    findings = []
+    for number, source in cells:
+        if cache is not None:
+            key = cell_key(source, v.module_state(), fingerprint)
+            entry = cache.get_cell(key)
+            if entry is not None:
+                results, state = entry
+                v.restore_module_state(state)
+                findings.extend(_without_noqa(source, [Finding.from_result(result, number) for result in results]))
+                continue
+        try:
+            tree = compile(source, f"{path}:{number}", "exec", _NOTEBOOK_COMPILE_FLAGS)
+        except (SyntaxError, ValueError):
+            continue
+        start = len(v.problems)
+        v.visit(tree, source)
+        results = [problem.result() for problem in v.problems[start:]]
+        if cache is not None:
+            cache.put_cell(key, results, v.module_state())
+        findings.extend(_without_noqa(source, [Finding.from_result(result, number) for result in results]))
+    return sorted(findings, key=_position)
+
+
+def _new_visitor(codes: frozenset | None) -> Visitor:
+    visitor = Visitor(codes)
+    return visitor if _profile is None else _profile.instrument(visitor)
+
+
+def pool_size(jobs: int, files: int) -> int:
+    """How many of `jobs` worker processes are worth starting to check `files` files; 1 or less means none"""
+    return min(jobs, files // _MIN_FILES_PER_JOB)
+
+
+def _position(finding: Finding) -> tuple[int, int, int]:
+    return finding.cell or 0, finding.line, finding.col
+
+
+def check_file(path: str, cache: ResultCache | None = None, codes: frozenset | None = None) -> list[Finding]:
+    """Read and check one file, which may be in an archive; see `check_source`"""
+    if is_archive(path):
+        # Only left unexpanded by `discover_files` if it couldn't be read
+        try:
+            list_members(path, SOURCE_EXTENSIONS)
+        except ArchiveError as err:
+            # Without the path the archive error starts with
+            raise ScanError(path, str(err.__cause__ or err)) from err
+    try:
+        with open_source(path) as f:
+            source = f.read()
+    except OSError as err:
+        raise ScanError(path, str(err)) from err
+    return check_source(source, path, cache, codes)
+
+
+def _check_file(path: str) -> tuple[str, list[Finding] | None, ScanError | None]:
+    global _blob_reader
+    codes = codes_for(path, _codes, _per_file_codes)
+    try:
+        if _blobs is not None:
+            if _blob_reader is None:
+                _blob_reader = BlobReader()
+            try:
+                source = _blob_reader.read(_blobs[path])
+            except GitError as err:
+                raise ScanError(path, str(err)) from err
+            if path.endswith(".ipynb"):
+                return path, check_notebook(path, _cache, codes, source), None
+            return path, check_source(source, path, _cache, codes), None
+        if path.endswith(".ipynb"):
+            return path, check_notebook(path, _cache, codes), None
+        return path, check_file(path, _cache, codes), None
+    except ScanError as err:
+        return path, None, err
+
+
+def _check_file_in_worker(path: str) -> tuple[str, list[Finding] | None, ScanError | None, Profile | None]:
+    """`_check_file`, plus the profile of just this file if profiling"""
+    global _profile
+    result = _check_file(path)
+    if _profile is None:
+        return (*result, None)
+    profile, _profile = _profile, Profile()
+    return (*result, profile)
+
+
+def _init_worker(
+    cache_dir: str | None,
+    cache_max_size: int,
+    profile: bool = False,
+    codes: frozenset | None = None,
+    blobs: dict[str, str] | None = None,
+    per_file_codes: tuple = (),
+) -> None:
+    global _cache, _profile, _codes, _per_file_codes, _blobs
+    refresh_rule_index()
+    _codes = codes
+    _per_file_codes = per_file_codes
+    _blobs = blobs
+    _cache = ResultCache.open(cache_dir, cache_max_size) if cache_dir else None
+    _profile = Profile() if profile else None
+
+
+def _close_worker() -> None:
+    """Undo `_init_worker` after checking in this process"""
+    global _cache, _profile, _codes, _per_file_codes, _blobs, _blob_reader
+    if _cache is not None:
+        _cache.close()
+    if _blob_reader is not None:
+        _blob_reader.close()
+    _cache = _profile = _codes = _blobs = _blob_reader = None
+    _per_file_codes = ()
+    close_archive()
+
+
+def scan(
+    files: list[str],
+    jobs: int = 1,
+    cache_dir: str | None = None,
+    cache_max_size: int = DEFAULT_MAX_SIZE,
+    profile: Profile | None = None,
+    codes: frozenset | None = None,
+    blobs: dict[str, str] | None = None,
+    per_file_codes: tuple = (),
+) -> Iterator[tuple[str, list[Finding] | None, ScanError | None]]:
+    """
+    Check `files`, using a pool of `jobs` processes if worthwhile.
+
+    Args:
+        files: paths to check
+        jobs: maximum number of worker processes
+        cache_dir: directory of the persistent result cache, or None to
+            disable it
+        cache_max_size: size limit of the cache in bytes
+        profile: if given, profile the `Visitor` in every process and merge
+            the results into this
+        codes: only check for these codes (see `plugin.select_codes`)
+        blobs: if given, read files from the git object database instead,
+            by the object IDs this maps `files` to (see `git.list_tree`)
+        per_file_codes: `(pattern, codes)` pairs to check the files that
+            match a pattern for other codes instead, as with flake8's
+            per-file-ignores (see `config.codes_for`)
+
+    Yields:
+        `(path, results, error)` in the same order as `files`; exactly one of
+        `results` and `error` is None
+    """
+    global _profile
+    jobs = pool_size(jobs, len(files))
+    if jobs <= 1:
+        _init_worker(cache_dir, cache_max_size, codes=codes, blobs=blobs, per_file_codes=per_file_codes)
+        _profile = profile
+        try:
+            yield from map(_check_file, files)
+        finally:
+            _close_worker()
+        return
+    # Only imported when needed, as it takes longer than checking a few files
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, min(64, len(files) // (jobs * 4)))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, cache_max_size, profile is not None, codes, blobs, per_file_codes),
+    ) as pool:
+        for path, results, error, file_profile in pool.map(_check_file_in_worker, files, chunksize=chunksize):
+            if file_profile is not None:
+                profile.merge(file_profile)
+            yield path, results, error
+
+
+def _summarize_chunk(chunk: list[tuple[str, list | None]], top: int) -> tuple[Summary, Profile | None]:
+    """
+    Summary of some files, each paired with its changed line ranges (see
+    `git.changed_lines`) or None to count all findings; plus the profile of
+    just these files if profiling
+    """
+    global _profile
+    summary = Summary(top)
+    for path, ranges in chunk:
+        path, results, error = _check_file(path)
+        if error is not None:
+            print(f"flake8-qiskit-migration: skipping {error}", file=sys.stderr)
+            summary.errors += 1
+            continue
+        if ranges is not None:
+            results = [result for result in results if result.cell is not None or in_ranges(result.line, ranges)]
+        summary.add(path, results)
+    if _profile is None:
+        return summary, None
+    profile, _profile = _profile, Profile()
+    return summary, profile
+
+
+def summarize(
+    files: list[str],
+    jobs: int = 1,
+    cache_dir: str | None = None,
+    cache_max_size: int = DEFAULT_MAX_SIZE,
+    profile: Profile | None = None,
+    codes: frozenset | None = None,
+    changed: dict | None = None,
+    top: int = 20,
+    blobs: dict[str, str] | None = None,
+    per_file_codes: tuple = (),
+) -> Summary:
+    """
+    Check `files` and count their findings, without keeping the findings.
+
+    Each worker process summarizes a chunk of files at a time and the partial
+    summaries are merged here. Arguments are as for `scan`, plus `changed`
+    (as returned by `git.changed_lines`) to only count findings on changed
+    lines, `top` (see `summary.Summary`), and `blobs` and `per_file_codes`
+    (as for `scan`).
+    """
+    global _profile
+    items = [(path, None if changed is None else changed[path]) for path in files]
+    summary = Summary(top)
+    jobs = pool_size(jobs, len(files))
+    if jobs <= 1:
+        _init_worker(cache_dir, cache_max_size, codes=codes, blobs=blobs, per_file_codes=per_file_codes)
+        _profile = profile
+        try:
+            summary.merge(_summarize_chunk(items, top)[0])
+        finally:
+            _close_worker()
+        return summary
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, min(64, len(files) // (jobs * 4)))
+    chunks = [items[start:start + chunksize] for start in range(0, len(items), chunksize)]
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, cache_max_size, profile is not None, codes, blobs, per_file_codes),
+    ) as pool:
+        for partial, chunk_profile in pool.map(functools.partial(_summarize_chunk, top=top), chunks):
+            summary.merge(partial)
+            if chunk_profile is not None:
+                profile.merge(chunk_profile)
+    return summary
+
+
+def _content_digest(path: str) -> bytes | str:
+    """Hash of the contents of a file, or the path itself if it can't be read"""
+    try:
+        with open_source(path) as f:
+            return hashlib.blake2b(f.read(), digest_size=16).digest()
+    except OSError:
+        return path
+
+
+def scan_deduplicated(
+    files: list[str], *args, per_file_codes: tuple = (), **kwargs
+) -> Iterator[tuple[str, list[Finding] | None, ScanError | None]]:
+    """
+    `scan`, but files with identical contents are only checked once.
+
+    Files are hashed before anything is parsed, and only the first of each
+    set of identical files is passed to `scan`; its results are reported for
+    every copy. Results of a file are kept only until its last copy has been
+    reported. Arguments are as for `scan`.
+    """
+    # Copies checked for different codes (see `config.codes_for`) are checked
+    # separately; the per-file codes only ever narrow the default ones
+    digests = [(_content_digest(path), codes_for(path, None, per_file_codes)) for path in files]
+    close_archive()
+    copies = Counter(digests)
+    seen = set()
+    unique = []
+    for path, digest in zip(files, digests):
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(path)
+    del seen
+    results = scan(unique, *args, per_file_codes=per_file_codes, **kwargs)
+    known = {}
+    for path, digest in zip(files, digests):
+        if digest in known:
+            findings, error = known[digest]
+            if error is not None:
+                error = error.for_path(path)
+        else:
+            _, findings, error = next(results)
+            known[digest] = (findings, error)
+        copies[digest] -= 1
+        if not copies[digest]:
+            del known[digest]
+        yield path, findings, error
+
+
+def fix_file(path: str, codes: frozenset | None = None, write: bool = True) -> tuple[int, int, str | None]:
+    """
+    Fix the mechanical problems in one Python file (see `fixes`), reading it
+    once and replacing it with one atomic write if anything changed.
+
+    Args:
+        path: file to fix
+        codes: only fix problems with these codes (see `plugin.select_codes`)
+        write: if False, leave the file as it is and return the diff instead
+
+    Returns:
+        `(fixed, left, diff)`: the numbers of problems fixed and left to fix
+        by hand (found by checking the fixed source again, as fixing an
+        import also fixes the uses of the name it binds), and the changes as
+        a unified diff if not `write` and there are any. Problems suppressed
+        by `# noqa` comments are neither fixed nor counted.
+
+    Raises:
+        ScanError: if the file can't be read, decoded or parsed
+    """
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+    except OSError as err:
+        raise ScanError(path, str(err)) from err
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(source).readline)
+        text = source.decode(encoding)
+    except (SyntaxError, UnicodeDecodeError) as err:
+        raise ScanError(path, str(err)) from err
+    if codes is not None and not codes or not may_have_problems(text):
+        return 0, 0, None
+    try:
+        tree = ast.parse(text, path)
+    except (SyntaxError, ValueError) as err:
+        raise ScanError(path, str(err)) from err
+    noqa = noqa_comments(text)
+    if noqa is not None and noqa.ignore_file:
+        return 0, 0, None
+    edits, found = find_fixes(text, tree, codes, noqa)
+    if not edits:
+        return 0, found, None
+    new_text = apply_edits(text.encode("utf-8"), edits).decode("utf-8")
+    try:
+        new_tree = ast.parse(new_text, path)
+    except (SyntaxError, ValueError) as err:
+        raise ScanError(path, f"fixed source doesn't parse, left as it is: {err}") from err
+    v = _new_visitor(codes)
+    v.visit(new_tree, new_text)
+    noqa = noqa_comments(new_text)
+    left = sum(
+        noqa is None or not noqa.ignores(problem.node.lineno, message_code(problem.msg)) for problem in v.problems
+    )
+    if not write:
+        prefix = ("", "") if os.path.isabs(path) else ("a/", "b/")
+        diff = difflib.unified_diff(
+            text.splitlines(keepends=True),
+            new_text.splitlines(keepends=True),
+            f"{prefix[0]}{path}",
+            f"{prefix[1]}{path}",
+        )
+        return found - left, left, "".join(line if line.endswith("\n") else f"{line}\n" for line in diff)
+    try:
+        write_atomic(path, new_text.encode(encoding))
+    except OSError as err:
+        raise ScanError(path, str(err)) from err
+    return found - left, left, None
+
+
+def _fix_file(path: str, write: bool) -> tuple[str, int, int, str | None, ScanError | None]:
+    try:
+        return (path, *fix_file(path, codes_for(path, _codes, _per_file_codes), write), None)
+    except ScanError as err:
+        return path, 0, 0, None, err
+
+
+def fix(
+    files: list[str],
+    jobs: int = 1,
+    codes: frozenset | None = None,
+    write: bool = True,
+    per_file_codes: tuple = (),
+) -> Iterator[tuple[str, int, int, str | None, ScanError | None]]:
+    """
+    Fix `files` (see `fix_file`), using a pool of `jobs` processes if
+    worthwhile; `per_file_codes` is as for `scan`.
+
+    Yields:
+        `(path, fixed, left, diff, error)` in the same order as `files`;
+        `error` is None unless the file couldn't be fixed
+    """
+    jobs = pool_size(jobs, len(files))
+    fix_one = functools.partial(_fix_file, write=write)
+    if jobs <= 1:
+        _init_worker(None, DEFAULT_MAX_SIZE, codes=codes, per_file_codes=per_file_codes)
+        try:
+            yield from map(fix_one, files)
+        finally:
+            _close_worker()
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, min(64, len(files) // (jobs * 4)))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(None, DEFAULT_MAX_SIZE, False, codes, None, per_file_codes),
+    ) as pool:
+        yield from pool.map(fix_one, files, chunksize=chunksize)
+
+
+def _run_fix(files: list[str], jobs: int, codes: frozenset | None, per_file_codes: tuple, out, write: bool) -> int:
+    # Notebooks and files in archives are only checked
+    files = [path for path in files if path.endswith(".py") and split_member(path) is None]
+    fixed_total = left_total = fixed_files = 0
+    for path, fixed, left, diff, error in fix(files, jobs, codes, write, per_file_codes):
+        if error is not None:
+            print(f"flake8-qiskit-migration: skipping {error}", file=sys.stderr)
+            continue
+        if diff:
+            out.write(diff)
+            out.flush()
+        fixed_total += fixed
+        left_total += left
+        fixed_files += bool(fixed)
+    verb = "Fixed" if write else "Would fix"
+    print(
+        f"{verb} {fixed_total} problems in {fixed_files} files; {left_total} left to fix by hand",
+        file=sys.stderr,
+    )
+    return int(bool(left_total or not write and fixed_total))
+
+
+def format_result(path: str, finding: Finding) -> str:
+    """
+    Format a finding the way flake8's default formatter does; notebook
+    findings are prefixed with the cell number, as `path:cell:line:col`.
+    """
+    if finding.cell is not None:
+        path = f"{path}:{finding.cell}"
+    return f"{path}:{finding.line}:{finding.col + 1}: {finding.msg}"
+
+
+def _write_findings(scanned, codes, changed, out, output_format) -> bool:
+    from .formats import writer
+    from .plugin import rule_codes
+
+    output = writer(output_format, out, [code for code in rule_codes() if codes is None or code in codes])
+    found = False
+    for path, results, error in scanned:
+        if error is not None:
+            print(f"flake8-qiskit-migration: skipping {error}", file=sys.stderr)
+            continue
+        if changed is not None:
+            results = [result for result in results if result.cell is not None or in_ranges(result.line, changed[path])]
+        output.write(path, results)
+        found = found or bool(results)
+    output.close()
+    return found
+
+
+def run(
+    paths: list[str],
+    jobs: int = 1,
+    exclude: Iterable[str] = DEFAULT_EXCLUDE,
+    out=None,
+    cache_dir: str | None = None,
+    cache_max_size: int = DEFAULT_MAX_SIZE,
+    diff_base: str | None = None,
+    profile: bool = False,
+    codes: frozenset | None = None,
+    output_format: str = "text",
+    summary: bool = False,
+    repos: bool = False,
+    rev: str | None = None,
+    fix: bool = False,
+    show_diff: bool = False,
+    per_file_codes: tuple = (),
+) -> int:
+    """
+    Scan `paths` and print results to `out` (stdout by default), in
+    `output_format` (see `formats.FORMATS`), as each file is checked.
+
+    If `diff_base` is a git revision, only files changed since then are
+    checked and only problems on changed lines are reported (see
+    `git.changed_lines`). Aliases are still resolved from the whole file.
+    Notebook line numbers don't correspond to lines in the diff, so all
+    problems in changed notebooks are reported.
+
+    Only problems with `codes` are checked for, if given (see
+    `plugin.select_codes`), or with the codes of the longest pattern in
+    `per_file_codes` that a file matches (see `config.codes_for`). Problems
+    suppressed by `# noqa` comments aren't reported.
+
+    If `summary` is set, only counts of findings are printed at the end,
+    as a table, or as one JSON object if `output_format` is "jsonl" (see
+    `summary.Summary`).
+
+    If `rev` is a git revision, files are read from it in the git object
+    database rather than from disk, so it needn't be checked out; `paths`
+    are then pathspecs within the current directory (see `git.list_tree`).
+
+    If `repos` is set, each subdirectory of the directories in `paths` is
+    scanned as a separate repository, in turn (see `discover_repos`). Files
+    with identical contents are only checked once, wherever they are, and
+    their problems are reported for every copy (see `scan_deduplicated`).
+    Summaries then also count problems by repository.
+
+    If `profile` is set, a breakdown of where the checker spent its time is
+    printed to stderr at the end (see `profiling.Profile`).
+
+    If `fix` is set, the mechanical problems in `*.py` files are fixed in
+    place instead (see `fix_file`), and only counts are printed, to stderr.
+    If `show_diff` is also set, files are left as they are and the fixes are
+    printed to `out` as a unified diff.
+
+    Returns:
+        Exit code: 1 if any problems were found, 0 otherwise; when fixing,
+        1 if any problems are left in the files
+
+    Raises:
+        GitError: if `diff_base` or `rev` is given and git fails
+    """
+    out = out or sys.stdout
+    exclude = tuple(exclude)
+    if cache_dir:
+        cache = ResultCache.open(cache_dir, cache_max_size)
+        if cache is None:
+            # Rather than have every worker fail to open it too
+            cache_dir = None
+        else:
+            cache.close()
+    changed = blobs = None
+    if rev is not None:
+        blobs = {
+            path: oid for path, oid in list_tree(rev, paths).items()
+            if path.endswith(SOURCE_EXTENSIONS) and not _excluded_in_tree(path, exclude)
+        }
+        files = sorted(blobs)
+    elif repos:
+        repo_files = discover_repos(paths, exclude)
+        files = [path for _, repo in repo_files for path in repo]
+    elif diff_base is None:
+        files = discover_files(paths, exclude)
+    else:
+        changed = changed_lines(diff_base, paths)
+        files = sorted(
+            path for path in changed if path.endswith(SOURCE_EXTENSIONS) and not _excluded_in_tree(path, exclude)
+        )
+    if fix:
+        return _run_fix(files, jobs, codes, per_file_codes, out, write=not show_diff)
+
+    stats = Profile() if profile else None
+    if summary and repos:
+        # Counted here, as copies of a file may be in different chunks
+        counts = Summary()
+        scanned = scan_deduplicated(files, jobs, cache_dir, cache_max_size, stats, codes, per_file_codes=per_file_codes)
+        for repo, repo_paths in repo_files:
+            for path in repo_paths:
+                _, results, error = next(scanned)
+                if error is not None:
+                    print(f"flake8-qiskit-migration: skipping {error}", file=sys.stderr)
+                    counts.errors += 1
+                    continue
+                counts.add(path, results, repo)
+    elif summary:
+        counts = summarize(
+            files, jobs, cache_dir, cache_max_size, stats, codes, changed, blobs=blobs, per_file_codes=per_file_codes
+        )
+    elif repos:
+        scanned = scan_deduplicated(files, jobs, cache_dir, cache_max_size, stats, codes, per_file_codes=per_file_codes)
+        found = _write_findings(scanned, codes, changed, out, output_format)
+    else:
+        scanned = scan(files, jobs, cache_dir, cache_max_size, stats, codes, blobs, per_file_codes)
+        found = _write_findings(scanned, codes, changed, out, output_format)
+    if summary:
+        counts.report(out, as_json=output_format == "jsonl")
+        found = counts.files_with_findings > 0
+    cache = ResultCache.open(cache_dir, cache_max_size) if cache_dir else None
+    if cache is not None:
+        cache.evict()
+        cache.close()
+    if stats is not None:
+        stats.report()
+    return int(found)
@@ -0,0 +1,312 @@
+"""
+Automatic fixes for the mechanical cases, for `flake8-qiskit-migration --fix`.
+
+A problem is fixed only if its message names an exact replacement that can
+be written in place of the deprecated code:
+
+- imports and attribute paths whose replacement is a full `qiskit*` path,
+  e.g. `qiskit.Aer` → `qiskit_aer.Aer`
+- method calls whose replacement is another method, e.g. `.cnot()` →
+  `.cx()`
+
+Everything else (removed arguments, replacements with a different API,
+messages that offer a choice such as "either ... or ...") is left for a
+human. Where several selected rules report the same code, they
+must all suggest the same replacement.
+
+Fixes are computed as byte-range edits from the node positions `Visitor`
+records, so the rest of the file is kept exactly as it is.
+"""
+
+from __future__ import annotations
+
+import ast
+import os
+import re
+import stat
+import tempfile
+from typing import NamedTuple
+
+from .noqa import NoqaComments, message_code
+from .plugin import Visitor, _attribute_chain
+from .rules import replacement_hint
+
+_NEWLINE = re.compile(rb"\r\n?|\n")
+# A replacement path that can be written as is, e.g. `qiskit_aer.Aer`
+_PATH = re.compile(r"qiskit\w*(?:\.[^\W\d]\w*)*")
+# A replacement method, e.g. `.cx()`
+_METHOD = re.compile(r"\.([^\W\d]\w*)\(\)")
+# Messages offering alternatives, where the first one named isn't a
+# replacement to apply as is
+_ALTERNATIVES = re.compile(r"\b(?:either|or)\b")
+
+
+class Edit(NamedTuple):
+    """Replace `source[start:end]` (UTF-8 bytes) with `text`"""
+
+    start: int
+    end: int
+    text: bytes
+
+
+class _FixVisitor(Visitor):
+    """`Visitor` that also records the full path of each deprecated import and attribute"""
+
+    def __init__(self, codes: frozenset | None = None):
+        super().__init__(codes)
+        # `(node, path, problems)` for each deprecated path reported
+        self.paths = []
+
+    def report_if_deprecated(self, path: str, node) -> bool:
+        count = len(self.problems)
+        if not super().report_if_deprecated(path, node):
+            return False
+        self.paths.append((node, path, self.problems[count:]))
+        return True
+
+
+def _hint(msg: str) -> str | None:
+    """The replacement `msg` suggests, if it is the only one it offers"""
+    return None if _ALTERNATIVES.search(msg) else replacement_hint(msg)
+
+
+def _new_path(visitor: _FixVisitor, path: str, problems, attribute: bool = False) -> str | None:
+    """
+    What `path` becomes if all `problems` agree on a mechanical replacement
+    that the selected rules don't report in turn: checked as an import, or
+    at every level if `attribute`, as `Visitor` checks attribute chains
+    """
+    replacements = set()
+    for problem in problems:
+        hint = _hint(problem.msg)
+        if hint is None or _PATH.fullmatch(hint) is None:
+            return None
+        replacements.add(hint + path[len(problem.key):])
+    if len(replacements) != 1:
+        return None
+    new = replacements.pop()
+    segments = new.split(".")
+    for end in range(2 if attribute else len(segments), len(segments) + 1):
+        if visitor._path_trie.lookup(".".join(segments[:end])):
+            return None
+    return new
+
+
+def _new_method(problems) -> str | None:
+    """The method to call instead, if all `problems` agree on one"""
+    replacements = set()
+    for problem in problems:
+        match = _METHOD.fullmatch(_hint(problem.msg) or "")
+        if match is None:
+            return None
+        replacements.add(match.group(1))
+    return replacements.pop() if len(replacements) == 1 else None
+
+
+class _Source:
+    """UTF-8 source with the byte offset of each line, counting from 1 like `lineno`"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.line_starts = [0, 0]
+        self.line_starts.extend(match.end() for match in _NEWLINE.finditer(data))
+        self.newline = b"\r\n" if b"\r\n" in data else b"\n"
+
+    def start(self, node: ast.AST) -> int:
+        return self.line_starts[node.lineno] + node.col_offset
+
+    def end(self, node: ast.AST) -> int:
+        return self.line_starts[node.end_lineno] + node.end_col_offset
+
+
+def _alias(name: str, local: str) -> str:
+    return name if name == local else f"{name} as {local}"
+
+
+def _import_edit(visitor: _FixVisitor, source: _Source, node: ast.Import | ast.ImportFrom, paths: dict) -> Edit | None:
+    """Rewrite an import statement with the new paths of its deprecated names, if any"""
+    start, end = source.start(node), source.end(node)
+    if b"#" in source.data[start:end]:
+        # Rewriting would drop the comments
+        return None
+    fixed = False
+    # Statements to write instead, as `(module, [names])` for `from` imports
+    # and `(None, [names])` for plain ones
+    statements = []
+    if type(node) is ast.Import:
+        names = []
+        for alias in node.names:
+            problems = paths.get(alias.name)
+            new = problems and _new_path(visitor, alias.name, problems)
+            # Without `as`, the import binds its first segment, which must stay the same
+            if new and (alias.asname or new.partition(".")[0] == alias.name.partition(".")[0]):
+                names.append(new if alias.asname is None else _alias(new, alias.asname))
+                fixed = True
+            else:
+                names.append(alias.name if alias.asname is None else _alias(alias.name, alias.asname))
+        statements.append((None, names))
+    else:
+        if node.level:
+            return None
+        modules = {}
+        for alias in node.names:
+            path = f"{node.module}.{alias.name}"
+            problems = paths.get(path)
+            new = problems and _new_path(visitor, path, problems)
+            local = alias.asname or alias.name
+            if not new:
+                modules.setdefault(node.module, []).append(_alias(alias.name, local))
+                continue
+            fixed = True
+            module, _, name = new.rpartition(".")
+            if module:
+                modules.setdefault(module, []).append(_alias(name, local))
+            else:
+                statements.append((None, [_alias(new, local)]))
+        statements[:0] = modules.items()
+    if not fixed:
+        return None
+
+    line_start = source.line_starts[node.lineno]
+    indent = source.data[line_start:start]
+    if indent.strip():
+        # After another statement on the same line
+        separator, indent = b"; ", b""
+    else:
+        separator = source.newline + indent
+    multiline = node.end_lineno > node.lineno
+    texts = []
+    for module, names in statements:
+        if module is None:
+            texts.append(f"import {', '.join(names)}".encode())
+        elif multiline and len(names) > 1:
+            # Keep the parenthesized, one name per line layout
+            item_separator = source.newline + indent + b"    "
+            items = b"".join(item_separator + name.encode() + b"," for name in names)
+            texts.append(f"from {module} import (".encode() + items + source.newline + indent + b")")
+        else:
+            texts.append(f"from {module} import {', '.join(names)}".encode())
+    return Edit(start, end, separator.join(texts))
+
+
+def _attribute_edit(visitor: _FixVisitor, source: _Source, node: ast.Attribute, path: str, problems) -> Edit | None:
+    new = _new_path(visitor, path, problems, attribute=True)
+    if new is None:
+        return None
+    base, chain = _attribute_chain(node)
+    # What the name at the start of the chain resolved to, e.g. `qiskit` for `qk`
+    resolved = path.rsplit(".", len(chain))[0]
+    if type(base) is not ast.Name or not new.startswith(resolved + "."):
+        # Would need another import
+        return None
+    start, end = source.start(base), source.end(node)
+    if b"#" in source.data[start:end]:
+        return None
+    return Edit(start, end, (base.id + new[len(resolved):]).encode())
+
+
+def _method_edit(source: _Source, node: ast.Call, problems) -> Edit | None:
+    new = _new_method(problems)
+    if new is None:
+        return None
+    func = node.func
+    end = source.end(func)
+    start = end - len(func.attr.encode())
+    if source.data[start:end] != func.attr.encode():
+        # Written differently, e.g. with characters the parser normalized
+        return None
+    return Edit(start, end, new.encode())
+
+
+def find_fixes(
+    text: str, tree: ast.Module, codes: frozenset | None = None, noqa: NoqaComments | None = None
+) -> tuple[list[Edit], int]:
+    """
+    Edits that fix the mechanical problems in a module.
+
+    Args:
+        text: source code of the module
+        tree: `text` parsed
+        codes: only fix problems with these codes (see `plugin.select_codes`)
+        noqa: the `# noqa` comments of `text`; code with problems they
+            suppress is left as it is
+
+    Returns:
+        `(edits, problems)`: non-overlapping edits to the UTF-8 encoded
+        `text`, sorted by position, and the number of problems found, fixable
+        or not, that aren't suppressed
+    """
+    visitor = _FixVisitor(codes)
+    visitor.visit(tree, text)
+    if noqa is not None:
+        suppressed = {
+            id(problem) for problem in visitor.problems
+            if noqa.ignores(problem.node.lineno, message_code(problem.msg))
+        }
+        if suppressed:
+            visitor.problems = [problem for problem in visitor.problems if id(problem) not in suppressed]
+            visitor.paths = [
+                entry for entry in visitor.paths if not any(id(problem) in suppressed for problem in entry[2])
+            ]
+    if not visitor.problems:
+        return [], 0
+    source = _Source(text.encode("utf-8"))
+
+    candidates = []
+    imports = {}
+    for node, path, problems in visitor.paths:
+        if type(node) is ast.Attribute:
+            edit = _attribute_edit(visitor, source, node, path, problems)
+            if edit is not None:
+                candidates.append(edit)
+        else:
+            imports.setdefault(node, {})[path] = problems
+    for node, paths in imports.items():
+        edit = _import_edit(visitor, source, node, paths)
+        if edit is not None:
+            candidates.append(edit)
+    methods = {}
+    for problem in visitor.problems:
+        if type(problem.node) is ast.Call and type(problem.key) is str:
+            methods.setdefault(problem.node, []).append(problem)
+    for node, problems in methods.items():
+        edit = _method_edit(source, node, problems)
+        if edit is not None:
+            candidates.append(edit)
+
+    edits = []
+    for edit in sorted(candidates):
+        if not edits or edit.start >= edits[-1].end:
+            edits.append(edit)
+    return edits, len(visitor.problems)
+
+
+def apply_edits(data: bytes, edits: list[Edit]) -> bytes:
+    """`data` with sorted, non-overlapping `edits` applied"""
+    parts = []
+    position = 0
+    for edit in edits:
+        parts.append(data[position:edit.start])
+        parts.append(edit.text)
+        position = edit.end
+    parts.append(data[position:])
+    return b"".join(parts)
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Replace the contents of `path` with `data`, keeping its permissions,
+    so that readers see either the old contents or the new ones. If `path`
+    is a symlink, the file it points to is replaced and the link is kept.
+    """
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,162 @@
+"""
+Output formats of the `flake8-qiskit-migration` command.
+
+Each writer is given the findings of one file at a time and writes and
+flushes them straight away, so memory use doesn't grow with the number of
+findings and consumers can start on the output of a long scan right away.
+
+    text   flake8's default format, `path:line:col: msg`
+    jsonl  one JSON object per finding
+    sarif  a SARIF 2.1.0 log, for code scanning dashboards
+
+The structured formats include each finding's rule code, the key of the rule
+table entry that matched (see `plugin.Problem.key`) and the replacement the
+message suggests, if any.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from .rules import replacement_hint
+
+if TYPE_CHECKING:
+    from .engine import Finding
+
+FORMATS = ("text", "jsonl", "sarif")
+
+_SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+_INFORMATION_URI = "https://github.com/frankharkins/flake8-qiskit-migration"
+
+# Rule descriptions for SARIF, as in the README
+DESCRIPTIONS = {
+    "QKT100": "Import paths deprecated in Qiskit 1.0",
+    "QKT101": "Method calls removed in Qiskit 1.0",
+    "QKT102": "Keyword arguments removed in Qiskit 1.0",
+    "QKT200": "Import paths removed in Qiskit 2.0",
+    "QKT201": "Method calls removed in Qiskit 2.0",
+    "QKT202": "Keyword arguments removed in Qiskit 2.0",
+}
+
+
+def record(path: str, finding: Finding) -> dict:
+    """A finding as a JSON-serializable dict; `column` is 1-based"""
+    code, _, message = finding.msg.partition(": ")
+    return {
+        "path": path,
+        "cell": finding.cell,
+        "line": finding.line,
+        "column": finding.col + 1,
+        "code": code,
+        "message": message,
+        "key": finding.key,
+        "replacement": replacement_hint(finding.msg),
+    }
+
+
+class TextWriter:
+    def __init__(self, out, codes=()):
+        self._out = out
+
+    def write(self, path: str, findings: list[Finding]) -> None:
+        from .engine import format_result
+
+        if findings:
+            self._out.write("".join(format_result(path, finding) + "\n" for finding in findings))
+            self._out.flush()
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesWriter(TextWriter):
+    def write(self, path: str, findings: list[Finding]) -> None:
+        if findings:
+            self._out.write("".join(json.dumps(record(path, finding)) + "\n" for finding in findings))
+            self._out.flush()
+
+
+class SarifWriter:
+    """
+    Writes the SARIF log piece by piece: the enclosing objects are opened
+    when the writer is created and closed by `close()`, with results written
+    in between.
+    """
+
+    def __init__(self, out, codes=()):
+        from .plugin import Plugin
+
+        self._out = out
+        self._first = True
+        rules = [
+            {"id": code, "shortDescription": {"text": DESCRIPTIONS[code]}} if code in DESCRIPTIONS else {"id": code}
+            for code in codes
+        ]
+        driver = {
+            "name": "flake8-qiskit-migration",
+            "version": Plugin.version,
+            "informationUri": _INFORMATION_URI,
+            "rules": rules,
+        }
+        header = json.dumps({"$schema": _SARIF_SCHEMA, "version": "2.1.0", "runs": [{"tool": {"driver": driver}}]})
+        # Reopen the run object to append its results
+        assert header.endswith("}]}")
+        out.write(header[:-len("}]}")] + ', "results": [\n')
+        out.flush()
+
+    def write(self, path: str, findings: list[Finding]) -> None:
+        if not findings:
+            return
+        uri = _uri(path)
+        parts = []
+        for finding in findings:
+            parts.append(("" if self._first else ",\n") + json.dumps(self._result(uri, finding)))
+            self._first = False
+        self._out.write("".join(parts))
+        self._out.flush()
+
+    @staticmethod
+    def _result(uri: str, finding: Finding) -> dict:
+        data = record(uri, finding)
+        location = {"artifactLocation": {"uri": uri}}
+        properties = {"key": data["key"], "replacement": data["replacement"]}
+        if finding.cell is None:
+            location["region"] = {"startLine": data["line"], "startColumn": data["column"]}
+        else:
+            # Lines of a notebook cell aren't lines of the file
+            properties.update(cell=finding.cell, line=data["line"], column=data["column"])
+        return {
+            "ruleId": data["code"],
+            "level": "warning",
+            "message": {"text": data["message"]},
+            "locations": [{"physicalLocation": location}],
+            "properties": properties,
+        }
+
+    def close(self) -> None:
+        self._out.write("\n]}]}\n")
+        self._out.flush()
+
+
+def _uri(path: str) -> str:
+    if os.path.isabs(path):
+        from pathlib import Path
+
+        return Path(path).as_uri()
+    return quote(path.replace(os.sep, "/"))
+
+
+_WRITERS = {"text": TextWriter, "jsonl": JsonLinesWriter, "sarif": SarifWriter}
+
+
+def writer(output_format: str, out, codes=()):
+    """
+    Writer for `output_format` (one of `FORMATS`) writing to `out`.
+
+    Args:
+        codes: codes that may be reported, listed as rules by SARIF
+    """
+    return _WRITERS[output_format](out, codes)
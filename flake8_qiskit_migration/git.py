@@ -0,0 +1,193 @@
+"""
+Helpers that read from the local git repository using plumbing commands.
+"""
+
+from __future__ import annotations
+
+import bisect
+import re
+import subprocess
+
+# Line ranges are lists of inclusive `(first, last)` pairs, sorted by `first`
+_WHOLE_FILE = [(1, float("inf"))]
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# Escapes in the file names git quotes (those with `"`, `\` or control
+# characters), and what they stand for
+_QUOTED_ESCAPE = re.compile(rb"\\([0-7]{3}|.)", re.DOTALL)
+_ESCAPES = {b"a": b"\a", b"b": b"\b", b"t": b"\t", b"n": b"\n", b"v": b"\v", b"f": b"\f", b"r": b"\r"}
+
+
+class GitError(Exception):
+    """A git command failed, or git isn't available"""
+
+
+def _git(*args: str, cwd: str | None = None) -> str:
+    try:
+        proc = subprocess.run(
+            ["git", "-c", "core.quotepath=off", *args],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+    except OSError as err:
+        raise GitError(f"could not run git: {err}") from err
+    if proc.returncode != 0:
+        raise GitError(f"`git {' '.join(args)}` failed: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout.decode("utf-8", errors="surrogateescape")
+
+
+def _unquote(name: str) -> str:
+    """A file name as git writes it in patch headers, quoted or not, unquoted"""
+    if not name.startswith('"'):
+        return name
+
+    def unescape(match: re.Match) -> bytes:
+        escape = match.group(1)
+        return bytes([int(escape, 8)]) if len(escape) == 3 else _ESCAPES.get(escape, escape)
+
+    quoted = name[1:-1].encode("utf-8", errors="surrogateescape")
+    return _QUOTED_ESCAPE.sub(unescape, quoted).decode("utf-8", errors="surrogateescape")
+
+
+def parse_unified_diff(diff: str) -> dict[str, list[tuple[int, int]]]:
+    """
+    Extract the added/changed line ranges of each file in the new version
+    from a `git diff --unified=0` patch.
+    """
+    changed: dict[str, list[tuple[int, int]]] = {}
+    ranges = None
+    # Lines left in the current hunk, from the old and new version; inside
+    # a hunk, an added line can itself start with `++ ` or `-- `
+    old_left = new_left = 0
+    for line in diff.split("\n"):
+        if old_left or new_left:
+            if line.startswith(" "):
+                old_left, new_left = max(old_left - 1, 0), max(new_left - 1, 0)
+                continue
+            if line.startswith("-"):
+                old_left = max(old_left - 1, 0)
+                continue
+            if line.startswith("+"):
+                new_left = max(new_left - 1, 0)
+                continue
+            if line.startswith("\\"):
+                # "\ No newline at end of file"
+                continue
+            # The hunk was cut short
+            old_left = new_left = 0
+        if line.startswith("+++ "):
+            # git ends the name with a tab if it contains a space
+            target = _unquote(line[4:-1] if line.endswith("\t") else line[4:])
+            if target == "/dev/null":
+                ranges = None
+            else:
+                ranges = changed.setdefault(target[2:] if target.startswith("b/") else target, [])
+        elif line.startswith("@@ "):
+            match = _HUNK_HEADER.match(line)
+            if match is None:
+                continue
+            old_left = 1 if match.group(1) is None else int(match.group(1))
+            start = int(match.group(2))
+            count = new_left = 1 if match.group(3) is None else int(match.group(3))
+            if ranges is not None and count:
+                ranges.append((start, start + count - 1))
+    return {path: sorted(ranges) for path, ranges in changed.items() if ranges}
+
+
+def changed_lines(base: str, paths: list[str] = (), cwd: str | None = None) -> dict[str, list[tuple[int, int]]]:
+    """
+    Lines added or changed in the working tree since the merge base of
+    `base` and HEAD, as reviewers see them in a pull request. Untracked files
+    count as entirely changed.
+
+    Args:
+        base: any git revision, e.g. `origin/main`
+        paths: restrict to these pathspecs
+        cwd: directory inside the repository; returned paths are relative to it
+
+    Returns:
+        Dict mapping file paths to their changed line ranges
+    """
+    merge_base = _git("merge-base", base, "HEAD", cwd=cwd).strip()
+    diff = _git(
+        "diff", "--no-color", "--no-ext-diff", "--unified=0", "--find-renames",
+        "--diff-filter=AMR", "--relative", merge_base, "--", *paths,
+        cwd=cwd,
+    )
+    changed = parse_unified_diff(diff)
+    untracked = _git("ls-files", "--others", "--exclude-standard", "-z", "--", *paths, cwd=cwd)
+    for path in untracked.split("\0"):
+        if path:
+            changed[path] = _WHOLE_FILE
+    return changed
+
+
+def in_ranges(line: int, ranges: list[tuple[int, int]]) -> bool:
+    """Whether `line` falls inside one of the sorted, inclusive `ranges`"""
+    index = bisect.bisect_right(ranges, (line, float("inf"))) - 1
+    return index >= 0 and ranges[index][0] <= line <= ranges[index][1]
+
+
+def list_tree(rev: str, paths: list[str] = (), cwd: str | None = None) -> dict[str, str]:
+    """
+    Files in revision `rev`, without checking it out.
+
+    Args:
+        rev: any git revision, e.g. a tag
+        paths: restrict to these pathspecs
+        cwd: directory inside the repository; only files below it are
+            listed, and returned paths are relative to it
+
+    Returns:
+        Dict mapping file paths to the object IDs of their contents; symlinks
+        and submodules are left out
+    """
+    tree = _git("rev-parse", "--verify", "--end-of-options", f"{rev}^{{tree}}", cwd=cwd).strip()
+    listing = _git("ls-tree", "-r", "-z", tree, "--", *paths, cwd=cwd)
+    files = {}
+    for entry in listing.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        mode, kind, oid = info.split(" ")
+        if kind == "blob" and mode != "120000":
+            files[path] = oid
+    return files
+
+
+class BlobReader:
+    """
+    Reads the contents of objects through one long-lived
+    `git cat-file --batch` process, instead of starting git for every file.
+    """
+
+    def __init__(self, cwd: str | None = None):
+        try:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as err:
+            raise GitError(f"could not run git: {err}") from err
+
+    def read(self, oid: str) -> bytes:
+        """Contents of the blob `oid`"""
+        self._proc.stdin.write(oid.encode() + b"\n")
+        self._proc.stdin.flush()
+        header = self._proc.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise GitError(f"`git cat-file` can't read blob {oid}: {b' '.join(header).decode(errors='replace')}")
+        size = int(header[2])
+        data = self._proc.stdout.read(size + 1)
+        if len(data) != size + 1:
+            raise GitError(f"`git cat-file` stopped while reading blob {oid}")
+        return data[:size]
+
+    def close(self) -> None:
+        self._proc.stdin.close()
+        self._proc.stdout.close()
+        self._proc.wait()
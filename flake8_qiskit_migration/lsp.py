@@ -0,0 +1,430 @@
+"""
+Language server (LSP over stdio) publishing QKT diagnostics as you type.
+
+Re-checking a large file from scratch on every keystroke is too slow, so
+each document is kept as a list of its top-level statements (those sharing
+a line, as in `a; b`, together), each with the module-level names bound
+before it (see `Visitor.module_state`), its findings and the names bound
+after it. After an edit:
+
+* only the statements overlapping the changed lines are parsed again (the
+  whole file is parsed only if that fails, e.g. when an edit opens a bracket
+  that a later line closes);
+* only new statements, and unchanged ones that now see different names
+  (e.g. after an edited import), are visited again.
+
+Diagnostics are published after a short pause in typing (`debounce`), and a
+re-check gives way to newly arrived messages between statements, so a huge
+file never blocks edits; the statements checked so far are kept.
+
+Run with `flake8-qiskit-migration --lsp`. `initializationOptions` may
+contain `select` and `ignore` (lists of code prefixes, as on the command
+line) and `debounce` (seconds).
+"""
+
+from __future__ import annotations
+
+import ast
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from typing import BinaryIO, NamedTuple
+
+from .plugin import Visitor, select_codes
+
+# Seconds to wait after the last change before re-checking
+DEFAULT_DEBOUNCE = 0.3
+
+_LINE = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+")
+
+_SEVERITY_WARNING = 2
+_METHOD_NOT_FOUND = -32601
+
+
+def split_lines(text: str) -> list[str]:
+    """Split on the line breaks that LSP (and Python) recognize, keeping them"""
+    return _LINE.findall(text)
+
+
+class Diagnostic(NamedTuple):
+    """One problem; lines are 0-based and relative to the statement start"""
+
+    line: int
+    col: int
+    end_line: int
+    end_col: int
+    code: str
+    msg: str
+
+
+class _Statement:
+    """
+    A top-level statement, or several that share lines, and the results of
+    visiting them
+    """
+
+    __slots__ = ("start", "end", "text", "nodes", "state_before", "diagnostics", "state_after")
+
+    def __init__(self, start: int, end: int, nodes: list[ast.stmt] | None):
+        self.start = start  # first line (0-based), including decorators
+        self.end = end  # line after the last one
+        self.text = ""
+        self.nodes = nodes  # parsed nodes, until visited
+        self.state_before = None
+        self.diagnostics: list[Diagnostic] = []
+        self.state_after = None
+
+
+class Document:
+    """
+    Text of an open file, and its findings kept up to date incrementally.
+
+    `lines` always holds the latest text; the statements describe the text
+    that last parsed successfully, so a syntax error while typing leaves the
+    previous findings in place.
+    """
+
+    def __init__(self, text: str, codes: frozenset | None = None):
+        self.lines = split_lines(text)
+        self.codes = codes
+        self._parsed_lines: list[str] = []
+        self._statements: list[_Statement] = []
+        # Statements with unchanged text may be reused, if their names match
+        self._by_text: dict[str, _Statement] = {}
+        # Index of the first statement that may need visiting, or None if
+        # the findings are up to date with `_parsed_lines`
+        self._next: int | None = 0
+        self.dirty = True
+        # Number of statements visited, for tests and profiling
+        self.visited = 0
+
+    def apply_change(self, change: dict) -> None:
+        """Apply one `TextDocumentContentChangeEvent`"""
+        self.dirty = True
+        if "range" not in change:
+            self.lines = split_lines(change["text"])
+            return
+        start, end = change["range"]["start"], change["range"]["end"]
+        lines = self.lines
+        first = lines[start["line"]] if start["line"] < len(lines) else ""
+        last = lines[end["line"]] if end["line"] < len(lines) else ""
+        text = (
+            first[:_utf16_to_index(first, start["character"])]
+            + change["text"]
+            + last[_utf16_to_index(last, end["character"]):]
+        )
+        lines[start["line"]:end["line"] + 1] = split_lines(text)
+
+    def check(self, should_stop=lambda: False) -> bool:
+        """
+        Bring the findings up to date with `lines`, as far as possible.
+
+        Args:
+            should_stop: polled between statements; if it returns True,
+                checking stops early and can be resumed by calling this again
+
+        Returns:
+            True if the findings are up to date (or the text doesn't parse)
+        """
+        if self.dirty:
+            self.dirty = False
+            self._reparse()
+        if self._next is None:
+            return True
+        statements = self._statements
+        state = statements[self._next - 1].state_after if self._next else None
+        visitor = None
+        for index in range(self._next, len(statements)):
+            statement = statements[index]
+            # Unchanged text seeing unchanged names has unchanged results. For
+            # the statements after an edit, the states are usually the very
+            # same objects as last time, so this comparison is cheap.
+            if statement.nodes is None and statement.state_before == state:
+                state = statement.state_after
+                continue
+            if should_stop():
+                self._next = index
+                return False
+            if visitor is None:
+                visitor = Visitor(self.codes)
+                if state is None:
+                    state = visitor.module_state()
+            self._visit(visitor, statement, state)
+            state = statement.state_after
+        self._next = None
+        self._by_text = {statement.text: statement for statement in statements}
+        return True
+
+    def _visit(self, visitor: Visitor, statement: _Statement, state) -> None:
+        nodes = statement.nodes
+        if nodes is None:
+            # Text is unchanged but names bound before it changed
+            tree = ast.parse(statement.text)
+            ast.increment_lineno(tree, statement.start)
+            nodes = tree.body
+        visitor.restore_module_state(state)
+        del visitor.problems[:]
+        visitor.visit(ast.Module(body=nodes, type_ignores=[]))
+        statement.state_before = state
+        statement.state_after = visitor.module_state()
+        statement.diagnostics = [_diagnostic(problem, statement.start) for problem in visitor.problems]
+        statement.nodes = None
+        self.visited += 1
+
+    def diagnostics(self) -> list[Diagnostic]:
+        """All findings, with absolute (0-based) lines"""
+        return [
+            diagnostic._replace(line=diagnostic.line + statement.start, end_line=diagnostic.end_line + statement.start)
+            for statement in self._statements
+            for diagnostic in statement.diagnostics
+        ]
+
+    def _reparse(self) -> None:
+        old, new = self._parsed_lines, self.lines
+        # Lines before `prefix` and the last `suffix` lines are unchanged
+        limit = min(len(old), len(new))
+        prefix = 0
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+        if prefix == len(old) == len(new):
+            return
+        delta = len(new) - len(old)
+
+        # Re-parse the statements overlapping the changed lines
+        statements = self._statements
+        first = 0
+        while first < len(statements) and statements[first].end <= prefix:
+            first += 1
+        last = first
+        while last < len(statements) and statements[last].start < len(old) - suffix:
+            last += 1
+        start = min(prefix, statements[first].start) if first < len(statements) else prefix
+        end = max(len(old) - suffix, statements[last - 1].end) if last > first else len(old) - suffix
+        parsed = self._parse(start, end + delta)
+        if parsed is not None:
+            for statement in statements[last:]:
+                statement.start += delta
+                statement.end += delta
+            self._statements = statements[:first] + parsed + statements[last:]
+            self._next = first if self._next is None else min(self._next, first)
+        else:
+            parsed = self._parse(0, len(new))
+            if parsed is None:
+                # Keep the findings for the last text that parsed
+                return
+            self._statements = parsed
+            self._next = 0
+        self._parsed_lines = list(new)
+
+    def _parse(self, start: int, end: int) -> list[_Statement] | None:
+        """Parse lines `start:end` into statements, or None if they don't parse"""
+        try:
+            tree = ast.parse("".join(self.lines[start:end]))
+        except (SyntaxError, ValueError):
+            return None
+        ast.increment_lineno(tree, start)
+        statements = []
+        for node in tree.body:
+            first = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", ())]) - 1
+            if statements and first < statements[-1].end:
+                # Shares a line with the previous statement, so each has the
+                # same text; they are visited and re-parsed together
+                statements[-1].end = max(statements[-1].end, node.end_lineno)
+                statements[-1].nodes.append(node)
+            else:
+                statements.append(_Statement(first, node.end_lineno, [node]))
+        for statement in statements:
+            statement.text = text = "".join(self.lines[statement.start:statement.end])
+            known = self._by_text.get(text)
+            if known is not None and known.state_after is not None:
+                # Maybe reusable; `check` compares the names bound before it
+                statement.nodes = None
+                statement.state_before = known.state_before
+                statement.state_after = known.state_after
+                statement.diagnostics = known.diagnostics
+        return statements
+
+
+def _diagnostic(problem, start: int) -> Diagnostic:
+    node = problem.node
+    code, _, msg = problem.msg.partition(": ")
+    end_line = getattr(node, "end_lineno", None) or node.lineno
+    end_col = getattr(node, "end_col_offset", None)
+    if end_col is None:
+        end_col = node.col_offset
+    return Diagnostic(node.lineno - 1 - start, node.col_offset, end_line - 1 - start, end_col, code, msg)
+
+
+def _utf16_to_index(line: str, character: int) -> int:
+    """Index into `line` of an LSP (UTF-16) character offset"""
+    if line.isascii():
+        return min(character, len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def _utf8_to_utf16(line: str, col: int) -> int:
+    """LSP character offset of an AST (UTF-8 byte) column"""
+    if line.isascii():
+        return col
+    return len(line.encode("utf-8")[:col].decode("utf-8", "replace").encode("utf-16-le")) // 2
+
+
+class Server:
+    """Reads LSP messages from `reader` and writes responses to `writer`"""
+
+    def __init__(self, reader: BinaryIO, writer: BinaryIO):
+        self._reader = reader
+        self._writer = writer
+        self._messages: queue.Queue = queue.Queue()
+        self._documents: dict[str, Document] = {}
+        # uri → time to check it at
+        self._due: dict[str, float] = {}
+        self._codes: frozenset | None = None
+        self.debounce = DEFAULT_DEBOUNCE
+        self._shutdown = False
+
+    def serve(self) -> int:
+        """
+        Handle messages until `exit`.
+
+        Returns:
+            Exit code, as specified by LSP: 0 if `shutdown` came first
+        """
+        threading.Thread(target=self._read_messages, daemon=True).start()
+        while True:
+            timeout = max(0.0, min(self._due.values()) - time.monotonic()) if self._due else None
+            try:
+                message = self._messages.get(timeout=timeout)
+            except queue.Empty:
+                self._check_due()
+                continue
+            if message is None or message.get("method") == "exit":
+                return 0 if self._shutdown else 1
+            self._handle(message)
+
+    def _read_messages(self) -> None:
+        reader = self._reader
+        while True:
+            length = None
+            while True:
+                header = reader.readline()
+                if not header:
+                    self._messages.put(None)
+                    return
+                header = header.strip()
+                if not header:
+                    break
+                name, _, value = header.decode("ascii").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            if length is None:
+                continue
+            self._messages.put(json.loads(reader.read(length)))
+
+    def _send(self, message: dict) -> None:
+        body = json.dumps(dict(message, jsonrpc="2.0")).encode()
+        self._writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self._writer.flush()
+
+    def _handle(self, message: dict) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        handler = getattr(self, "_on_" + (method or "").replace("/", "_").replace("$", "_"), None)
+        if "id" not in message:
+            # Notification; unknown ones are ignored
+            if handler is not None:
+                handler(params)
+            return
+        if handler is None:
+            self._send({"id": message["id"], "error": {"code": _METHOD_NOT_FOUND, "message": f"unsupported method {method}"}})
+            return
+        self._send({"id": message["id"], "result": handler(params)})
+
+    def _on_initialize(self, params: dict) -> dict:
+        options = params.get("initializationOptions") or {}
+        self._codes = select_codes(options.get("select"), options.get("ignore") or ())
+        self.debounce = float(options.get("debounce", self.debounce))
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16",
+                "textDocumentSync": {"openClose": True, "change": 2},
+            },
+            "serverInfo": {"name": "flake8-qiskit-migration"},
+        }
+
+    def _on_shutdown(self, params: dict) -> None:
+        self._shutdown = True
+
+    def _on_textDocument_didOpen(self, params: dict) -> None:
+        item = params["textDocument"]
+        self._documents[item["uri"]] = Document(item["text"], self._codes)
+        self._due[item["uri"]] = time.monotonic()
+
+    def _on_textDocument_didChange(self, params: dict) -> None:
+        uri = params["textDocument"]["uri"]
+        document = self._documents.get(uri)
+        if document is None:
+            return
+        for change in params["contentChanges"]:
+            document.apply_change(change)
+        self._due[uri] = time.monotonic() + self.debounce
+
+    def _on_textDocument_didClose(self, params: dict) -> None:
+        uri = params["textDocument"]["uri"]
+        self._documents.pop(uri, None)
+        self._due.pop(uri, None)
+        self._send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": []}})
+
+    def _check_due(self) -> None:
+        now = time.monotonic()
+        for uri, due in sorted(self._due.items(), key=lambda item: item[1]):
+            if due > now:
+                continue
+            document = self._documents[uri]
+            # Give way to new messages; they may change this document again
+            if not document.check(should_stop=lambda: not self._messages.empty()):
+                return
+            del self._due[uri]
+            self._publish(uri, document)
+
+    def _publish(self, uri: str, document: Document) -> None:
+        lines = document.lines
+        diagnostics = []
+        for diagnostic in document.diagnostics():
+            start_line = lines[diagnostic.line] if diagnostic.line < len(lines) else ""
+            end_line = lines[diagnostic.end_line] if diagnostic.end_line < len(lines) else ""
+            diagnostics.append({
+                "range": {
+                    "start": {"line": diagnostic.line, "character": _utf8_to_utf16(start_line, diagnostic.col)},
+                    "end": {"line": diagnostic.end_line, "character": _utf8_to_utf16(end_line, diagnostic.end_col)},
+                },
+                "severity": _SEVERITY_WARNING,
+                "code": diagnostic.code,
+                "source": "flake8-qiskit-migration",
+                "message": diagnostic.msg,
+            })
+        self._send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": diagnostics}})
+
+
+def main() -> int:
+    # Read through a separate file object, never closed: the reader thread
+    # may still be blocked reading when the interpreter exits, which sys.stdin
+    # can't handle
+    stdin = os.fdopen(sys.stdin.fileno(), "rb", closefd=False)
+    return Server(stdin, sys.stdout.buffer).serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+`# noqa` comments, for the standalone engine; flake8 applies them itself when
+running the plugin.
+
+Comments are matched as flake8 matches them: `# noqa` alone ignores every
+problem on its line, `# noqa: QKT100,QKT2` only those with the listed codes
+(or code prefixes), and a comment anywhere in a statement that spans several
+lines applies to all of them. A line starting with `# flake8: noqa` ignores
+the whole file.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import tokenize
+
+# Same as flake8's `defaults.NOQA_INLINE_REGEXP` and `defaults.NOQA_FILE`
+NOQA_INLINE = re.compile(r"# noqa(?::[\s]?(?P<codes>([A-Z]+[0-9]+(?:[,\s]+)?)+))?", re.IGNORECASE)
+NOQA_FILE = re.compile(r"\s*# flake8[:=]\s*noqa", re.I)
+
+# Every comment that can suppress anything contains this
+_NOQA_WORD = re.compile("noqa", re.I)
+_CODE_SEPARATOR = re.compile(r"[,\s]")
+
+
+class NoqaComments:
+    """The `# noqa` comments of one source file"""
+
+    def __init__(self, text: str):
+        # Split like the tokenizer (and flake8) split lines
+        self.lines = io.StringIO(text, newline=None).readlines()
+        self.ignore_file = any(NOQA_FILE.match(line) for line in self.lines)
+        self._logical_lines = None
+
+    def _logical_line(self, line: int) -> str:
+        """All of the lines of the statement `line` is in, as flake8 joins them to search for `# noqa`"""
+        if self._logical_lines is None:
+            self._logical_lines = {}
+            start, end = len(self.lines) + 2, -1
+            try:
+                for token in tokenize.generate_tokens(iter(self.lines).__next__):
+                    if token.type in (tokenize.ENDMARKER, tokenize.DEDENT):
+                        continue
+                    start, end = min(start, token.start[0]), max(end, token.end[0])
+                    if token.type in (tokenize.NL, tokenize.NEWLINE):
+                        joined = "".join(self.lines[start - 1:end])
+                        self._logical_lines.update(dict.fromkeys(range(start, end + 1), joined))
+                        start, end = len(self.lines) + 2, -1
+            except (tokenize.TokenError, SyntaxError):
+                self._logical_lines = {}
+        if line in self._logical_lines:
+            return self._logical_lines[line]
+        return self.lines[line - 1] if 0 < line <= len(self.lines) else ""
+
+    def ignores(self, line: int, code: str) -> bool:
+        """Whether a problem with `code` on `line` (counting from 1) is suppressed"""
+        if self.ignore_file:
+            return True
+        match = NOQA_INLINE.search(self._logical_line(line))
+        if match is None:
+            return False
+        codes = match.group("codes")
+        if codes is None:
+            return True
+        codes = tuple(code for code in _CODE_SEPARATOR.split(codes) if code)
+        return code in codes or code.startswith(codes)
+
+
+def noqa_comments(text: str) -> NoqaComments | None:
+    """The `# noqa` comments of `text`, or None if it can't have any"""
+    return NoqaComments(text) if _NOQA_WORD.search(text) else None
+
+
+def message_code(msg: str) -> str:
+    """The code a problem message starts with, e.g. `QKT100`"""
+    return msg.partition(" ")[0].rstrip(":")
@@ -0,0 +1,260 @@
+"""
+Read the code cells of Jupyter notebooks without loading the whole file.
+
+Notebooks often embed megabytes of outputs (images, HTML, logs). The reader
+here streams the JSON and only decodes the parts we need (`cell_type` and
+`source` of each cell); everything else is skipped over character by
+character without being turned into Python objects.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import IO, Iterator
+
+_CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\r\n"
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r"[,\]}\s]")
+
+# IPython syntax that isn't Python: `%magic`, `!shell`, `?help`, `x = !cmd`,
+# and `obj?` / `obj??`
+_MAGIC_LINE = re.compile(r"^(\s*)(?:[%!?]|[\w.,\s]+=\s*[%!]|[\w.]+\?\??\s*$)")
+# What changes whether the next line starts a logical line: string quotes,
+# comments, backslashes and brackets
+_CODE_SPECIAL = re.compile(r"'''|\"\"\"|['\"#\\()\[\]{}]")
+# Escapes and the closing quote, in a string opened with each quote
+_STRING_END = {quote: re.compile(r"\\(?:\r\n?|\n|.)|" + re.escape(quote)) for quote in ("'", '"', "'''", '"""')}
+_LINE_END = ("", "\n", "\r\n", "\r")
+
+
+class NotebookError(Exception):
+    """The file isn't a notebook we can read"""
+
+
+class _JsonReader:
+    """Minimal pull parser over a text stream, read in fixed-size chunks"""
+
+    def __init__(self, f: IO[str]):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+
+    def _fill(self) -> None:
+        """Drop the consumed part of the buffer and read another chunk"""
+        data = self._f.read(_CHUNK_SIZE)
+        if not data:
+            raise NotebookError("unexpected end of file")
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it"""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            self._fill()
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise NotebookError(f"expected {char!r} at {self._buf[self._pos:self._pos + 20]!r}")
+        self._pos += 1
+
+    def _scan_string(self, keep: bool) -> str | None:
+        """Consume a JSON string, returning its raw (still escaped) contents if `keep`"""
+        self.expect('"')
+        parts = []
+        while True:
+            buf = self._buf
+            match = _STRING_SPECIAL.search(buf, self._pos)
+            if match is None:
+                if keep:
+                    parts.append(buf[self._pos:])
+                self._pos = len(buf)
+                self._fill()
+                continue
+            i = match.start()
+            if buf[i] == '"':
+                if keep:
+                    parts.append(buf[self._pos:i])
+                self._pos = i + 1
+                return "".join(parts) if keep else None
+            if i + 1 == len(buf):
+                # Escape sequence split across chunks
+                if keep:
+                    parts.append(buf[self._pos:i])
+                self._pos = i
+                self._fill()
+                continue
+            if keep:
+                parts.append(buf[self._pos:i + 2])
+            self._pos = i + 2
+
+    def read_string(self) -> str:
+        return json.loads('"' + self._scan_string(keep=True) + '"')
+
+    def skip_value(self) -> None:
+        char = self.peek()
+        if char == '"':
+            self._scan_string(keep=False)
+        elif char in "[{":
+            depth = 0
+            while True:
+                match = _STRUCTURAL.search(self._buf, self._pos)
+                if match is None:
+                    self._pos = len(self._buf)
+                    self._fill()
+                    continue
+                if match.group() == '"':
+                    self._pos = match.start()
+                    self._scan_string(keep=False)
+                    continue
+                self._pos = match.end()
+                depth += 1 if match.group() in "[{" else -1
+                if depth == 0:
+                    return
+        else:
+            # number, true, false or null
+            while True:
+                match = _SCALAR_END.search(self._buf, self._pos)
+                if match is not None:
+                    self._pos = match.start()
+                    return
+                self._pos = len(self._buf)
+                self._fill()
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value"""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise NotebookError(f"expected ',' or '}}', found {char!r}")
+
+    def iter_array(self) -> Iterator[None]:
+        """Yield once per element of an array; the caller must consume each element"""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise NotebookError(f"expected ',' or ']', found {char!r}")
+
+
+def _read_source(reader: _JsonReader) -> str:
+    """Cell sources are either a string or a list of lines"""
+    if reader.peek() != "[":
+        return reader.read_string()
+    lines = []
+    for _ in reader.iter_array():
+        lines.append(reader.read_string())
+    return "".join(lines)
+
+
+def read_code_cells(f: IO[str]) -> Iterator[tuple[int, str]]:
+    """
+    Stream the code cells of an (nbformat 4) notebook.
+
+    Yields:
+        `(cell_number, source)`, where `cell_number` counts all cells from 1
+        so it matches the cell's position in the notebook
+    """
+    reader = _JsonReader(f)
+    for key in reader.iter_object():
+        if key != "cells":
+            reader.skip_value()
+            continue
+        for number, _ in enumerate(reader.iter_array(), start=1):
+            cell_type, source = None, ""
+            for cell_key in reader.iter_object():
+                if cell_key == "cell_type":
+                    cell_type = reader.read_string()
+                elif cell_key == "source":
+                    source = _read_source(reader)
+                else:
+                    reader.skip_value()
+            if cell_type == "code":
+                yield number, source
+
+
+def _scan_line(line: str, depth: int, quote: str | None) -> tuple[int, str | None, bool]:
+    """
+    Follow one line of code, starting inside `depth` brackets and, if
+    `quote` is set, inside a string opened with it.
+
+    Returns:
+        `(depth, quote, continued)` after the line, where `continued` is
+        whether it ends with a backslash continuation
+    """
+    pos = 0
+    while True:
+        if quote is not None:
+            match = None
+            for match in _STRING_END[quote].finditer(line, pos):
+                if match.group() == quote:
+                    pos, quote = match.end(), None
+                    break
+            else:
+                # Triple-quoted strings and escaped line breaks carry on
+                if len(quote) == 1 and (match is None or match.group()[1:] not in _LINE_END[1:]):
+                    quote = None
+                return depth, quote, False
+            continue
+        match = _CODE_SPECIAL.search(line, pos)
+        if match is None or match.group() == "#":
+            return depth, None, False
+        token, pos = match.group(), match.end()
+        if token[0] in "'\"":
+            quote = token
+        elif token == "\\":
+            if line[pos:] in _LINE_END:
+                return depth, None, True
+        elif token in "([{":
+            depth += 1
+        else:
+            depth = max(depth - 1, 0)
+
+
+def strip_magics(source: str) -> str:
+    """
+    Replace IPython-only syntax with `pass` so the cell parses as Python,
+    keeping line numbers unchanged. Cells starting with a cell magic
+    (`%%bash`, `%%timeit`, ...) are dropped entirely.
+
+    Only lines that start a logical line can be magics; lines inside
+    brackets, strings or after a backslash continuation are left as they
+    are (e.g. `% name` continuing a formatting expression).
+    """
+    if source.lstrip().startswith("%%"):
+        return ""
+    lines = source.splitlines(keepends=True)
+    depth, quote, continued = 0, None, False
+    for i, line in enumerate(lines):
+        if not (depth or quote or continued):
+            match = _MAGIC_LINE.match(line)
+            if match is not None:
+                lines[i] = f"{match.group(1)}pass\n"
+                continue
+        depth, quote, continued = _scan_line(line, depth, quote)
+    return "".join(lines)
@@ -1,47 +1,253 @@
 from __future__ import annotations
 
 import ast
+import atexit
 from dataclasses import dataclass
-import importlib.metadata
+import functools
+import itertools
+import os
+import re
+import sys
+from typing import NamedTuple
+import unicodedata
+
+from .cache import CACHE_DIR_ENV, ResultCache, source_key
+from . import profiling
+from .rules import (
+    INDEX_FILE, CallIndex, PathTrie, read_index, rule_sets_fingerprint, rule_sets_stamp, words_pattern,
+)
+# Modules defining the rule tables, imported on first use (see `__getattr__`)
+_TABLE_MODULES = ("deprecated_paths", "deprecated_paths_v2", "deprecated_methods", "deprecated_kwargs")
+_TABLE_SOURCES = tuple(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{module}.py") for module in _TABLE_MODULES
+)
+_RULE_SET_NAMES = ("RULE_SETS", "METHOD_RULE_SETS", "KWARG_RULE_SETS", "METHOD_KWARG_RULE_SETS")
+
+
+def _load_tables() -> None:
+    global RULE_SETS, METHOD_RULE_SETS, KWARG_RULE_SETS, METHOD_KWARG_RULE_SETS
+    if "RULE_SETS" in globals():
+        return
+    from .deprecated_paths import DEPRECATED_PATHS, EXCEPTIONS
+    from .deprecated_paths_v2 import DEPRECATED_PATHS_V2, EXCEPTIONS_V2
+    from .deprecated_methods import DEPRECATED_METHODS_V1, DEPRECATED_METHODS_V2
+    from .deprecated_kwargs import DEPRECATED_KWARGS_V2, DEPRECATED_METHOD_KWARGS_V1
+
+    RULE_SETS = [
+        ("QKT100", DEPRECATED_PATHS, EXCEPTIONS),
+        ("QKT200", DEPRECATED_PATHS_V2, EXCEPTIONS_V2),
+    ]
+
+    METHOD_RULE_SETS = [
+        ("QKT101", DEPRECATED_METHODS_V1),
+        ("QKT201", DEPRECATED_METHODS_V2),
+    ]
+
+    KWARG_RULE_SETS = [
+        ("QKT202", DEPRECATED_KWARGS_V2),
+    ]
+
+    METHOD_KWARG_RULE_SETS = [
+        ("QKT102", DEPRECATED_METHOD_KWARGS_V1),
+    ]
+
+
+def __getattr__(name: str):
+    # `RULE_SETS` and friends are only created when something asks for them
+    if name in _RULE_SET_NAMES:
+        _load_tables()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Maximum number of `(path, original_import_path)` results kept by
+# `deprecation_messages`; the same dotted names recur across a whole run
+DEPRECATION_CACHE_SIZE = int(os.environ.get("FLAKE8_QISKIT_MIGRATION_CACHE_SIZE", 4096))
+
+# Compiled rule structures, kept up to date by `refresh_rule_index`
+_PRECOMPILED = "precompiled"
+_path_trie: PathTrie | None = None
+_rules_stamp: tuple | str | None = None
+_call_index: CallIndex | None = None
+_prefilter_needles: tuple[str, ...] = ("qiskit",)
+_rules_digest: str | None = None
+# Selected codes → `_SelectedRules`, see `_rules_for`
+_selections: dict[frozenset, _SelectedRules] = {}
+
+
+def _all_rule_sets() -> tuple[list, ...]:
+    return (RULE_SETS, METHOD_RULE_SETS, KWARG_RULE_SETS, METHOD_KWARG_RULE_SETS)
+
+
+def _tables_loaded() -> bool:
+    return "RULE_SETS" in globals() or any(
+        f"{__package__}.{module}" in sys.modules for module in _TABLE_MODULES
+    )
+
+
+def prefilter_needles(rule_sets, kwarg_rule_sets) -> tuple[str, ...]:
+    """
+    Substrings of which every file with a problem contains at least one:
+    method and kwarg checks need a `qiskit` import, path checks need the root
+    of a deprecated path.
+    """
+    roots = {"qiskit"}
+    for _, paths_dict, _ in rule_sets:
+        roots.update(path.split(".", 1)[0] for path in paths_dict)
+    for _, kwargs_dict in kwarg_rule_sets:
+        roots.update(func_path.split(".", 1)[0] for func_path, _ in kwargs_dict)
+    return tuple(sorted(roots))
 
-from .deprecated_paths import DEPRECATED_PATHS, EXCEPTIONS
-from .deprecated_paths_v2 import DEPRECATED_PATHS_V2, EXCEPTIONS_V2
-from .deprecated_methods import DEPRECATED_METHODS_V1, DEPRECATED_METHODS_V2
-from .deprecated_kwargs import DEPRECATED_KWARGS_V2, DEPRECATED_METHOD_KWARGS_V1
 
-RULE_SETS = [
-    ("QKT100", DEPRECATED_PATHS, EXCEPTIONS),
-    ("QKT200", DEPRECATED_PATHS_V2, EXCEPTIONS_V2),
-]
+def refresh_rule_index() -> None:
+    """
+    Compile the rule tables into the structures the visitor uses, or
+    recompile them if the tables have been extended since they were built.
+
+    Until something imports the tables (the `deprecated_*` modules, or
+    `RULE_SETS` and friends from here) they can't have been changed, so the
+    precompiled index is used instead if there is an up-to-date one.
+    """
+    global _path_trie, _rules_stamp, _call_index
+    global _prefilter_needles, _rules_digest
+    if _rules_stamp == _PRECOMPILED and not _tables_loaded():
+        return
+    if _rules_stamp is None and not _tables_loaded():
+        index = read_index(INDEX_FILE, _TABLE_SOURCES)
+        if index is not None:
+            _path_trie = index["trie"]
+            _call_index = index["calls"]
+            _prefilter_needles = index["needles"]
+            _rules_digest = index["fingerprint"]
+            _rules_stamp = _PRECOMPILED
+            _cached_messages.cache_clear()
+            _selections.clear()
+            return
+    _load_tables()
+    stamp = rule_sets_stamp(*_all_rule_sets())
+    if stamp != _rules_stamp:
+        _path_trie = PathTrie(RULE_SETS)
+        _call_index = CallIndex(*_all_rule_sets()[1:])
+        _prefilter_needles = prefilter_needles(RULE_SETS, KWARG_RULE_SETS)
+        _rules_digest = None
+        _rules_stamp = stamp
+        _cached_messages.cache_clear()
+        _selections.clear()
+
+
+def compile_rule_index(filename: str = INDEX_FILE) -> None:
+    """Write the precompiled index read by `refresh_rule_index`"""
+    from .rules import write_index
+
+    _load_tables()
+    write_index(
+        filename,
+        _TABLE_SOURCES,
+        PathTrie(RULE_SETS),
+        CallIndex(*_all_rule_sets()[1:]),
+        prefilter_needles(RULE_SETS, KWARG_RULE_SETS),
+        rule_sets_fingerprint(*_all_rule_sets()),
+    )
+
+
+def rules_fingerprint(codes: frozenset | None = None) -> str:
+    """
+    Identify the loaded rule tables and plugin version, for use in
+    persistent cache keys. Computed on first use after the tables change.
+
+    Args:
+        codes: selected codes as passed to `Visitor`, if not all of them
+    """
+    global _rules_digest
+    refresh_rule_index()
+    if _rules_digest is None:
+        _rules_digest = rule_sets_fingerprint(*_all_rule_sets())
+    if codes is None:
+        return f"{Plugin.version}:{_rules_digest}"
+    return f"{Plugin.version}:{_rules_digest}:{','.join(sorted(codes))}"
 
-METHOD_RULE_SETS = [
-    ("QKT101", DEPRECATED_METHODS_V1),
-    ("QKT201", DEPRECATED_METHODS_V2),
-]
 
-KWARG_RULE_SETS = [
-    ("QKT202", DEPRECATED_KWARGS_V2),
-]
+def rule_codes() -> tuple[str, ...]:
+    """Every code the rule sets can report, sorted"""
+    refresh_rule_index()
+    return tuple(sorted({*_path_trie.codes, *_call_index.codes}))
 
-METHOD_KWARG_RULE_SETS = [
-    ("QKT102", DEPRECATED_METHOD_KWARGS_V1),
-]
 
+def select_codes(select: list[str] | None = None, ignore: list[str] = ()) -> frozenset | None:
+    """
+    Codes enabled by `select` and `ignore` prefixes, as in flake8: a code is
+    enabled if it starts with a selected prefix (any prefix, if `select` is
+    None) and either matches no ignored prefix or a longer selected one.
 
-def _check_path(path: str, original_import_path: str, prefix: str, paths_dict: dict, exceptions: list) -> str | None:
+    Returns:
+        The enabled codes, or None if that is all of them
+    """
+    def longest_match(code: str, prefixes) -> int:
+        return max((len(prefix) for prefix in prefixes if code.startswith(prefix)), default=-1)
+
+    codes = rule_codes()
+    selected = set()
+    for code in codes:
+        select_match = 0 if select is None else longest_match(code, select)
+        ignore_match = longest_match(code, ignore)
+        if select_match >= 0 and (ignore_match < 0 or select_match > ignore_match):
+            selected.add(code)
+    return None if len(selected) == len(codes) else frozenset(selected)
+
+
+class _SelectedRules(NamedTuple):
+    path_trie: PathTrie
+    call_index: CallIndex
+    # Words of which every statement with a problem contains at least one,
+    # apart from the names the module binds; see `Visitor.visit`
+    words: frozenset
+
+
+def _rules_for(codes: frozenset | None) -> _SelectedRules:
+    """The compiled rule structures restricted to `codes` (None for all)"""
+    rules = _selections.get(codes)
+    if rules is None:
+        if codes is None:
+            path_trie, call_index = _path_trie, _call_index
+        else:
+            path_trie, call_index = _path_trie.restricted(codes), _call_index.restricted(codes)
+        # Method names; functions are only recognized through a name the
+        # module binds or the root of their path, as are deprecated paths;
+        # and statements with imports may bind names
+        words = frozenset({*_prefilter_needles, "import", *(key for key in call_index.calls if "." not in key)})
+        rules = _selections[codes] = _SelectedRules(path_trie, call_index, words)
+    return rules
+
+
+def _messages(path: str, original_import_path: str, path_trie: PathTrie) -> tuple[tuple[str, str], ...]:
+    """`(message, matched_key)` for every rule set deprecating `path`"""
+    return tuple(
+        (f"{code}: " + template.format(original_import_path), key)
+        for code, key, template in path_trie.lookup(path)
+    )
+
+
+_cached_messages = functools.lru_cache(maxsize=DEPRECATION_CACHE_SIZE)(_messages)
+
+
+def set_deprecation_cache_size(maxsize: int | None) -> None:
+    """
+    Resize the `deprecation_messages` cache (`None` for unbounded, `0` to
+    disable it). This clears the cache and its counters.
     """
-    Recursively check if a path matches a deprecated path in the given dict.
+    global _cached_messages
+    _cached_messages = functools.lru_cache(maxsize=maxsize)(_messages)
 
-    Returns a formatted message string if deprecated, None otherwise.
+
+def deprecation_cache_info():
     """
-    if path in exceptions:
-        return None
-    if path not in paths_dict:
-        parent = ".".join(path.split(".")[:-1])
-        if "." not in parent:
-            return None
-        return _check_path(parent, original_import_path, prefix, paths_dict, exceptions)
-    return f"{prefix}: " + paths_dict[path].format(original_import_path)
+    Hit/miss counters of the `deprecation_messages` cache, as a
+    `functools._CacheInfo(hits, misses, maxsize, currsize)` named tuple.
+    """
+    return _cached_messages.cache_info()
+
+
+refresh_rule_index()
 
 
 def deprecation_messages(path: str, original_import_path: str | None = None) -> list[str]:
@@ -54,86 +260,324 @@ def deprecation_messages(path: str, original_import_path: str | None = None) ->
     Returns:
         List of deprecation message strings (may be empty)
     """
-    original_import_path = original_import_path or path
     if "." not in path:
         return []
-    messages = []
-    for prefix, paths_dict, exceptions in RULE_SETS:
-        msg = _check_path(path, original_import_path, prefix, paths_dict, exceptions)
-        if msg is not None:
-            messages.append(msg)
-    return messages
+    refresh_rule_index()
+    return [msg for msg, _ in _cached_messages(path, original_import_path or path, _path_trie)]
+
+
+def may_have_problems(source: str) -> bool:
+    """
+    Cheap substring test on the raw source of a file.
+
+    Returns False only if the file provably can't produce any problem, which
+    lets us skip walking the AST of the (many) files that never mention
+    Qiskit.
+    """
+    if not source.isascii():
+        # Identifiers are NFKC-normalized by the parser, so e.g. a full-width
+        # `ｑiskit` still imports qiskit
+        source = unicodedata.normalize("NFKC", source)
+    return any(needle in source for needle in _prefilter_needles)
+
+
+def _attribute_chain(node: ast.Attribute) -> tuple[ast.expr, list[ast.Attribute]]:
+    """
+    Split an attribute chain such as `a.b.c` into its base expression (`a`)
+    and its Attribute nodes, from the innermost (`a.b`) to the outermost.
+    """
+    chain = []
+    while type(node) is ast.Attribute:
+        chain.append(node)
+        node = node.value
+    chain.reverse()
+    return node, chain
+
+
+class _ExitScope:
+    """
+    Pushed on the walk stack by scope-creating nodes, to pop the scope once
+    their children have been visited
+    """
+
+
+_EXIT_SCOPE = _ExitScope()
+
+# In a scope's undo log: the name was not bound before the scope bound it
+_UNBOUND = object()
 
 
-def _get_dotted_name(node: ast.expr) -> str | None:
-    """Reconstruct a dotted name from an AST node (Name or Attribute chain)."""
-    if isinstance(node, ast.Name):
-        return node.id
-    if isinstance(node, ast.Attribute):
-        parent = _get_dotted_name(node.value)
-        if parent is not None:
-            return f"{parent}.{node.attr}"
-    return None
+def _undo(table: dict, saved: dict) -> None:
+    """Restore the entries of `table` recorded in an undo log"""
+    for name, value in saved.items():
+        if value is _UNBOUND:
+            del table[name]
+        else:
+            table[name] = value
+
+# Fields that never hold nodes worth walking into (expression contexts,
+# operators, and plain strings/ints such as names and flags)
+_SKIPPED_FIELDS = frozenset({
+    "ctx", "op", "ops", "type_comment", "type_ignores", "kind", "id", "attr", "arg", "name",
+    "names", "module", "asname", "level", "is_async", "conversion", "simple", "kwd_attrs", "rest",
+})
+
+# Line breaks, as the parser counts lines
+_NEWLINE = re.compile(r"\r\n?|\n")
+# Statements that always bind names, and ones that never bind module-level
+# names (those of functions and classes are undone when their scope ends)
+_IMPORT_STATEMENTS = (ast.Import, ast.ImportFrom)
+_NON_BINDING_STATEMENTS = frozenset({
+    ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+    ast.Return, ast.Delete, ast.Pass, ast.Raise, ast.Assert, ast.Global, ast.Nonlocal, ast.Break, ast.Continue,
+})
+
+# Node type → names of fields that may hold child nodes, in reverse order
+_CHILD_FIELDS: dict[type, tuple[str, ...]] = {
+    ast.Constant: (),
+    type(None): (),  # e.g. `Dict.keys` entries for `**mapping`
+}
+
+
+def _child_fields(node_type: type) -> tuple[str, ...]:
+    fields = getattr(node_type, "_fields", ())
+    fields = tuple(reversed([f for f in fields if f not in _SKIPPED_FIELDS]))
+    _CHILD_FIELDS[node_type] = fields
+    return fields
 
 
 class Visitor(ast.NodeVisitor):
     """
     Visitor to detect deprecated imports, method calls, and keyword arguments.
     Includes support for aliases and scopes, but not assignments.
+
+    Unlike `ast.NodeVisitor`, `visit` walks the tree iteratively with an
+    explicit stack, so deeply nested code can't raise `RecursionError`, and
+    only calls `visit_<NodeType>` methods for the few node types that have
+    one (looked up once per visitor, not once per node). These methods don't
+    call `generic_visit`; the walk continues into the node's children unless
+    they return False.
     """
 
-    def __init__(self):
+    # Visitor class → {node type: method name}, see `_handler_names`
+    _HANDLER_NAMES: dict[type, dict[type, str]] = {}
+
+    def __init__(self, codes: frozenset | None = None):
+        """
+        Args:
+            codes: only run the checks for these codes (see `select_codes`);
+                all of them if None
+        """
+        refresh_rule_index()
+        self._path_trie, call_index, self._words = _rules_for(codes)
+        self._roots = frozenset(_prefilter_needles)
+        # Names that `_pattern`, of `_statement_pattern`, was built for
+        self._names = self._pattern = None
+        self._check_paths = bool(self._path_trie.codes)
+        self._calls = call_index.calls
+        self._check_method_calls = call_index.methods
+        self._check_function_calls = call_index.functions
         self.problems: list[Problem] = []
-        self.mappings: list[dict[str, str]] = [{}]  # track aliases for each scope
         self.imports_qiskit: bool = False  # set True if any qiskit import is found
-        # Maps local name → full qiskit import path for from-imports
-        # e.g. {"transpile": "qiskit.compiler.transpile"}
-        self.qiskit_functions: list[dict[str, str]] = [{}]  # scoped like mappings
+        # Names bound in the scopes entered so far, flattened so a lookup is
+        # one dict access however deeply scopes are nested:
+        # - aliases: local name → what `resolve_aliases` returns for it
+        # - qiskit_functions: local name → full qiskit import path of the
+        #   innermost from-import, e.g. {"transpile": "qiskit.compiler.transpile"}
+        self._aliases: dict[str, str] = {}
+        self._qiskit_functions: dict[str, str] = {}
+        # Undo log of each scope entered below the module: the previous values
+        # of the `(_aliases, _qiskit_functions)` entries it has bound
+        self._scopes: list[tuple[dict, dict]] = []
+        # Attribute chains already split by `visit_Call`, by id of the outermost node
+        self._chains: dict[int, tuple] = {}
+        # Top-level statements `visit` didn't need to walk
+        self.skipped_statements = 0
+
+    def reset(self) -> None:
+        """Forget all problems and names, to visit an unrelated module"""
+        self.problems.clear()
+        self.imports_qiskit = False
+        self._aliases = {}
+        self._qiskit_functions = {}
+        self._scopes = []
+        self._chains = {}
+        self.skipped_statements = 0
+
+    @classmethod
+    def _handler_names(cls) -> dict[type, str]:
+        names = cls._HANDLER_NAMES.get(cls)
+        if names is None:
+            names = {}
+            for name in dir(cls):
+                node_type = getattr(ast, name[len("visit_"):], None) if name.startswith("visit_") else None
+                if isinstance(node_type, type) and issubclass(node_type, ast.AST):
+                    names[node_type] = name
+            cls._HANDLER_NAMES[cls] = names
+        return names
+
+    def visit(self, tree: ast.AST, source: str | None = None) -> None:
+        """
+        Walk `tree` depth-first in source order, dispatching on node type.
+
+        If `tree` is a module parsed from `source`, top-level statements
+        that can't have a problem are skipped without walking them: those
+        that don't contain any of the words a problem needs (method names
+        with rules, roots of deprecated paths, and names bound to something
+        from those roots so far), found with one regex search over each
+        statement's lines. Statements that may import are always walked, so
+        the names bound are the same as without skipping.
+        """
+        handlers = self._make_handlers()
+        if source is None or type(tree) is not ast.Module:
+            self._walk([tree], handlers)
+            return
+        line_starts = None  # computed when first needed, as most files start with imports
+        # Statements to walk are collected and walked together, until the
+        # names they bind are needed to decide about the next statement
+        pending = []
+        search = None  # of `_statement_pattern()`, None if names may have changed since
+        for node in tree.body:
+            node_type = type(node)
+            end = node.end_lineno
+            if end is not None and node_type not in _IMPORT_STATEMENTS:
+                if line_starts is None:
+                    if not source.isascii():
+                        # Identifiers are NFKC-normalized by the parser, see `may_have_problems`
+                        source = unicodedata.normalize("NFKC", source)
+                    if "\r" in source:
+                        source = _NEWLINE.sub("\n", source)
+                    # Offset of the start of each line, counting from 1 like `lineno`
+                    line_starts = [0, 0]
+                    line_starts.extend(itertools.accumulate(len(line) + 1 for line in source.split("\n")))
+                    last_line = len(line_starts) - 2
+                if search is None:
+                    self._walk(pending, handlers)
+                    pending = []
+                    search = self._statement_pattern().search
+                start = node.lineno
+                for decorator in getattr(node, "decorator_list", ()):
+                    start = min(start, decorator.lineno)
+                if not search(source, line_starts[start], line_starts[min(end, last_line) + 1]):
+                    self.skipped_statements += 1
+                    continue
+            pending.append(node)
+            if node_type not in _NON_BINDING_STATEMENTS:
+                search = None
+        self._walk(pending, handlers)
+
+    def _statement_pattern(self) -> re.Pattern:
+        """Regex of the words a statement with a problem contains, given the names bound so far"""
+        roots = self._roots
+        names = {name for name, target in self._aliases.items() if target.partition(".")[0] in roots}
+        names.update(self._qiskit_functions)
+        names = frozenset(names)
+        if names != self._names:
+            self._names = names
+            self._pattern = words_pattern(self._words.union(names))
+        return self._pattern
+
+    def _walk(self, nodes: list, handlers: dict) -> None:
+        child_fields = _CHILD_FIELDS
+        stack = self._stack = nodes[::-1]
+        pop, push, extend = stack.pop, stack.append, stack.extend
+        while stack:
+            node = pop()
+            node_type = type(node)
+            handler = handlers.get(node_type)
+            if handler is not None and handler(node) is False:
+                continue
+            fields = child_fields.get(node_type)
+            if fields is None:
+                fields = _child_fields(node_type)
+            for field in fields:
+                value = getattr(node, field, None)
+                if type(value) is list:
+                    extend(reversed(value))
+                elif value is not None:
+                    push(value)
+
+    def _make_handlers(self) -> dict:
+        """{node type: bound handler method} used by `visit`"""
+        handlers = {node_type: getattr(self, name) for node_type, name in self._handler_names().items()}
+        handlers[_ExitScope] = self._exit_scope_marker
+        return handlers
+
+    def _exit_scope_marker(self, marker: _ExitScope) -> bool:
+        self.exit_scope()
+        return False
 
     def enter_scope(self) -> None:
-        """Add new mapping for scoped aliases"""
-        self.mappings.append({})
-        self.qiskit_functions.append({})
+        """Start a scope for aliases"""
+        self._scopes.append(({}, {}))
 
     def exit_scope(self) -> None:
-        """Delete scoped aliases"""
-        self.mappings.pop()
-        self.qiskit_functions.pop()
+        """Undo the bindings of the innermost scope"""
+        saved_aliases, saved_functions = self._scopes.pop()
+        _undo(self._aliases, saved_aliases)
+        _undo(self._qiskit_functions, saved_functions)
+
+    def module_state(self) -> list:
+        """Module-level names bound so far, as JSON-serializable data"""
+        aliases, qiskit_functions = dict(self._aliases), dict(self._qiskit_functions)
+        for saved_aliases, saved_functions in reversed(self._scopes):
+            _undo(aliases, saved_aliases)
+            _undo(qiskit_functions, saved_functions)
+        return [aliases, qiskit_functions, self.imports_qiskit]
+
+    def restore_module_state(self, state: list) -> None:
+        """Continue from a state returned by `module_state`, at module level"""
+        aliases, qiskit_functions, imports_qiskit = state
+        self._aliases = dict(aliases)
+        self._qiskit_functions = dict(qiskit_functions)
+        self._scopes = []
+        self.imports_qiskit = imports_qiskit
 
     def add_alias(self, alias: ast.alias) -> None:
-        if alias.asname is None or alias.asname == alias.name:
+        name = alias.asname
+        if name is None or name == alias.name:
             return
-        self.mappings[-1][alias.asname] = alias.name
+        aliases = self._aliases
+        target = alias.name
+        if self._scopes:
+            # The target is resolved as the enclosing scopes see it, even if
+            # this scope has already bound that name itself
+            saved = self._scopes[-1][0]
+            previous = saved.get(target, aliases.get(target, target))
+            target = target if previous is _UNBOUND else previous
+            if name not in saved:
+                saved[name] = aliases.get(name, _UNBOUND)
+        aliases[name] = target
+
+    def _bind_qiskit_function(self, name: str, path: str) -> None:
+        if self._scopes:
+            saved = self._scopes[-1][1]
+            if name not in saved:
+                saved[name] = self._qiskit_functions.get(name, _UNBOUND)
+        self._qiskit_functions[name] = path
 
     def resolve_aliases(self, name: str) -> str:
-        for mapping in reversed(self.mappings):
-            name = mapping.get(name, name)
-        return name
+        return self._aliases.get(name, name)
 
-    def _resolve_func_path(self, node: ast.expr) -> str | None:
-        """Resolve a function call target to a full qiskit import path, or None."""
+    def _resolve_func_path(self, node: ast.expr, chain: tuple | None = None) -> str | None:
+        """
+        Resolve a function call target to a full qiskit import path, or None.
+        For attributes, `chain` is `_attribute_chain(node)` if already known.
+        """
         if isinstance(node, ast.Name):
-            # Look up in qiskit_functions (scoped)
-            for scope in reversed(self.qiskit_functions):
-                if node.id in scope:
-                    return scope[node.id]
-            return None
+            return self._qiskit_functions.get(node.id)
         if isinstance(node, ast.Attribute):
-            # Build dotted path and resolve aliases
-            dotted = _get_dotted_name(node)
-            if dotted is None:
+            base, attributes = chain or _attribute_chain(node)
+            if type(base) is not ast.Name:
                 return None
-            parts = dotted.split(".", 1)
-            root = parts[0]
-            rest = parts[1] if len(parts) > 1 else ""
+            root = base.id
+            rest = ".".join(attribute.attr for attribute in attributes)
             # First try qiskit_functions for the root (e.g. Target → qiskit.transpiler.Target)
-            for scope in reversed(self.qiskit_functions):
-                if root in scope:
-                    full_root = scope[root]
-                    return f"{full_root}.{rest}" if rest else full_root
+            path = self._qiskit_functions.get(root)
+            if path is not None:
+                return f"{path}.{rest}"
             # Then try alias resolution (e.g. qk → qiskit)
-            resolved_root = self.resolve_aliases(root)
-            resolved = f"{resolved_root}.{rest}" if rest else resolved_root
+            resolved = f"{self.resolve_aliases(root)}.{rest}"
             if resolved.startswith("qiskit."):
                 return resolved
         return None
@@ -143,20 +587,22 @@ class Visitor(ast.NodeVisitor):
         Adds path to problems if deprecated, ignores otherwise
         Returns True if any problem was reported
         """
-        msgs = deprecation_messages(path)
-        for msg in msgs:
-            self.problems.append(Problem(node, msg))
+        if "." not in path:
+            return False
+        msgs = _cached_messages(path, path, self._path_trie)
+        for msg, key in msgs:
+            self.problems.append(Problem(node, msg, key))
         return len(msgs) > 0
 
-    def visit_Import(self, node: ast.Import) -> None:
+    def visit_Import(self, node: ast.Import) -> bool:
         for alias in node.names:
             self.add_alias(alias)
             if alias.name.startswith("qiskit"):
                 self.imports_qiskit = True
             self.report_if_deprecated(alias.name, node)
-        self.generic_visit(node)
+        return False
 
-    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> bool:
         if node.module and node.module.startswith("qiskit"):
             self.imports_qiskit = True
         for alias in node.names:
@@ -165,77 +611,155 @@ class Visitor(ast.NodeVisitor):
             # Track the local name → full qiskit path for kwarg checking
             if node.module and node.module.startswith("qiskit"):
                 local_name = alias.asname if alias.asname else alias.name
-                self.qiskit_functions[-1][local_name] = path
+                self._bind_qiskit_function(local_name, path)
             self.report_if_deprecated(path, node)
-        self.generic_visit(node)
-
-    def visit_Attribute(self, node: ast.Attribute) -> None:
-        def _get_parents(node):
-            if isinstance(node, ast.Name):
-                return node.id
-            if isinstance(node, ast.Attribute):
-                parents = _get_parents(node.value)
-                parents = self.resolve_aliases(parents)
-                return f"{parents}.{node.attr}"
-
-        path = _get_parents(node)
-        if not self.report_if_deprecated(path, node):
-            self.generic_visit(node)
+        return False
+
+    def visit_Attribute(self, node: ast.Attribute) -> bool:
+        # Handle the whole chain `a.b.c` here, rather than one level at a
+        # time as the walk reaches `a.b.c`, then `a.b`: that would rebuild
+        # the dotted name at every level
+        base, chain = self._chains.pop(id(node), None) or _attribute_chain(node)
+        if type(base) is not ast.Name:
+            # Nothing to resolve, but the base may contain more chains
+            self._stack.append(base)
+            return False
+        if not self._check_paths:
+            return False
+        paths = []
+        path = self.resolve_aliases(base.id)
+        for attribute in chain:
+            path = f"{path}.{attribute.attr}"
+            paths.append(path)
+        # Report only the outermost deprecated level
+        for attribute, path in zip(reversed(chain), reversed(paths)):
+            if self.report_if_deprecated(path, attribute):
+                break
+        return False
 
     def visit_Call(self, node: ast.Call) -> None:
-        # A) Check for deprecated method calls (e.g. obj.c_if(), qc.qasm())
-        if isinstance(node.func, ast.Attribute) and self.imports_qiskit:
-            method_name = node.func.attr
-            for prefix, methods_dict in METHOD_RULE_SETS:
-                if method_name in methods_dict:
-                    msg = f"{prefix}: " + methods_dict[method_name].format(
-                        f".{method_name}()"
-                    )
-                    self.problems.append(Problem(node, msg))
-
-        # B) Check for deprecated kwargs on known qiskit functions
-        func_path = self._resolve_func_path(node.func)
-        if func_path and node.keywords:
-            for prefix, kwargs_dict in KWARG_RULE_SETS:
-                for kw in node.keywords:
-                    if kw.arg and (func_path, kw.arg) in kwargs_dict:
-                        msg = f"{prefix}: " + kwargs_dict[(func_path, kw.arg)]
-                        self.problems.append(Problem(node, msg))
-
-        # C) Check for deprecated kwargs on method calls (heuristic)
-        if isinstance(node.func, ast.Attribute) and self.imports_qiskit and node.keywords:
-            method_name = node.func.attr
-            for prefix, method_kwargs_dict in METHOD_KWARG_RULE_SETS:
-                for kw in node.keywords:
-                    if kw.arg and (method_name, kw.arg) in method_kwargs_dict:
-                        msg = f"{prefix}: " + method_kwargs_dict[(method_name, kw.arg)]
-                        self.problems.append(Problem(node, msg))
-
-        self.generic_visit(node)
+        chain = None
+        method_kwargs = None
+        if type(node.func) is ast.Attribute:
+            # Shared with `visit_Attribute`, which the walk reaches next
+            chain = self._chains[id(node.func)] = _attribute_chain(node.func)
+            if self.imports_qiskit and self._check_method_calls:
+                method_kwargs = self._check_methods(node)
+        if node.keywords:
+            if self._check_function_calls:
+                self._check_kwargs(node, chain)
+            if method_kwargs:
+                self._check_method_kwargs(node, method_kwargs)
+
+    def _check_methods(self, node: ast.Call) -> dict | None:
+        """
+        Check for deprecated method calls (e.g. obj.c_if(), qc.qasm())
+
+        Returns:
+            Deprecated kwargs of the method, for `_check_method_kwargs`
+        """
+        rules = self._calls.get(node.func.attr)
+        if rules is None:
+            return None
+        messages, kwargs = rules
+        for msg in messages:
+            self.problems.append(Problem(node, msg, node.func.attr))
+        return kwargs
+
+    def _check_kwargs(self, node: ast.Call, chain: tuple | None) -> None:
+        """Check for deprecated kwargs on known qiskit functions"""
+        func_path = self._resolve_func_path(node.func, chain)
+        rules = self._calls.get(func_path) if func_path else None
+        if rules is not None:
+            self._report_kwargs(node, func_path, rules[1])
+
+    def _check_method_kwargs(self, node: ast.Call, kwargs: dict) -> None:
+        """Check for deprecated kwargs on method calls (heuristic)"""
+        self._report_kwargs(node, node.func.attr, kwargs)
+
+    def _report_kwargs(self, node: ast.Call, name: str, kwargs: dict) -> None:
+        for kw in node.keywords:
+            for msg in kwargs.get(kw.arg, ()):
+                self.problems.append(Problem(node, msg, (name, kw.arg)))
 
     # Push / pop scopes for aliases
-    def visit_FunctionDef(self, node: ast.FunctionDef):
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
         self.enter_scope()
-        self.generic_visit(node)
-        self.exit_scope()
+        self._stack.append(_EXIT_SCOPE)
 
-    def visit_AsyncFunctionDef(self, node: ast.FunctionDef):
-        self.enter_scope()
-        self.generic_visit(node)
-        self.exit_scope()
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
 
-    def visit_ClassDef(self, node: ast.FunctionDef):
-        self.enter_scope()
-        self.generic_visit(node)
-        self.exit_scope()
+
+class _Version:
+    def __get__(self, instance, owner) -> str:
+        import importlib.metadata
+
+        owner.version = importlib.metadata.version("flake8_qiskit_migration")
+        return owner.version
 
 
 class Plugin:
     name = "flake8_qiskit_migration"
-    version = importlib.metadata.version("flake8_qiskit_migration")
-
-    def __init__(self, tree: ast.AST):
+    # Looked up on first use: importing `importlib.metadata` takes longer than
+    # everything else at startup, and flake8 reads versions from the package
+    # metadata itself
+    version = _Version()
+
+    # Directory of the persistent result cache; `None` disables it
+    cache_dir: str | None = os.environ.get(CACHE_DIR_ENV)
+    _cache: ResultCache | None = None
+    _cache_owner: tuple | None = None
+    # Profile of every file checked in this process, if profiling
+    _profile: profiling.Profile | None = None
+    # Codes selected through flake8's options, or None for all of them
+    codes: frozenset | None = None
+
+    def __init__(self, tree: ast.AST, lines: list[str] | None = None):
         self._tree = tree
+        self._lines = lines
+
+    @classmethod
+    def add_options(cls, option_manager) -> None:
+        option_manager.add_option(
+            "--qiskit-migration-cache-dir",
+            default=None,
+            parse_from_config=True,
+            help="Directory of a persistent cache of flake8-qiskit-migration "
+            f"results (default: ${CACHE_DIR_ENV}, or no cache)",
+        )
+
+    @classmethod
+    def parse_options(cls, options) -> None:
+        cls.cache_dir = options.qiskit_migration_cache_dir or os.environ.get(CACHE_DIR_ENV)
+        cls.codes = _flake8_selection(options)
+
+    @classmethod
+    def _result_cache(cls) -> ResultCache | None:
+        """Cache connection for this process (connections can't cross a fork)"""
+        if cls.cache_dir is None:
+            return None
+        owner = (os.getpid(), cls.cache_dir)
+        if cls._cache_owner != owner:
+            cls._cache = ResultCache.open(cls.cache_dir)
+            cls._cache_owner = owner
+        return cls._cache
+
+    @classmethod
+    def _visitor(cls) -> Visitor:
+        if not profiling.enabled():
+            return Visitor(cls.codes)
+        if cls._profile is None:
+            # flake8 runs plugins in worker processes that don't run atexit
+            # handlers, so this is only reported with `--jobs 1`
+            cls._profile = profiling.Profile()
+            atexit.register(cls._profile.report)
+        return cls._profile.instrument(Visitor(cls.codes))
+
+    def _find_problems(self) -> list[tuple]:
+        v = self._visitor()
+        v.visit(self._tree, None if self._lines is None else "".join(self._lines))
+        return [problem.result() for problem in v.problems]
 
     def run(self):
         """
@@ -245,16 +769,58 @@ class Plugin:
             str: Message for user
            Type: (unused)
         """
-        v = Visitor()
-        v.visit(self._tree)
-        for problem in v.problems:
-            yield problem.format()
+        if self.codes is not None and not self.codes:
+            return
+        if self._lines is None:
+            results = self._find_problems()
+        else:
+            refresh_rule_index()
+            source = "".join(self._lines)
+            if not may_have_problems(source):
+                return
+            cache = self._result_cache()
+            if cache is None:
+                results = self._find_problems()
+            else:
+                key = source_key(source, rules_fingerprint(self.codes))
+                results = cache.get(key)
+                if results is None:
+                    results = self._find_problems()
+                    cache.put(key, results)
+        for line, col, msg, _ in results:
+            yield (line, col, msg, None)
+
+
+def _flake8_selection(options) -> frozenset | None:
+    """
+    Codes that flake8 would report given its `--select`, `--ignore` (and
+    `--extend-...`) options, so checks for the others can be skipped
+    entirely rather than filtered out afterwards. Per-file ignores and
+    `noqa` comments are still left to flake8.
+    """
+    try:
+        from flake8.style_guide import Decision, DecisionEngine
+
+        decider = DecisionEngine(options)
+        codes = rule_codes()
+        selected = frozenset(code for code in codes if decider.decision_for(code) is Decision.Selected)
+    except (ImportError, AttributeError, TypeError):
+        # Not run by a flake8 we know; run every check and let it filter
+        return None
+    return None if len(selected) == len(codes) else selected
 
 
 @dataclass
 class Problem:
     node: ast.AST
     msg: str
+    # Key of the rule table entry that matched: a deprecated path (prefix), a
+    # method name, or a `(function path or method name, kwarg)` tuple
+    key: str | tuple[str, str] | None = None
 
     def format(self):
         return (self.node.lineno, self.node.col_offset, self.msg, None)
+
+    def result(self) -> tuple:
+        """`(line, col, msg, key)`, as stored in result caches"""
+        return (self.node.lineno, self.node.col_offset, self.msg, self.key)
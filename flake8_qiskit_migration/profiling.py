@@ -0,0 +1,124 @@
+"""
+Opt-in profiling of where `Visitor` spends its time.
+
+Profiling instruments individual `Visitor` instances by replacing their
+methods with counting/timing wrappers, so the default (unprofiled) path
+runs exactly the same code as before and pays nothing for the feature.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+import functools
+import os
+import sys
+import time
+
+# Set to a non-empty value to profile (both the command and flake8)
+PROFILE_ENV = "FLAKE8_QISKIT_MIGRATION_PROFILE"
+
+# Visitor method → (check name, rules it consults)
+_CHECKS = {
+    "report_if_deprecated": ("paths", "RULE_SETS"),
+    "_check_methods": ("methods", "METHOD_RULE_SETS"),
+    "_check_kwargs": ("kwargs", "KWARG_RULE_SETS"),
+    "_check_method_kwargs": ("method kwargs", "METHOD_KWARG_RULE_SETS"),
+}
+
+
+def enabled() -> bool:
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+class Profile:
+    """Counters aggregated over any number of files; can be merged across processes"""
+
+    def __init__(self):
+        self.files = 0
+        self.nodes = Counter()  # node type name → nodes visited
+        self.lookups = Counter()  # rule set list → times consulted
+        self.hits = Counter()  # rule set list or error code → problems found
+        self.seconds = Counter()  # check name, or "visit" for the whole walk → time
+
+    def merge(self, other: Profile) -> None:
+        self.files += other.files
+        self.nodes.update(other.nodes)
+        self.lookups.update(other.lookups)
+        self.hits.update(other.hits)
+        self.seconds.update(other.seconds)
+
+    def instrument(self, visitor):
+        """Make `visitor` record into this profile; returns `visitor`"""
+        for method_name, (check, rule_sets) in _CHECKS.items():
+            setattr(visitor, method_name, self._timed(visitor, getattr(visitor, method_name), check, rule_sets))
+
+        make_handlers = visitor._make_handlers
+        nodes = self.nodes
+
+        class CountingHandlers(dict):
+            def get(self, node_type, default=None):
+                nodes[node_type.__name__] += 1
+                return dict.get(self, node_type, default)
+
+        visitor._make_handlers = lambda: CountingHandlers(make_handlers())
+
+        visit = visitor.visit
+
+        @functools.wraps(visit)
+        def timed_visit(tree, source=None):
+            self.files += 1
+            start = time.perf_counter()
+            try:
+                return visit(tree, source)
+            finally:
+                self.seconds["visit"] += time.perf_counter() - start
+
+        visitor.visit = timed_visit
+        return visitor
+
+    def _timed(self, visitor, method, check: str, rule_sets: str):
+        problems = visitor.problems
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            found = len(problems)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[check] += time.perf_counter() - start
+                self.lookups[rule_sets] += 1
+                for problem in problems[found:]:
+                    self.hits[rule_sets] += 1
+                    self.hits[problem.msg.split(":", 1)[0]] += 1
+
+        return wrapper
+
+    def report(self, out=None, top: int = 15) -> None:
+        out = out or sys.stderr
+        total = self.seconds["visit"]
+        print(f"flake8-qiskit-migration profile: {self.files} files, {sum(self.nodes.values())} nodes, {total:.3f}s visiting", file=out)
+
+        print("\nTime per check:", file=out)
+        in_checks = 0.0
+        for check, _ in _CHECKS.values():
+            seconds = self.seconds[check]
+            in_checks += seconds
+            print(f"  {check:<16} {seconds:9.3f}s {_percent(seconds, total):>7}", file=out)
+        traversal = max(0.0, total - in_checks)
+        print(f"  {'traversal':<16} {traversal:9.3f}s {_percent(traversal, total):>7}", file=out)
+
+        print("\nRule set lookups and hits:", file=out)
+        for _, rule_sets in _CHECKS.values():
+            print(f"  {rule_sets:<24} {self.lookups[rule_sets]:>10} lookups {self.hits[rule_sets]:>8} hits", file=out)
+        codes = sorted(code for code in self.hits if code.startswith("QKT"))
+        if codes:
+            print("  " + ", ".join(f"{code}: {self.hits[code]}" for code in codes), file=out)
+
+        print(f"\nNodes visited by type (top {top}):", file=out)
+        for name, count in [(name, count) for name, count in self.nodes.most_common() if name != "_ExitScope"][:top]:
+            print(f"  {name:<24} {count:>10}", file=out)
+
+
+def _percent(part: float, whole: float) -> str:
+    return f"{100 * part / whole:.1f}%" if whole else "-"
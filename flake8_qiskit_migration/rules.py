@@ -0,0 +1,335 @@
+"""
+Compiled lookup structures built from the rule tables.
+
+The tables in `deprecated_*.py` are written for humans; the structures here
+are built from them once so the visitor can answer "is this path deprecated?"
+or "is this call deprecated?" without scanning lists, re-splitting strings at
+every level or formatting messages.
+
+Wheels also ship these structures precompiled (see `write_index` and
+`hatch_build.py`), so a process that only lints a file or two doesn't have
+to import the tables and build them.
+"""
+
+from __future__ import annotations
+
+import functools
+import marshal
+import os
+import re
+import zlib
+
+# Marks a path that is explicitly allowed by an EXCEPTIONS list
+_EXCEPTION = object()
+
+# Precompiled index, next to this module
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.idx")
+# Bump when the layout of the index changes
+_INDEX_FORMAT = 3
+_MARSHAL_VERSION = 4
+
+# The suggested replacement in a message, e.g. "...; use `qiskit.pulse.Drag` instead"
+_REPLACEMENT = re.compile(r"(?:replace(?: `[^`]*`| import)? with|use alternative|use|moved to|migrate to)\s*`([^`]+)`")
+
+
+class PathTrie:
+    """
+    Segment trie over the dotted keys of one or more path rule sets.
+
+    Each node is a `(children, hits)` tuple, where `children` maps the next
+    path segment to a child node and `hits` is a tuple of
+    `(code, matched_key, message_template)` for every rule set whose longest
+    matching prefix at that node is deprecated (rather than an exception).
+
+    Results are pushed down the trie when it is built, so a lookup just walks
+    as far as the path goes and returns the `hits` of the deepest node it
+    reached; it never backtracks and builds no new tuples.
+    """
+
+    __slots__ = ("_root", "codes")
+
+    def __init__(self, rule_sets):
+        """
+        Args:
+            rule_sets: sequence of `(code, paths_dict, exceptions)` as in
+                `plugin.RULE_SETS`
+        """
+        self.codes = tuple(code for code, _, _ in rule_sets)
+        # Build phase: nodes are `[children, terminals]` where `terminals`
+        # maps rule set index to a template string or `_EXCEPTION`
+        root = [{}, {}]
+        for index, (code, paths_dict, exceptions) in enumerate(rule_sets):
+            for path, template in paths_dict.items():
+                terminals = self._insert(root, path)
+                if terminals is not None:
+                    terminals.setdefault(index, (code, path, template))
+            for path in exceptions:
+                terminals = self._insert(root, path)
+                if terminals is not None:
+                    # Exceptions take priority over a deprecation of the same path
+                    terminals[index] = _EXCEPTION
+        self._root = self._freeze(root, [None] * len(rule_sets))
+
+    @classmethod
+    def from_root(cls, root, codes) -> PathTrie:
+        """Wrap an already frozen root node, as stored by `write_index`"""
+        trie = cls.__new__(cls)
+        trie._root = root
+        trie.codes = tuple(codes)
+        return trie
+
+    def restricted(self, codes) -> PathTrie:
+        """Copy of this trie that only reports the rule sets in `codes`"""
+        codes = frozenset(codes)
+
+        # Nodes left without hits are kept: they stop a lookup from falling
+        # back to the hits of a shorter prefix (e.g. for an exception)
+        def restrict(node):
+            children, hits = node
+            return (
+                {segment: restrict(child) for segment, child in children.items()},
+                tuple(hit for hit in hits if hit[0] in codes),
+            )
+
+        return self.from_root(restrict(self._root), [code for code in self.codes if code in codes])
+
+    @staticmethod
+    def _insert(root, path: str):
+        segments = path.split(".")
+        if len(segments) < 2:
+            # Single-segment keys can never match; see `deprecation_messages`
+            return None
+        node = root
+        for segment in segments:
+            node = node[0].setdefault(segment, [{}, {}])
+        return node[1]
+
+    @classmethod
+    def _freeze(cls, node, inherited: list):
+        children, terminals = node
+        effective = list(inherited)
+        for index, terminal in terminals.items():
+            effective[index] = None if terminal is _EXCEPTION else terminal
+        hits = tuple(hit for hit in effective if hit is not None)
+        frozen_children = {
+            segment: cls._freeze(child, effective)
+            for segment, child in children.items()
+        }
+        return (frozen_children, hits)
+
+    def lookup(self, path: str) -> tuple[tuple[str, str, str], ...]:
+        """
+        Find the longest deprecated prefix of `path` for every rule set.
+
+        Returns:
+            Tuple of `(code, matched_key, message_template)`, in rule set
+            order (may be empty)
+        """
+        children, hits = self._root
+        for segment in path.split("."):
+            node = children.get(segment)
+            if node is None:
+                break
+            children, hits = node
+        return hits
+
+
+class CallIndex:
+    """
+    The method, kwarg and method kwarg rule sets merged into one dict, so
+    checking a call takes a lookup by method name and one by function path,
+    however many rule sets there are.
+
+    `calls` maps a method name (never dotted) or a full function path (always
+    dotted) to `(messages, kwargs)`: the messages for calling that method at
+    all, and a dict from keyword argument name to the messages for passing
+    it. Messages are complete (`"QKT101: ..."`), in rule set order.
+    """
+
+    __slots__ = ("calls", "codes", "methods", "functions")
+
+    def __init__(self, method_rule_sets, kwarg_rule_sets, method_kwarg_rule_sets):
+        """
+        Args:
+            method_rule_sets: sequence of `(code, methods_dict)` as in
+                `plugin.METHOD_RULE_SETS`
+            kwarg_rule_sets, method_kwarg_rule_sets: sequences of
+                `(code, kwargs_dict)` as in `plugin.KWARG_RULE_SETS` and
+                `plugin.METHOD_KWARG_RULE_SETS`
+        """
+        calls = {}
+        for code, methods_dict in method_rule_sets:
+            for method_name, template in methods_dict.items():
+                messages, _ = calls.setdefault(method_name, ([], {}))
+                messages.append(f"{code}: " + template.format(f".{method_name}()"))
+        for code, kwargs_dict in [*kwarg_rule_sets, *method_kwarg_rule_sets]:
+            for (key, kwarg), message in kwargs_dict.items():
+                _, kwargs = calls.setdefault(key, ([], {}))
+                kwargs.setdefault(kwarg, []).append(f"{code}: {message}")
+        codes = [code for rule_sets in (method_rule_sets, kwarg_rule_sets, method_kwarg_rule_sets) for code, _ in rule_sets]
+        self._set(
+            {
+                key: (tuple(messages), {kwarg: tuple(kwarg_messages) for kwarg, kwarg_messages in kwargs.items()})
+                for key, (messages, kwargs) in calls.items()
+            },
+            codes,
+        )
+
+    def _set(self, calls: dict, codes) -> None:
+        self.calls = calls
+        self.codes = tuple(codes)
+        # Whether any method rules, or any function kwarg rules, are left
+        self.methods = any("." not in key for key in calls)
+        self.functions = any("." in key for key in calls)
+
+    @classmethod
+    def from_calls(cls, calls: dict, codes) -> CallIndex:
+        """Wrap an already built `calls` dict, as stored by `write_index`"""
+        index = cls.__new__(cls)
+        index._set(calls, codes)
+        return index
+
+    def restricted(self, codes) -> CallIndex:
+        """Copy of this index that only reports the rule sets in `codes`"""
+        codes = frozenset(codes)
+
+        def keep(messages):
+            return tuple(msg for msg in messages if msg[:msg.index(":")] in codes)
+
+        calls = {}
+        for key, (messages, kwargs) in self.calls.items():
+            kwargs = {kwarg: keep(kwarg_messages) for kwarg, kwarg_messages in kwargs.items()}
+            kwargs = {kwarg: kwarg_messages for kwarg, kwarg_messages in kwargs.items() if kwarg_messages}
+            messages = keep(messages)
+            if messages or kwargs:
+                calls[key] = (messages, kwargs)
+        return self.from_calls(calls, [code for code in self.codes if code in codes])
+
+
+@functools.lru_cache(maxsize=None)
+def replacement_hint(msg: str) -> str | None:
+    """
+    The replacement a message suggests (a path, method or argument, as
+    written in the message), or None if it doesn't name one
+    """
+    match = _REPLACEMENT.search(msg)
+    return match.group(1) if match else None
+
+
+@functools.lru_cache(maxsize=256)
+def words_pattern(words: frozenset) -> re.Pattern:
+    """
+    Regex matching any of `words` as a whole word.
+
+    The alternatives are merged into a trie (`qasm|qc|qk` becomes
+    `q(?:asm|c|k)`), so at each position of the text the regex engine
+    follows at most one branch per character, like an Aho-Corasick automaton,
+    rather than trying every word in turn. The lookahead for the first
+    characters lets the engine skip quickly to where a word could start.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def alternatives(node) -> str:
+        branches = [re.escape(char) + alternatives(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if "" not in node:
+            return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{'|'.join(branches)})?"
+
+    if not trie:
+        # A word that never matches, so an empty set is still a valid pattern
+        return re.compile(r"(?!)")
+    first = "".join(re.escape(char) for char in sorted(trie) if char)
+    return re.compile(rf"(?=[{first}])(?<!\w){alternatives(trie)}\b")
+
+
+def rule_sets_stamp(*rule_set_lists) -> tuple:
+    """
+    Cheap identity of some lists of rule sets, used to notice when tables
+    have been extended at runtime and compiled structures need rebuilding.
+    """
+    return tuple(
+        (id(table), len(table))
+        for rule_sets in rule_set_lists
+        for rule_set in rule_sets
+        for table in rule_set[1:]
+    ) + tuple((id(rule_sets), len(rule_sets)) for rule_sets in rule_set_lists)
+
+
+def rule_sets_fingerprint(*rule_set_lists) -> str:
+    """
+    Hash of the full contents of some lists of rule sets. Unlike
+    `rule_sets_stamp` this is stable across processes, so it can be used as
+    part of a persistent cache key.
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    for rule_sets in rule_set_lists:
+        for code, *tables in rule_sets:
+            digest.update(code.encode())
+            for table in tables:
+                items = table.items() if isinstance(table, dict) else table
+                digest.update(repr(sorted(items)).encode())
+    return digest.hexdigest()
+
+
+def sources_checksum(filenames) -> int:
+    """CRC of the contents of some files; raises `OSError` if one is missing"""
+    checksum = 0
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            checksum = zlib.crc32(f.read(), checksum)
+    return checksum
+
+
+def write_index(filename: str, sources, trie: PathTrie, call_index: CallIndex, needles, fingerprint: str) -> None:
+    """
+    Save compiled rule structures for `read_index`.
+
+    Args:
+        sources: table source files; the index is ignored once they change
+        trie: `PathTrie` of the path rule sets
+        call_index: `CallIndex` of the other rule sets
+        needles: prefilter substrings
+        fingerprint: `rule_sets_fingerprint` of all the tables
+    """
+    data = {
+        "format": _INDEX_FORMAT,
+        "sources": sources_checksum(sources),
+        "trie": trie._root,
+        "path_codes": trie.codes,
+        "calls": call_index.calls,
+        "call_codes": call_index.codes,
+        "needles": tuple(needles),
+        "fingerprint": fingerprint,
+    }
+    with open(filename, "wb") as f:
+        marshal.dump(data, f, _MARSHAL_VERSION)
+
+
+def read_index(filename: str, sources) -> dict | None:
+    """
+    Load an index saved by `write_index`, with its trie as a `PathTrie` and
+    its calls as a `CallIndex`.
+
+    Returns:
+        None if there is no index, or it is unreadable, from another format
+        version, or older than the `sources` it was compiled from
+    """
+    try:
+        with open(filename, "rb") as f:
+            data = marshal.load(f)
+        if data["format"] != _INDEX_FORMAT or data["sources"] != sources_checksum(sources):
+            return None
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        return None
+    data["trie"] = PathTrie.from_root(data["trie"], data.pop("path_codes"))
+    data["calls"] = CallIndex.from_calls(data["calls"], data.pop("call_codes"))
+    return data
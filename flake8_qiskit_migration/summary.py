@@ -0,0 +1,125 @@
+"""
+Aggregate counts of findings, for `flake8-qiskit-migration --summary`.
+
+Each worker process summarizes the files it checked and the partial
+summaries are merged at the end, so no list of findings is ever built. Memory
+use depends on the number of distinct codes, rule table keys and directories,
+not on the number of files or findings: only the `top` files with the most
+findings are kept, which is exact because every file is counted by exactly
+one partial summary.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+import json
+import os
+import sys
+
+
+def key_name(key: str | tuple[str, str] | None) -> str:
+    """Readable form of a `Problem.key`, e.g. `qiskit.transpile(backend_properties=)`"""
+    if isinstance(key, tuple):
+        name, kwarg = key
+        return f"{name}({kwarg}=)"
+    return key or "?"
+
+
+class Summary:
+    """Counts of findings by code, key, directory and file; can be merged across processes"""
+
+    def __init__(self, top: int = 20):
+        self.top = top
+        self.files = 0  # files checked
+        self.errors = 0  # files skipped as unreadable or unparsable
+        self.files_with_findings = 0
+        self.codes = Counter()  # code → findings
+        self.keys = Counter()  # `key_name` → findings
+        self.directories = Counter()  # directory → findings in files directly in it
+        self.repos = Counter()  # repository → findings, if scanning repositories
+        self._top_files = []  # (path, findings), at most twice `top` long
+
+    @property
+    def findings(self) -> int:
+        return sum(self.codes.values())
+
+    def add(self, path: str, findings, repo: str | None = None) -> None:
+        """Count the findings (`engine.Finding`s) of one file, in `repo` if given"""
+        self.files += 1
+        if repo is not None:
+            # Listed even without findings
+            self.repos[repo] += len(findings)
+        if not findings:
+            return
+        self.files_with_findings += 1
+        for finding in findings:
+            self.codes[finding.msg[:finding.msg.index(":")]] += 1
+            self.keys[key_name(finding.key)] += 1
+        self.directories[os.path.dirname(path) or "."] += len(findings)
+        self._push_file(len(findings), path)
+
+    def merge(self, other: Summary) -> None:
+        self.files += other.files
+        self.errors += other.errors
+        self.files_with_findings += other.files_with_findings
+        self.codes.update(other.codes)
+        self.keys.update(other.keys)
+        self.directories.update(other.directories)
+        self.repos.update(other.repos)
+        self._top_files.extend(other._top_files)
+        self._trim_files()
+
+    def _push_file(self, count: int, path: str) -> None:
+        self._top_files.append((path, count))
+        if len(self._top_files) > 2 * self.top:
+            self._trim_files()
+
+    def _trim_files(self) -> None:
+        self._top_files = _most_common(self._top_files)[:self.top]
+
+    def top_files(self) -> list[tuple[str, int]]:
+        """`(path, findings)` of the files with the most findings, most first"""
+        self._trim_files()
+        return list(self._top_files)
+
+    def as_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "errors": self.errors,
+            "files_with_findings": self.files_with_findings,
+            "findings": self.findings,
+            "codes": dict(sorted(self.codes.items())),
+            "keys": dict(_most_common(self.keys)),
+            "directories": dict(_most_common(self.directories)),
+            "top_files": [{"path": path, "findings": count} for path, count in self.top_files()],
+            **({"repos": dict(_most_common(self.repos))} if self.repos else {}),
+        }
+
+    def report(self, out=None, as_json: bool = False) -> None:
+        out = out or sys.stdout
+        if as_json:
+            print(json.dumps(self.as_dict()), file=out)
+            return
+        skipped = f" ({self.errors} skipped)" if self.errors else ""
+        print(f"{self.findings} findings in {self.files_with_findings} of {self.files} files{skipped}", file=out)
+        sections = [
+            ("By code", sorted(self.codes.items())),
+            (f"By deprecated name (top {self.top})", _most_common(self.keys)[:self.top]),
+            (f"By repository (top {self.top})", _most_common(self.repos)[:self.top]),
+            (f"By directory (top {self.top})", _most_common(self.directories)[:self.top]),
+            (f"By file (top {self.top})", self.top_files()),
+        ]
+        for title, rows in sections:
+            if not rows:
+                continue
+            width = max(len(name) for name, _ in rows)
+            print(f"\n{title}:", file=out)
+            for name, count in rows:
+                print(f"  {name:<{width}} {count:>8}", file=out)
+
+
+def _most_common(items) -> list[tuple[str, int]]:
+    """`(name, count)` items (or a `Counter`) by count; ties in name order,
+    so reports don't depend on how the work was split up"""
+    items = items.items() if isinstance(items, Counter) else items
+    return sorted(items, key=lambda item: (-item[1], item[0]))
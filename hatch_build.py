@@ -0,0 +1,32 @@
+"""
+Build hook that precompiles the rule tables into wheels (see
+`flake8_qiskit_migration.rules`), so installed copies start up without
+importing the tables. Source checkouts and editable installs build the same
+structures at runtime instead.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from hatchling.builders.hooks.plugin.interface import BuildHookInterface
+
+_COMPILE = "import sys; from flake8_qiskit_migration.plugin import compile_rule_index; compile_rule_index(sys.argv[1])"
+
+
+class RuleIndexBuildHook(BuildHookInterface):
+    PLUGIN_NAME = "custom"
+
+    def initialize(self, version, build_data):
+        if self.target_name != "wheel" or version == "editable":
+            return
+        self._tmp = tempfile.TemporaryDirectory()
+        index = os.path.join(self._tmp.name, "rules.idx")
+        subprocess.run([sys.executable, "-c", _COMPILE, index], cwd=self.root, check=True)
+        build_data["force_include"][index] = "flake8_qiskit_migration/rules.idx"
+
+    def finalize(self, version, build_data, artifact_path):
+        tmp = getattr(self, "_tmp", None)
+        if tmp is not None:
+            tmp.cleanup()
@@ -734,3 +734,1272 @@ def test_unitary_synthesis_backend_props():
     qkt202 = {r for r in results if "QKT202" in r}
     assert len(qkt202) == 1
     assert any("backend_props" in r for r in qkt202)
+
+
+# ---- Compiled rule index ----
+
+def test_path_trie_longest_prefix_and_exceptions():
+    from flake8_qiskit_migration.rules import PathTrie
+
+    trie = PathTrie([
+        ("A", {"pkg.mod": "{} gone", "pkg.mod.Thing": "{} moved"}, ["pkg.mod.Kept"]),
+        ("B", {"pkg.mod": "{} removed"}, []),
+    ])
+    assert trie.lookup("pkg.mod.Thing.attr") == (
+        ("A", "pkg.mod.Thing", "{} moved"),
+        ("B", "pkg.mod", "{} removed"),
+    )
+    assert trie.lookup("pkg.mod.Kept.attr") == (("B", "pkg.mod", "{} removed"),)
+    assert trie.lookup("pkg.other") == ()
+    assert trie.lookup("pkg") == ()
+
+
+def test_rule_tables_extended_at_runtime():
+    from flake8_qiskit_migration import plugin
+    from flake8_qiskit_migration.deprecated_paths import DEPRECATED_PATHS
+
+    code = """
+    from qiskit.made_up import Thing
+    """
+    assert _results(code) == set()
+    assert plugin.deprecation_messages("qiskit.made_up.Thing") == []
+    DEPRECATED_PATHS["qiskit.made_up"] = "{} is made up"
+    try:
+        # Without a `Visitor` built in between
+        assert plugin.deprecation_messages("qiskit.made_up.Thing") == ["QKT100: qiskit.made_up.Thing is made up"]
+        assert _results(code) == {"2:0 QKT100: qiskit.made_up.Thing is made up"}
+    finally:
+        del DEPRECATED_PATHS["qiskit.made_up"]
+    assert plugin.deprecation_messages("qiskit.made_up.Thing") == []
+    assert _results(code) == set()
+
+
+def test_deprecation_messages_cache():
+    from flake8_qiskit_migration import plugin
+
+    plugin.set_deprecation_cache_size(2)
+    try:
+        first = plugin.deprecation_messages("qiskit.opflow.X")
+        assert plugin.deprecation_messages("qiskit.opflow.X") == first
+        info = plugin.deprecation_cache_info()
+        assert (info.hits, info.misses, info.maxsize) == (1, 1, 2)
+
+        # Evicted entries are recomputed rather than returned stale
+        plugin.deprecation_messages("numpy.linalg.norm")
+        plugin.deprecation_messages("self.backend.run")
+        assert plugin.deprecation_messages("qiskit.opflow.X") == first
+        assert plugin.deprecation_cache_info().currsize == 2
+    finally:
+        plugin.set_deprecation_cache_size(plugin.DEPRECATION_CACHE_SIZE)
+
+
+# ---- Prefilter ----
+
+def _results_with_lines(code: str):
+    code = dedent(code)
+    plugin = Plugin(ast.parse(code), code.splitlines(keepends=True))
+    return {f"{line}:{col} {msg}" for line, col, msg, _ in plugin.run()}
+
+
+def test_prefilter_skips_files_without_qiskit():
+    from flake8_qiskit_migration.plugin import may_have_problems
+
+    code = """
+    import numpy as np
+    obj.qasm()
+    """
+    assert not may_have_problems(dedent(code))
+    assert _results_with_lines(code) == set()
+
+
+def test_prefilter_keeps_files_with_qiskit():
+    code = """
+    import qiskit as qk
+    qk.extensions.thing()
+    """
+    assert _results_with_lines(code) == _results(code) != set()
+
+
+def test_prefilter_normalizes_unicode_identifiers():
+    from flake8_qiskit_migration.plugin import may_have_problems
+
+    code = "import \\uff51iskit.opflow\\n".encode().decode("unicode_escape")
+    assert may_have_problems(code)
+    assert _results_with_lines(code) == {
+        "1:0 QKT100: qiskit.opflow has been removed; see https://docs.quantum.ibm.com/api/migration-guides/qiskit-opflow-module"
+    }
+
+
+# ---- Standalone engine ----
+
+def test_engine_output_matches_flake8_format(tmp_path):
+    import io
+    from flake8_qiskit_migration import engine
+
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "b.py").write_text("import qiskit.opflow\nfrom qiskit import BasicAer\n")
+    (tmp_path / "pkg" / "a.py").write_text("import numpy\n")
+    (tmp_path / "pkg" / "notes.txt").write_text("import qiskit.opflow\n")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "c.py").write_text("import qiskit.opflow\n")
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], jobs=1, out=out) == 1
+    path = tmp_path / "pkg" / "b.py"
+    assert out.getvalue().splitlines() == [
+        f"{path}:1:1: QKT100: qiskit.opflow has been removed; see https://docs.quantum.ibm.com/api/migration-guides/qiskit-opflow-module",
+        f"{path}:2:1: QKT100: qiskit.BasicAer has been removed; either install separate `qiskit-aer` package and replace import with `qiskit_aer.Aer`, or follow https://docs.quantum.ibm.com/api/migration-guides/qiskit-1.0-features#providers.basicaer",
+    ]
+
+
+def test_engine_skips_unparsable_files(tmp_path, capsys):
+    from flake8_qiskit_migration import engine
+
+    (tmp_path / "broken.py").write_text("import qiskit.opflow\ndef (:\n")
+    assert engine.run([str(tmp_path)], jobs=1) == 0
+    assert "skipping" in capsys.readouterr().err
+
+
+def test_engine_honors_noqa_and_flake8_config(tmp_path, monkeypatch, capsys):
+    import subprocess
+    import sys
+    import pytest
+    from flake8_qiskit_migration import command, engine
+
+    (tmp_path / "setup.cfg").write_text(
+        "[flake8]\n"
+        "extend-exclude = ./build\n"
+        "per-file-ignores =\n"
+        "    tests/*: QKT101\n"
+        "    tests/test_b.py: QKT1\n"
+    )
+    code = dedent("""\
+        import qiskit.opflow  # noqa
+        from qiskit import (  # noqa: QKT1
+            BasicAer,
+            QuantumCircuit,
+        )
+        from qiskit import execute  # NOQA:QKT200,E501
+        QuantumCircuit(2).cnot(0, 1)  # noqa: QKT2
+        QuantumCircuit(2).cnot(0, 1)
+    """)
+    for path in ("a.py", "build/b.py", "tests/test_a.py", "tests/test_b.py"):
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_text(code)
+    (tmp_path / "c.py").write_text("# flake8: noqa\nimport qiskit.opflow\n")
+    monkeypatch.chdir(tmp_path)
+
+    flake8 = subprocess.run(
+        [sys.executable, "-m", "flake8", "--select", "QKT", "."], capture_output=True, text=True, check=False
+    )
+    monkeypatch.setattr(sys, "argv", ["flake8-qiskit-migration", "--no-daemon", "."])
+    with pytest.raises(SystemExit) as exit_info:
+        command.cli()
+    output = capsys.readouterr().out
+    assert exit_info.value.code == flake8.returncode == 1
+    assert sorted(output.splitlines()) == sorted(flake8.stdout.splitlines())
+    assert [line.split(": ")[0] for line in sorted(output.splitlines())] == [
+        "./a.py:6:1", "./a.py:7:1", "./a.py:8:1", "./tests/test_a.py:6:1",
+    ]
+
+    # Suppressed problems aren't fixed or counted either
+    (tmp_path / "d.py").write_text("from qiskit import Aer  # noqa\nfrom qiskit import Aer as A\n")
+    fixed, left, diff = engine.fix_file("d.py", write=False)
+    assert (fixed, left) == (1, 0)
+    assert "-from qiskit import Aer as A\n+from qiskit_aer import Aer as A\n" in diff
+    assert "+from qiskit_aer import Aer  # noqa" not in diff
+
+
+def test_engine_jsonl_and_sarif_output(tmp_path):
+    import io
+    import json
+    from flake8_qiskit_migration import engine
+
+    (tmp_path / "a.py").write_text("from qiskit import BasicAer\nqc.cnot(0, 1)\n")
+    _write_notebook(tmp_path / "nb.ipynb", [("code", "import qiskit.opflow\n")])
+    (tmp_path / "clean.py").write_text("import qiskit\n")
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], jobs=1, out=out, output_format="jsonl") == 1
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["path"], r["cell"], r["line"], r["column"], r["code"], r["key"], r["replacement"]) for r in records] == [
+        (str(tmp_path / "a.py"), None, 1, 1, "QKT100", "qiskit.BasicAer", "qiskit_aer.Aer"),
+        (str(tmp_path / "a.py"), None, 2, 1, "QKT101", "cnot", ".cx()"),
+        (str(tmp_path / "nb.ipynb"), 1, 1, 1, "QKT100", "qiskit.opflow", None),
+    ]
+    assert not records[0]["message"].startswith("QKT")
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], jobs=1, out=out, output_format="sarif", codes=frozenset({"QKT101"})) == 1
+    log = json.loads(out.getvalue())
+    run = log["runs"][0]
+    assert [rule["id"] for rule in run["tool"]["driver"]["rules"]] == ["QKT101"]
+    [result] = run["results"]
+    assert result["ruleId"] == "QKT101"
+    assert result["locations"][0]["physicalLocation"]["region"] == {"startLine": 2, "startColumn": 1}
+    assert result["properties"] == {"key": "cnot", "replacement": ".cx()"}
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path / "clean.py")], jobs=1, out=out, output_format="sarif") == 0
+    assert json.loads(out.getvalue())["runs"][0]["results"] == []
+
+
+def test_summary_counts_and_merges(tmp_path):
+    import io
+    import json
+    from flake8_qiskit_migration import engine
+    from flake8_qiskit_migration.summary import Summary
+
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("from qiskit import BasicAer\nqc.cnot(0, 1)\nqc.cnot(1, 2)\n")
+    (tmp_path / "pkg" / "b.py").write_text("import qiskit.opflow\nqiskit.transpile(c, backend_properties=p)\n")
+    (tmp_path / "c.py").write_text("import qiskit.opflow\n")
+    (tmp_path / "d.py").write_text("import qiskit\n")
+    files = engine.discover_files([str(tmp_path)])
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], out=out, output_format="jsonl", summary=True) == 1
+    counts = json.loads(out.getvalue())
+    assert counts["files"] == 4 and counts["files_with_findings"] == 3 and counts["findings"] == 6
+    assert counts["codes"] == {"QKT100": 3, "QKT101": 2, "QKT202": 1}
+    assert counts["keys"] == {"cnot": 2, "qiskit.opflow": 2, "qiskit.BasicAer": 1, "qiskit.transpile(backend_properties=)": 1}
+    assert counts["directories"] == {str(tmp_path / "pkg"): 5, str(tmp_path): 1}
+    assert counts["top_files"][0] == {"path": str(tmp_path / "pkg" / "a.py"), "findings": 3}
+
+    # Partial summaries of any split of the files merge into the same counts,
+    # also when only the top file is kept
+    whole = engine.summarize(files, top=1)
+    for split in range(len(files) + 1):
+        merged = Summary(top=1)
+        merged.merge(engine.summarize(files[:split], top=1))
+        merged.merge(engine.summarize(files[split:], top=1))
+        assert merged.as_dict() == whole.as_dict()
+    assert whole.top_files() == [(str(tmp_path / "pkg" / "a.py"), 3)]
+
+
+def test_repos_check_identical_files_once(tmp_path, monkeypatch, capsys):
+    import io
+    import json
+    import sys
+    import pytest
+    from flake8_qiskit_migration import command, engine
+
+    helper = "import qiskit.opflow\n"
+    for repo in ("one", "two"):
+        (tmp_path / repo / "vendor").mkdir(parents=True)
+        (tmp_path / repo / "vendor" / "helper.py").write_text(helper)
+        _write_notebook(tmp_path / repo / "nb.ipynb", [("code", "from qiskit import execute\n")])
+        (tmp_path / repo / "broken.py").write_text("import qiskit\ndef (:\n")
+    (tmp_path / "two" / "own.py").write_text(helper + "x = 1\n")
+    (tmp_path / "loose.py").write_text(helper)
+
+    scanned = []
+    scan = engine.scan
+    monkeypatch.setattr(engine, "scan", lambda files, *args, **kwargs: scanned.extend(files) or scan(files, *args, **kwargs))
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], out=out, repos=True) == 1
+    assert sorted(scanned) == sorted(str(tmp_path / "one" / name) for name in ("broken.py", "nb.ipynb", "vendor/helper.py")) + [
+        str(tmp_path / "two" / "own.py")
+    ]
+    lines = out.getvalue().splitlines()
+    assert [line.split(": ")[0].rsplit(":", 2)[0] for line in lines] == [
+        str(tmp_path / "one" / "nb.ipynb:1"),
+        str(tmp_path / "one" / "vendor" / "helper.py"),
+        str(tmp_path / "two" / "nb.ipynb:1"),
+        str(tmp_path / "two" / "own.py"),
+        str(tmp_path / "two" / "vendor" / "helper.py"),
+    ]
+    # Each copy of a file that can't be checked is reported under its own name
+    err = capsys.readouterr().err
+    for repo in ("one", "two"):
+        assert f"skipping {tmp_path / repo / 'broken.py'}: " in err
+
+    out = io.StringIO()
+    engine.run([str(tmp_path)], out=out, output_format="jsonl", summary=True, repos=True)
+    counts = json.loads(out.getvalue())
+    assert counts["repos"] == {str(tmp_path / "two"): 3, str(tmp_path / "one"): 2}
+    assert counts["errors"] == 2 and counts["files"] == 5
+
+    for path in (tmp_path / "loose.py", tmp_path / "missing"):
+        monkeypatch.setattr(sys, "argv", ["flake8-qiskit-migration", "--repos", str(path)])
+        with pytest.raises(SystemExit) as exit_info:
+            command.cli()
+        assert exit_info.value.code == 2
+        assert "is not a directory" in capsys.readouterr().err
+
+
+def test_archives_scanned_without_extracting(tmp_path):
+    import io
+    import tarfile
+    import zipfile
+    import pytest
+    from flake8_qiskit_migration import archives, engine
+
+    _write_notebook(tmp_path / "nb.ipynb", [("code", "import qiskit.opflow\n")])
+    members = {"pkg/a.py": b"from qiskit import BasicAer\n", "pkg/b.txt": b"import qiskit.opflow\n", "pkg/nb.ipynb": (tmp_path / "nb.ipynb").read_bytes()}
+    with zipfile.ZipFile(tmp_path / "pkg-1.0-py3-none-any.whl", "w") as whl:
+        for name, data in members.items():
+            whl.writestr(name, data)
+    with tarfile.open(tmp_path / "pkg-1.0.tar.gz", "w:gz") as sdist:
+        for name, data in members.items():
+            info = tarfile.TarInfo(f"pkg-1.0/{name}")
+            info.size = len(data)
+            sdist.addfile(info, io.BytesIO(data))
+    (tmp_path / "broken.zip").write_text("not a zip file")
+    whl, sdist = str(tmp_path / "pkg-1.0-py3-none-any.whl"), str(tmp_path / "pkg-1.0.tar.gz")
+
+    assert engine.discover_files([whl, sdist]) == [
+        f"{whl}!pkg/a.py", f"{whl}!pkg/nb.ipynb", f"{sdist}!pkg-1.0/pkg/a.py", f"{sdist}!pkg-1.0/pkg/nb.ipynb",
+    ]
+    out = io.StringIO()
+    assert engine.run([whl, sdist, str(tmp_path / "broken.zip")], out=out) == 1
+    assert [line.split(": ")[0] for line in out.getvalue().splitlines()] == [
+        f"{whl}!pkg/a.py:1:1", f"{whl}!pkg/nb.ipynb:1:1:1", f"{sdist}!pkg-1.0/pkg/a.py:1:1", f"{sdist}!pkg-1.0/pkg/nb.ipynb:1:1:1",
+    ]
+    assert archives._open_archive is None
+    with pytest.raises(engine.ScanError, match="broken.zip"):
+        engine.check_file(str(tmp_path / "broken.zip"))
+    with pytest.raises(engine.ScanError, match="no member"):
+        engine.check_file(f"{whl}!pkg/missing.py")
+    archives.close()
+
+    # Tar members are listed in the order they are stored and read without indexing the whole archive
+    with tarfile.open(tmp_path / "late.tar.gz", "w:gz") as sdist:
+        for name in ("pkg/z.py", "pkg/a.py", "pkg/m.py"):
+            info = tarfile.TarInfo(name)
+            info.size = len(members["pkg/a.py"])
+            sdist.addfile(info, io.BytesIO(members["pkg/a.py"]))
+    late = str(tmp_path / "late.tar.gz")
+    assert engine.discover_files([late, str(tmp_path / "nb.ipynb")]) == [
+        f"{late}!pkg/z.py", f"{late}!pkg/a.py", f"{late}!pkg/m.py", str(tmp_path / "nb.ipynb"),
+    ]
+    with archives.open_source(f"{late}!pkg/z.py") as f:
+        assert f.read() == members["pkg/a.py"]
+    assert list(archives._open_archive[2]) == ["pkg/z.py"]
+    with archives.open_source(f"{late}!pkg/m.py") as f:
+        assert f.read() == members["pkg/a.py"]
+    with archives.open_source(f"{late}!pkg/a.py") as f:
+        assert f.read() == members["pkg/a.py"]
+    archives.close()
+
+
+# ---- Persistent result cache ----
+
+def test_result_cache_round_trip_and_eviction(tmp_path):
+    from flake8_qiskit_migration.cache import ResultCache, source_key
+
+    cache = ResultCache(str(tmp_path))
+    key = source_key("import qiskit.opflow\n", "fingerprint")
+    assert key == source_key("import qiskit.opflow\r\n", "fingerprint")
+    assert key != source_key("import qiskit.opflow\n", "other-fingerprint")
+    assert cache.get(key) is None
+    cache.put(key, [(1, 0, "QKT100: message")])
+    assert cache.get(key) == [(1, 0, "QKT100: message")]
+
+    for i in range(10):
+        cache.put(source_key(str(i), "fingerprint"), [])
+    assert cache.evict(max_size=0) == 11
+    assert cache.total_size() == 0
+    cache.close()
+
+
+def test_result_cache_skips_parsing_on_hit(tmp_path, monkeypatch):
+    from flake8_qiskit_migration import engine
+    from flake8_qiskit_migration.cache import ResultCache
+
+    cache = ResultCache(str(tmp_path))
+    results = engine.check_source(b"import qiskit.opflow\n", cache=cache)
+    assert len(results) == 1
+    # Plugin.run shares entries with the engine
+    plugin = Plugin(ast.parse("import numpy\n"), ["import qiskit.opflow\n"])
+    monkeypatch.setattr(Plugin, "cache_dir", str(tmp_path))
+    assert [r[:3] for r in plugin.run()] == [r[:3] for r in results]
+    cache.close()
+
+
+def test_result_cache_prune(tmp_path):
+    import time
+    from flake8_qiskit_migration.cache import ResultCache
+
+    cache = ResultCache(str(tmp_path))
+    cache.put("old", [])
+    cache._conn.execute("UPDATE results SET last_used = ?", (time.time() - 10 * 86400,))
+    cache.put("new", [])
+    assert cache.prune(max_age=86400) == 1
+    assert cache.get("old") is None
+    assert cache.get("new") == []
+    cache.close()
+
+
+def test_broken_result_cache_is_skipped(tmp_path, monkeypatch, capsys):
+    import io
+    from flake8_qiskit_migration import engine
+    from flake8_qiskit_migration.cache import ResultCache
+
+    (tmp_path / "a.py").write_text("import qiskit.opflow\n")
+    corrupt = tmp_path / "corrupt"
+    corrupt.mkdir()
+    (corrupt / ResultCache.filename).write_bytes(b"not a database" * 100)
+    assert ResultCache.open(str(corrupt)) is None
+    assert "not using cache" in capsys.readouterr().err
+
+    out = io.StringIO()
+    assert engine.run([str(tmp_path / "a.py")], jobs=2, cache_dir=str(corrupt), out=out) == 1
+    assert "QKT100" in out.getvalue()
+    assert capsys.readouterr().err.count("not using cache") == 1
+    monkeypatch.setattr(Plugin, "cache_dir", str(corrupt))
+    monkeypatch.setattr(Plugin, "_cache_owner", None)
+    assert len(list(Plugin(ast.parse("import qiskit.opflow\n"), ["import qiskit.opflow\n"]).run())) == 1
+
+    # Failing after it was opened, it warns once and is left alone
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache._conn.execute("DROP TABLE results")
+    capsys.readouterr()
+    assert cache.get("key") is None
+    cache.put("key", [])
+    assert cache.get("key") is None
+    assert capsys.readouterr().err.count("not using cache") == 1
+    cache.close()
+
+
+# ---- Git diff mode ----
+
+def test_parse_unified_diff():
+    from flake8_qiskit_migration.git import in_ranges, parse_unified_diff
+
+    diff = dedent("""\
+    diff --git a/a.py b/a.py
+    --- a/a.py
+    +++ b/a.py
+    @@ -1,0 +2,3 @@
+    @@ -10 +13 @@ def f():
+    @@ -20,2 +22,0 @@
+    diff --git a/gone.py b/gone.py
+    --- a/gone.py
+    +++ /dev/null
+    @@ -1 +0,0 @@
+    diff --git a/my dir/a b.py b/my dir/a b.py
+    --- a/my dir/a b.py\t
+    +++ b/my dir/a b.py\t
+    @@ -1 +1 @@
+    diff --git "a/q\\"\\303\\251.py" "b/q\\"\\303\\251.py"
+    --- "a/q\\"\\303\\251.py"
+    +++ "b/q\\"\\303\\251.py"
+    @@ -1 +1 @@
+    diff --git a/plus.py b/plus.py
+    --- a/plus.py
+    +++ b/plus.py
+    @@ -1,2 +1,2 @@
+    --- a/x
+    -old
+    +++ b/x
+    +new
+    @@ -7,0 +8 @@
+    +qk.opflow.Y
+    \\ No newline at end of file
+    diff --git a/gone2.py b/gone2.py
+    --- a/gone2.py
+    +++ /dev/null
+    @@ -1 +0,0 @@
+    -+++ b/y
+    """)
+    changed = parse_unified_diff(diff)
+    assert changed == {
+        "a.py": [(2, 4), (13, 13)], "my dir/a b.py": [(1, 1)], 'q"\u00e9.py': [(1, 1)], "plus.py": [(1, 2), (8, 8)],
+    }
+    assert [line for line in range(1, 16) if in_ranges(line, changed["a.py"])] == [2, 3, 4, 13]
+
+
+def test_diff_base_reports_only_changed_lines(tmp_path, monkeypatch):
+    import io
+    import subprocess
+    from flake8_qiskit_migration import engine
+
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+            cwd=tmp_path, check=True, capture_output=True,
+        )
+
+    git("init", "-q")
+    (tmp_path / "old.py").write_text("import qiskit.opflow\n")
+    (tmp_path / "edited.py").write_text("import qiskit as qk\nqk.opflow.X\n")
+    (tmp_path / "my dir").mkdir()
+    (tmp_path / "my dir" / 'a "b".py').write_text("import qiskit\n")
+    git("add", ".")
+    git("commit", "-q", "-m", "base")
+    git("tag", "base")
+    # The alias defined on an unchanged line must still resolve
+    (tmp_path / "edited.py").write_text("import qiskit as qk\nqk.opflow.X\nqk.execute()\n")
+    (tmp_path / "new.py").write_text("from qiskit import BasicAer\n")
+    (tmp_path / "my dir" / 'a "b".py').write_text("import qiskit\nqiskit.execute()\n")
+    (tmp_path / ".tox").mkdir()
+    (tmp_path / ".tox" / "x.py").write_text("import qiskit.opflow\n")
+
+    monkeypatch.chdir(tmp_path)
+    out = io.StringIO()
+    assert engine.run(["."], out=out, diff_base="base") == 1
+    assert [line.split(": ")[0] for line in out.getvalue().splitlines()] == [
+        "edited.py:3:1",
+        'my dir/a "b".py:2:1',
+        "new.py:1:1",
+    ]
+
+
+
+def test_rev_reads_files_from_git_objects(tmp_path, monkeypatch):
+    import io
+    import subprocess
+    from flake8_qiskit_migration import engine
+
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+            cwd=tmp_path, check=True, capture_output=True,
+        )
+
+    git("init", "-q")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("import qiskit.opflow\n")
+    _write_notebook(tmp_path / "src" / "nb.ipynb", [("code", "from qiskit import BasicAer\n")])
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "b.py").write_text("import qiskit.opflow\n")
+    git("add", ".")
+    git("commit", "-q", "-m", "release")
+    git("tag", "v1.0")
+    # Only the tagged contents are checked
+    (tmp_path / "src" / "a.py").write_text("import numpy\n")
+    (tmp_path / "src" / "nb.ipynb").unlink()
+    (tmp_path / "src" / "c.py").write_text("import qiskit.opflow\n")
+
+    monkeypatch.chdir(tmp_path)
+    out = io.StringIO()
+    assert engine.run(["."], out=out, rev="v1.0", exclude=[*engine.DEFAULT_EXCLUDE, "build"]) == 1
+    assert [line.split(": ")[0] for line in out.getvalue().splitlines()] == ["src/a.py:1:1", "src/nb.ipynb:1:1:1"]
+
+    monkeypatch.chdir(tmp_path / "src")
+    out = io.StringIO()
+    assert engine.run(["a.py"], out=out, rev="v1.0", summary=True, output_format="jsonl") == 1
+    assert '"files": 1' in out.getvalue()
+
+
+def test_fix_rewrites_mechanical_problems(tmp_path, monkeypatch, capsys):
+    import io
+    from flake8_qiskit_migration import engine
+
+    code = dedent("""\
+        from qiskit import QuantumCircuit, Aer, execute
+        import qiskit.providers.aer as qaer
+        from qiskit.algorithms import VQE  # keeps this comment
+        from qiskit import (
+            transpile,
+            BasicAer,
+        )
+        import qiskit.algorithms as alg; from qiskit.providers import aer
+
+        qc = QuantumCircuit(2)
+        qc.cnot(0, 1).toffoli(0, 1, 2)
+        qc.qasm()
+        qaer.AerSimulator(); alg.VQE
+    """)
+    fixed = dedent("""\
+        from qiskit import QuantumCircuit, execute
+        from qiskit_aer import Aer
+        import qiskit_aer as qaer
+        from qiskit_algorithms import VQE  # keeps this comment
+        from qiskit import (
+            transpile,
+            BasicAer,
+        )
+        import qiskit_algorithms as alg; import qiskit_aer as aer
+
+        qc = QuantumCircuit(2)
+        qc.cx(0, 1).ccx(0, 1, 2)
+        qc.qasm()
+        qaer.AerSimulator(); alg.VQE
+    """)
+    (tmp_path / "a.py").write_bytes(code.replace("\n", "\r\n").encode())
+    monkeypatch.chdir(tmp_path)
+
+    out = io.StringIO()
+    assert engine.run(["."], out=out, fix=True, show_diff=True) == 1
+    assert "-qc.cnot(0, 1).toffoli(0, 1, 2)\r\n+qc.cx(0, 1).ccx(0, 1, 2)\r\n" in out.getvalue()
+    assert (tmp_path / "a.py").read_bytes() == code.replace("\n", "\r\n").encode()
+    assert "Would fix 9 problems in 1 files; 3 left to fix by hand" in capsys.readouterr().err
+
+    out = io.StringIO()
+    assert engine.run(["."], out=out, fix=True) == 1
+    assert out.getvalue() == ""
+    assert (tmp_path / "a.py").read_bytes() == fixed.replace("\n", "\r\n").encode()
+    assert "Fixed 9 problems in 1 files; 3 left to fix by hand" in capsys.readouterr().err
+    assert [path.name for path in tmp_path.iterdir()] == ["a.py"]
+
+    # Only what all selected rules agree on, and don't report again
+    (tmp_path / "b.py").write_text(
+        "from qiskit.providers.fake_provider.fake_backend_v2 import FakeBackendV2\n"
+        "import qiskit\n"
+        "qiskit.providers.fake_provider.fake_backend_v2.FakeBackendV2()\n"
+    )
+    assert engine.fix_file("b.py") == (0, 4, None)
+    fixed, left, diff = engine.fix_file("b.py", codes=frozenset({"QKT100"}), write=False)
+    assert (fixed, left) == (1, 1)
+    assert "+from qiskit.providers.fake_provider import GenericBackendV2 as FakeBackendV2\n" in diff
+
+    # Symlinks are kept, and the file they point to is fixed
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "real.py").write_text("import qiskit\nqiskit.QuantumCircuit(2).cnot(0, 1)\n")
+    (tmp_path / "pkg" / "link.py").symlink_to("../real.py")
+    assert engine.fix_file("pkg/link.py") == (1, 0, None)
+    assert (tmp_path / "pkg" / "link.py").is_symlink()
+    assert (tmp_path / "real.py").read_text() == "import qiskit\nqiskit.QuantumCircuit(2).cx(0, 1)\n"
+
+# ---- Jupyter notebooks ----
+
+def _write_notebook(path, cells):
+    import json
+
+    path.write_text(json.dumps({
+        "cells": [
+            {
+                "cell_type": cell_type,
+                "execution_count": None,
+                "metadata": {"tags": ['a\\"b']},
+                "outputs": [{"data": {"image/png": "iVBOR" * 50}, "output_type": "display_data"}],
+                "source": source.splitlines(keepends=True),
+            }
+            for cell_type, source in cells
+        ],
+        "metadata": {"kernelspec": {"name": "python3"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }, indent=1))
+
+
+def test_read_code_cells_streaming(tmp_path, monkeypatch):
+    from flake8_qiskit_migration import notebook
+
+    # Tiny chunks exercise tokens split across reads
+    monkeypatch.setattr(notebook, "_CHUNK_SIZE", 7)
+    path = tmp_path / "nb.ipynb"
+    _write_notebook(path, [
+        ("markdown", '# Title with \\"quotes\\"\n'),
+        ("code", "import qiskit as qk\nprint('\\u00e9')\n"),
+        ("code", ""),
+    ])
+    with open(path, encoding="utf-8") as f:
+        assert list(notebook.read_code_cells(f)) == [
+            (2, "import qiskit as qk\nprint('\\u00e9')\n"),
+            (3, ""),
+        ]
+
+
+def test_strip_magics():
+    from flake8_qiskit_migration.notebook import strip_magics
+
+    source = "%matplotlib inline\n!pip install qiskit\nfiles = !ls\nqc?\nif x:\n    %time f()\ny = a % b\n"
+    assert strip_magics(source) == "pass\npass\npass\npass\nif x:\n    pass\ny = a % b\n"
+    assert strip_magics("%%bash\necho hi\n") == ""
+    # Only at the start of a logical line
+    source = "msg = ('%s'\n       % name)\ns = '''\n%x\n'''\ny = 10 \\\n    % 3\n%time f()\n"
+    assert strip_magics(source) == source.replace("%time f()", "pass")
+
+
+def test_notebook_findings(tmp_path):
+    import io
+    from flake8_qiskit_migration import engine
+
+    path = tmp_path / "nb.ipynb"
+    _write_notebook(path, [
+        ("code", "%pip install qiskit\nimport qiskit as qk\n"),
+        ("markdown", "qk.opflow"),
+        ("code", "def broken(:\n"),
+        ("code", "x = 1\nqk.opflow.X\nawait thing()\n"),
+    ])
+    out = io.StringIO()
+    assert engine.run([str(tmp_path)], out=out) == 1
+    assert out.getvalue() == f"{path}:4:2:1: QKT100: qiskit.opflow.X has been removed; see https://docs.quantum.ibm.com/api/migration-guides/qiskit-opflow-module\n"
+
+
+def test_notebook_cells_cached_separately(tmp_path, monkeypatch):
+    from flake8_qiskit_migration import engine
+    from flake8_qiskit_migration.cache import ResultCache
+
+    cache = ResultCache(str(tmp_path / "cache"))
+    path = tmp_path / "nb.ipynb"
+    _write_notebook(path, [("code", "import qiskit as qk\n"), ("code", "qk.opflow.X\n")])
+    first = engine.check_notebook(str(path), cache)
+    assert [finding.cell for finding in first] == [2]
+
+    visited = []
+    original_visit = engine.Visitor.visit
+    monkeypatch.setattr(engine.Visitor, "visit", lambda self, tree, source=None: visited.append(tree) or original_visit(self, tree, source))
+    assert engine.check_notebook(str(path), cache) == first
+    assert visited == []
+
+    # Editing the first cell changes the aliases, so both cells are revisited
+    _write_notebook(path, [("code", "import qiskit.circuit as qk\n"), ("code", "qk.opflow.X\n")])
+    assert engine.check_notebook(str(path), cache) == []
+    assert sum(isinstance(tree, ast.Module) for tree in visited) == 2
+    cache.close()
+
+
+# ---- AST walker ----
+
+def test_deeply_nested_code_does_not_hit_recursion_limit():
+    code = "import qiskit.opflow\nx = " + " + ".join(["1"] * 1500) + " + qiskit.execute\n"
+    assert _results(code) == {
+        "1:0 QKT100: qiskit.opflow has been removed; see https://docs.quantum.ibm.com/api/migration-guides/qiskit-opflow-module",
+        "2:6004 QKT100: qiskit.execute has been removed; explicitly transpile and run the circuit instead (see https://docs.quantum.ibm.com/api/migration-guides/qiskit-1.0-features#execute)",
+    }
+
+
+def test_scope_covers_decorators_and_nested_classes():
+    code = """
+    import qiskit as qk
+
+    class A:
+        import numpy as qk
+
+        class B:
+            x = qk.opflow.X  # numpy
+
+        @qk.extensions.thing  # numpy
+        def f(self):
+            return qk.opflow.X  # numpy
+
+    qk.opflow.Y
+    """
+    assert _results(code) == {
+        "14:0 QKT100: qiskit.opflow.Y has been removed; see https://docs.quantum.ibm.com/api/migration-guides/qiskit-opflow-module",
+    }
+
+
+def test_long_attribute_chains():
+    chain = ".".join(f"a{i}" for i in range(800))
+    code = f"""
+    import qiskit as qk
+    qk.opflow.{chain}
+    qk.circuit.{chain}.qk.opflow
+    qk.circuit.QuantumCircuit(2).cnot(0, 1).x.opflow.y
+    """
+    results = _results(code)
+    assert len(results) == 2
+    assert any(r.startswith("3:0 QKT100: qiskit.opflow.a0.a1.") for r in results)
+    assert any(r.startswith("5:0 QKT101: QuantumCircuit.cnot()") for r in results)
+
+
+
+def test_aliases_resolve_through_enclosing_scopes():
+    from flake8_qiskit_migration.plugin import Visitor
+
+    code = """
+    import qiskit as qk
+    from qiskit import transpile as run
+
+    def f():
+        import qk as q  # q → qk → qiskit
+        import numpy as qk
+        import qk as np  # the enclosing qk: np → qiskit
+        q.opflow.X
+        np.opflow.Y
+        qk.opflow.Z  # numpy
+
+        def g():
+            from qiskit import transpile as run
+            run(backend_properties=None)
+
+    qk.opflow.W
+    run(backend_properties=None)
+    """
+    results = sorted(int(result.split(":")[0]) for result in _results(code))
+    assert results == [9, 10, 15, 17, 18]
+
+    v = Visitor()
+    v.visit(ast.parse(dedent(code)))
+    assert v.module_state() == [{"qk": "qiskit", "run": "transpile"}, {"run": "qiskit.transpile"}, True]
+
+
+def test_visit_skips_statements_without_problems():
+    from flake8_qiskit_migration.plugin import Visitor
+
+    code = """
+    import numpy as np
+    data = np.arange(10)
+    total = data.sum()
+    if np.any(data):
+        import qiskit as qk
+    qk.opflow.X
+    print(total)
+
+    @qk.extensions.thing
+    def f():
+        return 1
+
+    ｑｋ.opflow.Y
+    x = (1,
+         qk.execute)
+    """
+    code = dedent(code)
+    tree = ast.parse(code)
+    expected = Visitor()
+    expected.visit(tree)
+    for source in (code, code.replace("\n", "\r\n")):
+        v = Visitor()
+        v.visit(tree, source)
+        assert v.skipped_statements == 3
+        assert [p.result() for p in v.problems] == [p.result() for p in expected.problems]
+        assert [p.result()[0] for p in v.problems] == [7, 10, 14, 16]
+        assert v.module_state() == expected.module_state()
+
+    assert _results_with_lines(code) == _results(code)
+
+# ---- Profiling ----
+
+def test_profile_counts_nodes_lookups_and_hits():
+    from flake8_qiskit_migration.plugin import Visitor
+    from flake8_qiskit_migration.profiling import Profile
+
+    profile = Profile()
+    v = profile.instrument(Visitor())
+    v.visit(ast.parse("import qiskit.opflow\nfrom qiskit import QuantumCircuit\nQuantumCircuit(2).cnot(0, 1)\n"))
+    assert len(v.problems) == 2
+    assert profile.files == 1
+    assert profile.nodes["Call"] == 2
+    assert profile.lookups["RULE_SETS"] == 2
+    assert profile.lookups["METHOD_RULE_SETS"] == 1
+    assert profile.hits["RULE_SETS"] == 1
+    assert profile.hits["METHOD_RULE_SETS"] == 1
+    assert profile.hits["QKT100"] == profile.hits["QKT101"] == 1
+
+    # Other visitors are unaffected
+    assert "report_if_deprecated" not in vars(Visitor())
+
+
+def test_engine_profile_report(tmp_path, capsys):
+    import io
+    from flake8_qiskit_migration import engine
+
+    (tmp_path / "a.py").write_text("import qiskit.opflow\n")
+    assert engine.run([str(tmp_path)], jobs=1, out=io.StringIO(), profile=True) == 1
+    err = capsys.readouterr().err
+    assert err.startswith("flake8-qiskit-migration profile: 1 files")
+    assert "QKT100: 1" in err
+
+    assert engine.run([str(tmp_path)], jobs=1, out=io.StringIO()) == 1
+    assert capsys.readouterr().err == ""
+
+
+# ---- Precompiled rule index ----
+
+def test_precompiled_rule_index(tmp_path, monkeypatch):
+    from flake8_qiskit_migration import plugin
+
+    index = str(tmp_path / "rules.idx")
+    plugin.compile_rule_index(index)
+    code = """
+    from qiskit import QuantumCircuit, transpile
+    import qiskit.opflow
+    transpile(QuantumCircuit(1).cnot(0, 1), backend_properties=None)
+    """
+    expected = _results(code)
+    fingerprint = plugin.rules_fingerprint()
+
+    # Restore the live structures afterwards
+    for name in ("_path_trie", "_rules_stamp", "_call_index", "_prefilter_needles", "_rules_digest"):
+        monkeypatch.setattr(plugin, name, getattr(plugin, name))
+    monkeypatch.setattr(plugin, "INDEX_FILE", index)
+    monkeypatch.setattr(plugin, "_tables_loaded", lambda: False)
+    monkeypatch.setattr(plugin, "_rules_stamp", None)
+    plugin.refresh_rule_index()
+    assert plugin._rules_stamp == plugin._PRECOMPILED
+    assert _results(code) == expected
+    assert plugin.rules_fingerprint() == fingerprint
+
+    # Importing the tables switches back to them, so changes are picked up
+    monkeypatch.setattr(plugin, "_tables_loaded", lambda: True)
+    plugin.refresh_rule_index()
+    assert plugin._rules_stamp != plugin._PRECOMPILED
+    plugin._cached_messages.cache_clear()
+
+
+def test_precompiled_rule_index_ignored_when_stale(tmp_path):
+    from flake8_qiskit_migration import plugin
+    from flake8_qiskit_migration.rules import read_index
+
+    index = str(tmp_path / "rules.idx")
+    plugin.compile_rule_index(index)
+    assert read_index(index, plugin._TABLE_SOURCES) is not None
+
+    source = tmp_path / "deprecated_paths.py"
+    source.write_text("DEPRECATED_PATHS = {}\n")
+    assert read_index(index, [str(source)]) is None
+    assert read_index(str(tmp_path / "missing.idx"), plugin._TABLE_SOURCES) is None
+    (tmp_path / "corrupt.idx").write_bytes(b"\x00garbage")
+    assert read_index(str(tmp_path / "corrupt.idx"), plugin._TABLE_SOURCES) is None
+
+
+
+def test_call_index_merges_rule_sets():
+    from flake8_qiskit_migration.rules import CallIndex
+
+    index = CallIndex(
+        [("QKT101", {"cnot": "{} is gone"}), ("QKT201", {"cnot": "{} is really gone", "qasm": "{} too"})],
+        [("QKT202", {("qiskit.transpile", "inst_map"): "No inst_map"})],
+        [("QKT102", {("cnot", "ctrl"): "No ctrl"})],
+    )
+    assert index.calls == {
+        "cnot": (("QKT101: .cnot() is gone", "QKT201: .cnot() is really gone"), {"ctrl": ("QKT102: No ctrl",)}),
+        "qasm": (("QKT201: .qasm() too",), {}),
+        "qiskit.transpile": ((), {"inst_map": ("QKT202: No inst_map",)}),
+    }
+    assert index.methods and index.functions
+
+    restricted = index.restricted({"QKT201", "QKT102"})
+    assert restricted.calls == {
+        "cnot": (("QKT201: .cnot() is really gone",), {"ctrl": ("QKT102: No ctrl",)}),
+        "qasm": (("QKT201: .qasm() too",), {}),
+    }
+    assert restricted.codes == ("QKT201", "QKT102")
+    assert restricted.methods and not restricted.functions
+
+def test_plugin_version_is_looked_up_lazily():
+    import importlib.metadata
+    from flake8_qiskit_migration.plugin import Plugin
+
+    assert Plugin.version == importlib.metadata.version("flake8_qiskit_migration")
+    assert Plugin(ast.parse("")).version == Plugin.version
+
+
+# ---- Rule selection ----
+
+def test_select_codes():
+    from flake8_qiskit_migration.plugin import select_codes
+
+    assert select_codes() is None
+    assert select_codes(["QKT"]) is None
+    assert select_codes(["QKT1"]) == {"QKT100", "QKT101", "QKT102"}
+    assert select_codes(None, ["QKT1"]) == {"QKT200", "QKT201", "QKT202"}
+    # Longest matching prefix wins
+    assert select_codes(["QKT"], ["QKT1"]) == {"QKT200", "QKT201", "QKT202"}
+    assert select_codes(["QKT10"], ["QKT1"]) == {"QKT100", "QKT101", "QKT102"}
+    assert select_codes(["E"]) == frozenset()
+
+
+def test_visitor_only_runs_selected_checks(monkeypatch):
+    from flake8_qiskit_migration.plugin import Visitor
+
+    code = dedent("""
+    from qiskit import QuantumCircuit, transpile
+    from qiskit.providers.fake_provider import GenericBackendV2
+    import qiskit.opflow
+    qc = QuantumCircuit(2).cnot(0, 1)
+    transpile(qc, backend_properties=None)
+    """)
+
+    def results(codes):
+        v = Visitor(codes)
+        v.visit(ast.parse(code))
+        return sorted(problem.msg[:6] for problem in v.problems)
+
+    assert results(None) == ["QKT100", "QKT101", "QKT202"]
+    # Exceptions still apply when only some rule sets are selected
+    assert results(frozenset({"QKT100"})) == ["QKT100"]
+    assert results(frozenset({"QKT202"})) == ["QKT202"]
+
+    def fail(*args):
+        raise AssertionError("unselected check ran")
+
+    monkeypatch.setattr(Visitor, "_check_methods", fail)
+    monkeypatch.setattr(Visitor, "_check_method_kwargs", fail)
+    assert results(frozenset({"QKT100", "QKT200", "QKT202"})) == ["QKT100", "QKT202"]
+
+
+def test_flake8_selection_reaches_plugin(monkeypatch):
+    from flake8.options.parse_args import parse_args
+
+    monkeypatch.setattr(Plugin, "codes", None)
+    monkeypatch.setattr(Plugin, "cache_dir", None)
+    parse_args(["--select", "QKT2", "--extend-ignore", "QKT202"])
+    assert Plugin.codes == {"QKT200", "QKT201"}
+    assert _results("import qiskit.opflow\n") == set()
+
+    parse_args(["--select", "E,QKT"])
+    assert Plugin.codes is None
+
+
+def test_selection_is_part_of_cache_key(tmp_path):
+    import io
+    from flake8_qiskit_migration import engine
+    from flake8_qiskit_migration.plugin import rules_fingerprint
+
+    assert rules_fingerprint(frozenset({"QKT100"})) != rules_fingerprint()
+    (tmp_path / "a.py").write_text("import qiskit.opflow\nfrom qiskit import QuantumCircuit\nQuantumCircuit(1).cnot(0, 1)\n")
+    cache_dir = str(tmp_path / "cache")
+    for codes, expected in [(frozenset({"QKT101"}), ["QKT101"]), (None, ["QKT100", "QKT101"])]:
+        out = io.StringIO()
+        engine.run([str(tmp_path / "a.py")], jobs=1, out=out, cache_dir=cache_dir, codes=codes)
+        assert [line.split(": ")[1] for line in out.getvalue().splitlines()] == expected
+
+
+# ---- Daemon ----
+
+def _start_daemon(socket_path, **kwargs):
+    import threading
+    from flake8_qiskit_migration import daemon
+
+    started = threading.Event()
+    servers = []
+
+    def ready(server):
+        servers.append(server)
+        started.set()
+
+    thread = threading.Thread(target=daemon.serve, args=(socket_path,), kwargs=dict(kwargs, ready=ready), daemon=True)
+    thread.start()
+    assert started.wait(10)
+    return servers[0], thread
+
+
+def test_daemon_serves_files_sources_and_scans(tmp_path, monkeypatch, capsys):
+    import io
+    import pytest
+    from flake8_qiskit_migration import daemon, engine
+    from flake8_qiskit_migration.config import normalize_pattern
+    from flake8_qiskit_migration.plugin import select_codes
+
+    socket_path = str(tmp_path / "d.sock")
+    with pytest.raises(daemon.DaemonNotRunning):
+        daemon.request({"files": []}, socket_path)
+
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("import qiskit.opflow\nfrom qiskit import QuantumCircuit\nQuantumCircuit(1).cnot(0, 1)\n")
+    (tmp_path / "pkg" / "b.py").write_text("import numpy\n")
+    server, thread = _start_daemon(socket_path)
+    try:
+        response = daemon.request(
+            {"files": [str(tmp_path / "pkg" / "a.py"), str(tmp_path / "missing.py")], "sources": [["x.py", "import qiskit.opflow\n"]]},
+            socket_path,
+        )
+        findings, error = response["files"][0]
+        assert error is None
+        assert [finding[2][:6] for finding in findings] == ["QKT100", "QKT101"]
+        assert response["files"][1][0] is None
+        assert response["sources"] == [[[[1, 0, engine.check_source("import qiskit.opflow\n")[0].msg, None, "qiskit.opflow"]], None]]
+
+        # Same output as checking in-process, with paths as the client gave them
+        monkeypatch.chdir(tmp_path)
+        for select in (None, ["QKT101"], ["QKT2"]):
+            expected = io.StringIO()
+            exit_code = engine.run(["pkg"], out=expected, codes=select_codes(select))
+            out = io.StringIO()
+            assert daemon.scan(["pkg"], select=select, out=out, socket_path=socket_path) == exit_code
+            assert out.getvalue() == expected.getvalue()
+
+        # Path-like excludes are relative to the client's directory
+        (tmp_path / "pkg" / "build").mkdir()
+        (tmp_path / "pkg" / "build" / "x.py").write_text("import qiskit.opflow\n")
+        expected = io.StringIO()
+        engine.run(["pkg"], out=expected, exclude=[normalize_pattern("./pkg/build")])
+        out = io.StringIO()
+        daemon.scan(["pkg"], ["./pkg/build"], out=out, socket_path=socket_path)
+        assert out.getvalue() == expected.getvalue()
+        assert "build" not in out.getvalue()
+
+        # Scans the command would check faster itself are declined
+        for i in range(40):
+            (tmp_path / "pkg" / f"c{i}.py").write_text("import numpy\n")
+        with pytest.raises(daemon.DaemonDeclined):
+            daemon.scan(["pkg"], jobs=4, socket_path=socket_path)
+        with pytest.raises(daemon.DaemonDeclined):
+            daemon.scan(["pkg"], cache_dir=str(tmp_path / "cache"), socket_path=socket_path)
+        assert daemon.scan(["pkg"], jobs=1, out=io.StringIO(), socket_path=socket_path) == 1
+
+        # Clients with different code are refused
+        monkeypatch.setattr(daemon, "identity", lambda: "other")
+        with pytest.raises(daemon.DaemonError, match="different version"):
+            daemon.request({"files": []}, socket_path)
+    finally:
+        server.shutdown()
+        thread.join(10)
+    assert not (tmp_path / "d.sock").exists()
+
+
+def test_memory_cache_in_front_of_result_cache(tmp_path):
+    from flake8_qiskit_migration.cache import MemoryCache, ResultCache
+
+    backing = ResultCache(str(tmp_path))
+    backing.put("old", [(1, 0, "QKT100: x")])
+    cache = MemoryCache(backing, max_entries=2)
+    assert cache.get("old") == [(1, 0, "QKT100: x")]
+    cache.put("a", [])
+    cache.put_cell("b", [], ["state"])
+    assert len(cache) == 2  # "old" was evicted from memory...
+    assert cache.get("old") == [(1, 0, "QKT100: x")]  # ...but not from disk
+    assert cache.get_cell("b") == ([], ["state"])
+    assert backing.get("a") == []
+    cache.close()
+
+
+# ---- Language server ----
+
+def _lint(source: str):
+    from flake8_qiskit_migration.plugin import Visitor
+
+    visitor = Visitor()
+    visitor.visit(ast.parse(source))
+    return sorted((problem.node.lineno - 1, problem.node.col_offset, problem.msg) for problem in visitor.problems)
+
+
+def test_lsp_document_relints_only_changed_statements():
+    from flake8_qiskit_migration.lsp import Document
+
+    source = "from qiskit import BasicAer as BA\n" + "".join(f"def f{i}():\n    return {i}\n\n" for i in range(50))
+    document = Document(source)
+    assert document.check()
+    assert document.visited == 51 and document.diagnostics()[0].code == "QKT100"
+
+    def edit(line, start, end, text, parses=True):
+        before = document.diagnostics()
+        document.visited = 0
+        document.apply_change({"range": {"start": {"line": line, "character": start}, "end": {"line": line, "character": end}}, "text": text})
+        assert document.check()
+        if not parses:
+            assert document.diagnostics() == before
+            return
+        assert sorted((d.line, d.col, f"{d.code}: {d.msg}") for d in document.diagnostics()) == _lint("".join(document.lines))
+
+    edit(5, 11, 12, "BA.get_backend()")  # body of f1
+    assert document.visited == 1
+    edit(5, 4, 4, "x = (\n    ", parses=False)  # findings are kept until it's fixed
+    assert document.visited == 0
+    edit(6, 0, 0, ")\n")
+    assert document.visited == 1
+    edit(0, 0, 34, "import numpy as BA\n")  # every statement after it sees different names
+    assert document.visited == 51
+    assert document.diagnostics() == []
+
+    # Statements sharing a line are kept, and re-checked, together
+    document = Document("import numpy as np\nimport qiskit as qk; qk.opflow.X\n")
+    assert document.check()
+    assert [(d.line, d.col, d.code) for d in document.diagnostics()] == [(1, 21, "QKT100")]
+    edit(0, 0, 0, "print()\n")
+    assert document.visited == 1
+    edit(1, 0, 18, "from qiskit import opflow as qk")
+    assert document.visited == 2
+    assert [(d.line, d.col) for d in document.diagnostics()] == [(1, 0), (2, 21)]
+
+
+def test_lsp_document_edits_use_utf16_offsets():
+    from flake8_qiskit_migration.lsp import Document, _utf8_to_utf16
+
+    document = Document("s = '\U0001f600é'; import qiskit.opflow\n")
+    document.check()
+    [diagnostic] = document.diagnostics()
+    # Both published ranges and edits count the emoji as two units
+    assert (diagnostic.col, _utf8_to_utf16(document.lines[0], diagnostic.col)) == (14, 11)
+    document.apply_change({"range": {"start": {"line": 0, "character": 8}, "end": {"line": 0, "character": 8}}, "text": "x"})
+    assert document.lines == ["s = '\U0001f600éx'; import qiskit.opflow\n"]
+
+
+def test_lsp_server_with_scripted_client(tmp_path):
+    import json
+    import subprocess
+    import sys
+
+    server = subprocess.Popen(
+        [sys.executable, "-c", "from flake8_qiskit_migration.command import cli; cli()", "--lsp"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+
+    def send(message):
+        body = json.dumps(dict(message, jsonrpc="2.0")).encode()
+        server.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        server.stdin.flush()
+
+    def receive():
+        length = None
+        while True:
+            header = server.stdout.readline().strip()
+            if not header:
+                break
+            if header.lower().startswith(b"content-length:"):
+                length = int(header.split(b":")[1])
+        return json.loads(server.stdout.read(length))
+
+    def diagnostics():
+        message = receive()
+        assert message["method"] == "textDocument/publishDiagnostics"
+        return [(d["range"]["start"]["line"], d["code"]) for d in message["params"]["diagnostics"]]
+
+    uri = (tmp_path / "a.py").as_uri()
+    try:
+        send({"id": 1, "method": "initialize", "params": {"initializationOptions": {"debounce": 0.05, "ignore": ["QKT101"]}}})
+        assert receive()["result"]["capabilities"]["textDocumentSync"]["change"] == 2
+        send({"method": "initialized", "params": {}})
+        send({"method": "textDocument/didOpen", "params": {"textDocument": {"uri": uri, "languageId": "python", "version": 1, "text": "import qiskit\n"}}})
+        assert diagnostics() == []
+
+        # Several quick edits are checked once
+        for version, line in enumerate(["import qiskit.opflow\n", "from qiskit import QuantumCircuit\n", "QuantumCircuit(1).cnot(0, 1)\n"], 2):
+            position = {"line": version - 1, "character": 0}
+            send({"method": "textDocument/didChange", "params": {
+                "textDocument": {"uri": uri, "version": version},
+                "contentChanges": [{"range": {"start": position, "end": position}, "text": line}],
+            }})
+        assert diagnostics() == [(1, "QKT100")]  # QKT101 is ignored
+
+        send({"id": 2, "method": "textDocument/hover", "params": {}})
+        assert receive()["error"]["code"] == -32601
+        send({"method": "textDocument/didClose", "params": {"textDocument": {"uri": uri}}})
+        assert diagnostics() == []
+        send({"id": 3, "method": "shutdown"})
+        assert receive() == {"id": 3, "result": None, "jsonrpc": "2.0"}
+        send({"method": "exit"})
+        assert server.wait(10) == 0
+    finally:
+        server.kill()
+
+
+# ---- Programmatic API ----
+
+def test_check_many_structured_findings():
+    import pytest
+    from flake8_qiskit_migration import api
+    from flake8_qiskit_migration.engine import ScanError
+
+    code = "from qiskit import QuantumCircuit, transpile\nimport qiskit.extensions\nqc = QuantumCircuit(2).cnot(0, 1)\ntranspile(qc, backend_properties=None)\n"
+    findings = list(api.check_many([
+        code,
+        ("import numpy\n".encode(), "b.py"),
+        (memoryview("# -*- coding: latin-1 -*-\nimport qiskit.opflow  # é\n".encode("latin-1")), "c.py"),
+    ]))
+    assert [(f.index, f.filename, f.line, f.col, f.code) for f in findings] == [
+        (0, None, 2, 0, "QKT100"), (0, None, 3, 5, "QKT101"), (0, None, 4, 0, "QKT202"), (2, "c.py", 2, 0, "QKT100"),
+    ]
+    assert [(f.key, f.replacement) for f in findings] == [
+        ("qiskit.extensions", "qiskit.circuit.library"),
+        ("cnot", ".cx()"),
+        (("qiskit.transpile", "backend_properties"), "target"),
+        ("qiskit.opflow", None),
+    ]
+    assert findings[0].msg.startswith("QKT100: qiskit.extensions has been removed")
+    # Same as the flake8 plugin reports
+    assert {f"{f.line}:{f.col} {f.msg}" for f in findings if f.index == 0} == _results(code)
+
+    assert [f.code for f in api.check_many([code], select=["QKT2"])] == ["QKT202"]
+    assert list(api.check_many([code], select=["E"])) == []
+
+    # Sources are read lazily, and errors surface when reached
+    broken = api.check_many(iter([code, ("import qiskit.opflow\nx = (", "bad.py"), code]))
+    assert next(broken).index == 0
+    with pytest.raises(ScanError, match="bad.py"):
+        list(broken)
+    assert {f.index for f in api.check_many([code, "import qiskit.opflow\nx = (", code], errors="skip")} == {0, 2}
+
+
+def test_check_many_in_worker_processes(monkeypatch):
+    from flake8_qiskit_migration import api
+
+    monkeypatch.setattr(api, "_CHUNK_SIZE", 3)
+    sources = [f"import qiskit as qk\nqk.opflow.X{i}\n" if i % 2 else "import numpy\n" for i in range(20)]
+    assert list(api.check_many(sources, jobs=2)) == list(api.check_many(sources))